@@ -0,0 +1,8 @@
+"""
+Berlin Housing Market Analysis - wiederverwendbare Bausteine
+============================================================
+
+Gemeinsame Module für die Skripte und Notebooks des Projekts.
+Schwere Abhängigkeiten (shapely, folium, ...) werden erst in den
+jeweiligen Untermodulen importiert.
+"""
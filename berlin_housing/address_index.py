@@ -0,0 +1,299 @@
+"""
+Adress-Index für die Wohnlagen-Anreicherung
+===========================================
+
+Verdichtet das Adressregister ``wohnlagen_enriched.csv`` in einem
+vektorisierten Durchlauf zu Tabellen mit dem häufigsten (modalen) Eintrag
+je Schlüssel:
+
+- ``addresses``: (Straße, Hausnummer, PLZ) → PLZ, Wohnlage, Ortsteil, Bezirk
+- ``numbers``: (Straße, Hausnummer) – wie oben, ohne bekannte PLZ
+- ``ranges``: Hausnummern-Bereiche je Straße mit durchgehend gleicher
+  PLZ/Wohnlage/Ortsteil (Fallback für Hausnummern ohne exakten Eintrag);
+  ``plz_ranges`` dasselbe je Straße und PLZ
+- ``streets``: modaler Eintrag je Straße; ``ortsteile``: häufigste PLZ und
+  Wohnlage je Ortsteil
+
+Straßennamen werden normalisiert (HTML-Entities wie ``&szlig;``, Groß/Klein,
+Umlaute, "Straße"/"Strasse"/"Str." → "str"), Hausnummern auf Zahl + Buchstabe
+("46-54" → "46", "12 A" → "12a"). ``lookup`` ordnet eine ganze Series in
+wenigen Joins zu und meldet die Stufe des Treffers in ``method``
+(``exact_plz``, ``exact``, ``range``, ``street``)::
+
+    from berlin_housing.address_index import load_address_index
+    index = load_address_index()
+    index.lookup(df['street'])                                  # Straße [+ Hausnummer] im Text
+    index.lookup(df['street'], hnr=df['hnr'], plz=df['plz'])
+
+Der Index wird als Pickle unter ``data/cache/`` gespeichert und nur neu gebaut,
+wenn sich der Inhalt des Adressregisters ändert.
+"""
+
+import hashlib
+import html
+import os
+import pickle
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from berlin_housing.plz import normalize_plz
+
+WOHNLAGEN_PATH = 'data/raw/wohnlagen_enriched.csv'
+CACHE_PATH = 'data/cache/address_index.pkl'
+INDEX_VERSION = 3   # erhöhen, wenn sich die Tabellen des Index ändern (alte Pickles werden neu gebaut)
+
+# Spalten des Registers → Spalten des Index
+REGISTER_COLUMNS = {'strasse': 'street', 'hnr': 'hnr', 'plz': 'plz', 'wol': 'wol',
+                    'ortsteil_neu': 'ortsteil', 'bezirk_neu': 'bezirk'}
+ATTRIBUTES = ['plz', 'wol', 'ortsteil', 'bezirk']
+METHODS = ['exact_plz', 'exact', 'range', 'street']
+
+MISSING_STREETS = {'', 'no information', 'keine angabe'}
+
+_STREET_SUFFIX = re.compile(r'(stra(?:ss|ß)e|str\.?)(?=\W|$)')
+_NON_WORD = re.compile(r'[\W_]+')
+_HOUSE_NUMBER = re.compile(r'^\s*(\d+)\s*([a-z]?)(?![a-z])')
+_STREET_AND_NUMBER = re.compile(r'^(?P<street>.*?\D)\s*(?P<hnr>\d+\s*[a-zA-Z]?(?:\s*[-/–]\s*\d+\s*[a-zA-Z]?)?)\s*$')
+
+
+def _street_key(text):
+    text = unicodedata.normalize('NFC', html.unescape(str(text))).strip().casefold()
+    text = text.replace('ä', 'ae').replace('ö', 'oe').replace('ü', 'ue').replace('ß', 'ss')
+    text = _STREET_SUFFIX.sub('str', text)
+    text = _NON_WORD.sub(' ', text).strip()
+    return None if text in MISSING_STREETS else text
+
+
+def _house_number_key(text):
+    match = _HOUSE_NUMBER.match(str(text).casefold())
+    return f'{int(match.group(1))}{match.group(2)}' if match else None
+
+
+def _map_unique(values, func):
+    """``func`` einmal je eindeutigem Wert; Ergebnis als object-Series mit None."""
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values)
+    mapped = np.array([func(value) for value in uniques] + [None], dtype=object)
+    return pd.Series(mapped[codes], index=values.index, dtype=object)
+
+
+def normalize_street(values):
+    """Straßennamen → Vergleichsschlüssel ("Grabenstra&szlig;e" → "grabenstr"); None für fehlende."""
+    return _map_unique(values, _street_key)
+
+
+def normalize_house_number(values):
+    """Hausnummern → Schlüssel aus Zahl und Buchstabe ("12 A" → "12a", "46-54" → "46", 12.0 → "12")."""
+    return _map_unique(values, _house_number_key)
+
+
+def split_address(values):
+    """
+    Trenne Straße und Hausnummer ("Biedenkopfer Straße 46-54, 13507 Berlin" →
+    "Biedenkopfer Straße", "46-54"); ausgewertet wird der Teil vor dem ersten Komma.
+    """
+    text = pd.Series(values).astype('string').str.split(',', n=1).str[0].str.strip()
+    parts = text.str.extract(_STREET_AND_NUMBER)
+    return pd.DataFrame({
+        'street': parts['street'].str.strip().fillna(text),
+        'hnr': parts['hnr'],
+    }, index=text.index)
+
+
+def _modal(df, keys, values, weight=None):
+    """
+    Häufigste Kombination von ``values`` je ``keys`` (bei Gleichstand die zuerst
+    gesehene) plus ``count`` = Anzahl Registereinträge des Schlüssels.
+    """
+    if weight is None:
+        counts = df.groupby(keys + values, dropna=False, sort=False).size().rename('n').reset_index()
+    else:
+        counts = df.groupby(keys + values, dropna=False, sort=False)[weight].sum().rename('n').reset_index()
+    totals = counts.groupby(keys, dropna=False, sort=False)['n'].transform('sum')
+    modal = (counts.assign(count=totals)
+                   .sort_values('n', ascending=False, kind='stable')
+                   .drop_duplicates(keys)
+                   .drop(columns='n'))
+    return modal.reset_index(drop=True)
+
+
+def _ranges(numbers, by=('street',)):
+    """Läufe aufeinanderfolgender Hausnummern je ``by`` (Straße bzw. Straße + PLZ) mit gleichen Attributen → [start, end]."""
+    by = list(by)
+    numbered = numbers[numbers['hnr_num'].notna()]
+    numbered = _modal(numbered, by + ['hnr_num'], [column for column in ATTRIBUTES if column not in by], weight='count')
+    numbered = numbered.sort_values(by + ['hnr_num'], kind='stable').reset_index(drop=True)
+
+    attrs = numbered[['street'] + ATTRIBUTES].astype(object).fillna('\0')
+    new_run = (attrs != attrs.shift()).any(axis=1).to_numpy()
+    run = np.cumsum(new_run) - 1
+    ranges = numbered.groupby(run, sort=False).agg(
+        street=('street', 'first'), start=('hnr_num', 'min'), end=('hnr_num', 'max'),
+        count=('count', 'sum'), **{column: (column, 'first') for column in ATTRIBUTES},
+    )
+    ranges[['start', 'end']] = ranges[['start', 'end']].astype('float64')
+    return ranges.sort_values(['start'], kind='stable').reset_index(drop=True)
+
+
+class AddressIndex:
+    """Modale Wohnlage/Ortsteil/PLZ je Adresse, Hausnummern-Bereich, Straße und Ortsteil."""
+
+    def __init__(self, addresses, source_hash=None):
+        self.addresses = addresses
+        self.source_hash = source_hash
+        self.version = INDEX_VERSION
+
+        self.numbers = _modal(addresses, ['street', 'hnr'], ['hnr_num'] + ATTRIBUTES, weight='count')
+        self.ranges = _ranges(self.numbers)
+        self.plz_ranges = _ranges(addresses[addresses['plz'].notna()], by=['street', 'plz'])
+        self.plz_streets = _modal(addresses[addresses['plz'].notna()], ['street', 'plz'],
+                                  [column for column in ATTRIBUTES if column != 'plz'], weight='count')
+        self.streets = _modal(addresses, ['street'], ATTRIBUTES, weight='count').set_index('street')
+        # Ortsteil → häufigste PLZ und (unabhängig davon) häufigste Wohnlage
+        located = addresses[addresses['ortsteil'].notna()]
+        self.ortsteile = (_modal(located, ['ortsteil'], ['plz'], weight='count').set_index('ortsteil')
+                          .join(_modal(located, ['ortsteil'], ['wol'], weight='count').set_index('ortsteil')['wol']))
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __repr__(self):
+        return (f'AddressIndex({len(self.addresses):,} Adressen, {len(self.ranges):,} Bereiche, '
+                f'{len(self.streets):,} Straßen)')
+
+    @classmethod
+    def from_wohnlagen(cls, wohnlagen, source_hash=None):
+        """Baue den Index aus dem Adressregister (DataFrame mit ``strasse``, ``hnr``, ``plz``, ``wol``, ``ortsteil_neu``)."""
+        present = {column: name for column, name in REGISTER_COLUMNS.items() if column in wohnlagen.columns}
+        register = wohnlagen[list(present)].rename(columns=present)
+        for name in REGISTER_COLUMNS.values():
+            if name not in register.columns:
+                register[name] = None
+
+        hnr = normalize_house_number(register['hnr'])
+        frame = pd.DataFrame({
+            'street': normalize_street(register['street']),
+            'hnr': hnr,
+            'hnr_num': pd.to_numeric(hnr.str.extract(r'^(\d+)', expand=False), errors='coerce').astype('float64'),
+            'plz': normalize_plz(register['plz']).astype(object),
+            'wol': register['wol'].astype(object),
+            'ortsteil': register['ortsteil'].astype(object),
+            'bezirk': register['bezirk'].astype(object),
+        })
+        frame = frame[frame['street'].notna()].replace({pd.NA: None})
+        addresses = _modal(frame, ['street', 'hnr', 'plz'], ['hnr_num', 'wol', 'ortsteil', 'bezirk'])
+        return cls(addresses, source_hash)
+
+    def lookup(self, street, hnr=None, plz=None):
+        """
+        Ordne Adressen zu; gibt ``plz``, ``wol``, ``ortsteil``, ``bezirk`` und ``method`` zurück.
+
+        Ohne ``hnr`` wird die Hausnummer aus dem Straßentext gelesen. Reihenfolge:
+        exakte Adresse mit PLZ, exakte Adresse, Hausnummern-Bereich, modaler
+        Eintrag der Straße in der PLZ, modaler Eintrag der Straße. Nicht
+        zugeordnete Zeilen haben ``method`` = None.
+
+        Hat eine Zeile eine PLZ, zählen nur Treffer mit derselben PLZ
+        (Hausnummern-Bereiche und Straßen werden je Straße und PLZ gesucht,
+        auch wenn die PLZ nicht die häufigste der Straße ist): gleichnamige
+        Straßen in anderen Bezirken ("Hauptstraße" in 10827 und 13055) liefern
+        sonst Wohnlage und Ortsteil der falschen Straße.
+        """
+        street = pd.Series(street)
+        if hnr is None:
+            parts = split_address(street)
+            street_text, hnr = parts['street'], parts['hnr']
+        else:
+            street_text = street
+
+        query = pd.DataFrame({
+            'street': normalize_street(street_text).to_numpy(),
+            'hnr': normalize_house_number(pd.Series(hnr, index=street.index)).to_numpy(),
+            'plz': (normalize_plz(pd.Series(plz, index=street.index)).astype(object).to_numpy()
+                    if plz is not None else None),
+        })
+        query['hnr_num'] = pd.to_numeric(query['hnr'].str.extract(r'^(\d+)', expand=False), errors='coerce').astype('float64')
+
+        result = pd.DataFrame(None, index=query.index, columns=ATTRIBUTES + ['method'], dtype=object)
+        open_rows = query['street'].notna().to_numpy()
+        has_plz = query['plz'].notna().to_numpy()
+
+        def fill(hits, method):
+            nonlocal open_rows
+            found = open_rows & hits['count'].notna().to_numpy()
+            found &= ~has_plz | (hits['plz'].to_numpy() == query['plz'].to_numpy())
+            result.loc[found, ATTRIBUTES] = hits.loc[found, ATTRIBUTES].to_numpy()
+            result.loc[found, 'method'] = method
+            open_rows = open_rows & ~found
+
+        if plz is not None:
+            fill(query[['street', 'hnr', 'plz']].merge(self.addresses, how='left', on=['street', 'hnr', 'plz']),
+                 'exact_plz')
+        fill(query[['street', 'hnr']].merge(self.numbers, how='left', on=['street', 'hnr']), 'exact')
+
+        numbered = open_rows & query['hnr_num'].notna().to_numpy()
+        if numbered.any():
+            # Mit PLZ: Bereich derselben Straße und PLZ; ohne PLZ: Bereich der Straße
+            parts = []
+            for rows, ranges, by in ((numbered & has_plz, self.plz_ranges, ['street', 'plz']),
+                                     (numbered & ~has_plz, self.ranges, ['street'])):
+                if rows.any() and len(ranges):
+                    left = query.loc[rows, by + ['hnr_num']].reset_index().sort_values('hnr_num', kind='stable')
+                    parts.append(pd.merge_asof(left, ranges, left_on='hnr_num', right_on='start', by=by,
+                                               direction='backward', suffixes=('', '_range')))
+            if parts:
+                hits = pd.concat(parts, ignore_index=True)
+                hits.loc[hits['hnr_num'] > hits['end'], 'count'] = np.nan
+                fill(hits.set_index('index').reindex(query.index), 'range')
+
+        if plz is not None:
+            fill(query[['street', 'plz']].merge(self.plz_streets, how='left', on=['street', 'plz']), 'street_plz')
+        fill(query[['street']].merge(self.streets, how='left', left_on='street', right_index=True), 'street')
+
+        result.index = street.index
+        return result.where(result.notna(), None)
+
+    def save(self, path=CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_address_index(wohnlagen_path=WOHNLAGEN_PATH, source_hash=None):
+    """Baue den Index direkt aus ``wohnlagen_enriched.csv``."""
+    header = pd.read_csv(wohnlagen_path, nrows=0).columns
+    usecols = [column for column in REGISTER_COLUMNS if column in header]
+    wohnlagen = pd.read_csv(wohnlagen_path, usecols=usecols, dtype={'plz': str, 'hnr': str})
+    return AddressIndex.from_wohnlagen(wohnlagen, source_hash or _file_hash(wohnlagen_path))
+
+
+def load_address_index(wohnlagen_path=WOHNLAGEN_PATH, cache_path=CACHE_PATH):
+    """Lade den Index aus dem Cache; baue und speichere ihn neu, wenn sich das Register geändert hat."""
+    source_hash = _file_hash(wohnlagen_path)
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                index = pickle.load(f)
+            if index.source_hash == source_hash and getattr(index, 'version', None) == INDEX_VERSION:
+                return index
+        except Exception:
+            pass  # Defekter oder veralteter Cache → neu bauen
+
+    index = build_address_index(wohnlagen_path, source_hash)
+    if cache_path:
+        index.save(cache_path)
+    return index
@@ -0,0 +1,293 @@
+"""
+Aggregat-Speicher mit mergebaren Quantil-Sketches
+=================================================
+
+Feiner als der Preiswürfel: eine Zelle je (year, bezirk, ortsteil,
+rooms_bucket, size_bucket). Pro Zelle und Kennzahl (``price``, ``size``,
+``price_per_sqm``) werden gespeichert:
+
+- Anzahl, Summe, Quadratsumme, Minimum, Maximum (exakt verdichtbar, daraus
+  Mittelwert und Standardabweichung)
+- ein logarithmisches Histogramm (DDSketch-Prinzip): Wert ``x`` landet in
+  Bin ``ceil(log(x) / log(GAMMA))``. Jeder Bin-Repräsentant liegt höchstens
+  ``RELATIVE_ACCURACY`` (1 %) neben allen Werten des Bins. Zwei Sketches
+  werden durch Addieren der Bin-Zähler gemergt, Quantile (Median, IQR) sind
+  also auf jeder Verdichtungsstufe bis auf 1 % genau.
+
+``rollup(by)`` beantwortet Abfragen wie ``groupby('year')['price'].agg(...)``
+nur aus den Zellen, ohne die Angebote zu lesen; Ergebnisse werden bis zum
+nächsten ``update`` zwischengespeichert. ``update(df)`` nimmt neue Angebote
+auf, ohne die alten erneut zu lesen.
+
+    from berlin_housing.aggregate_store import AggregateStore
+    store = AggregateStore.load_or_build()
+    store.describe('year', 'price')            # count, mean, std, min, q25, median, q75, iqr, max
+    store.rollup(['year', 'bezirk'], where={'rooms_bucket': '2'})
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+STORE_DIR = 'data/cache/aggregate_store'
+
+KEYS = ['year', 'bezirk', 'ortsteil', 'rooms_bucket', 'size_bucket']
+MEASURES = ['price', 'size', 'price_per_sqm']
+
+ROOMS_EDGES = [0, 1.5, 2.5, 3.5, 4.5, np.inf]
+ROOMS_LABELS = ['1', '2', '3', '4', '5+']
+SIZE_EDGES = [0, 40, 60, 80, 100, 130, np.inf]
+SIZE_LABELS = ['<40', '40-60', '60-80', '80-100', '100-130', '130+']
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+MIN_VALUE = 0.01            # kleinere (auch negative) Werte landen im Bin von MIN_VALUE
+
+STATS = ['count', 'sum', 'sum_sq', 'min', 'max']
+QUANTILES = {'q25': 0.25, 'median': 0.5, 'q75': 0.75}
+
+
+def assign_buckets(df):
+    """Zimmer- und Flächen-Buckets als Strings (fehlende Werte → <NA>)."""
+    rooms = pd.cut(df['rooms'].astype('float64'), ROOMS_EDGES, labels=ROOMS_LABELS)
+    size = pd.cut(df['size'].astype('float64'), SIZE_EDGES, labels=SIZE_LABELS)
+    return df.assign(rooms_bucket=rooms.astype('string'), size_bucket=size.astype('string'))
+
+
+def sketch_bins(values):
+    """Bin-Index je Wert (int32)."""
+    values = np.maximum(np.asarray(values, dtype='float64'), MIN_VALUE)
+    return np.ceil(np.log(values) / np.log(GAMMA)).astype('int32')
+
+
+def bin_values(bins):
+    """Repräsentant je Bin (relativer Fehler ≤ ``RELATIVE_ACCURACY``)."""
+    return 2 * np.power(GAMMA, np.asarray(bins, dtype='float64')) / (GAMMA + 1)
+
+
+def _key_frame(df):
+    keys = pd.DataFrame(index=df.index)
+    keys['year'] = df['year'].astype('int64')
+    for key in KEYS[1:]:
+        keys[key] = df[key].astype('string') if key in df.columns else pd.Series(pd.NA, index=df.index,
+                                                                                 dtype='string')
+    return keys
+
+
+def _group_codes(frame, by):
+    """(Gruppen-Code je Zeile, eindeutige Schlüssel in Code-Reihenfolge); fehlende Werte bilden eigene Gruppen."""
+    codes = frame.groupby(by, dropna=False, sort=False).ngroup().to_numpy()
+    unique = frame[by].drop_duplicates().reset_index(drop=True)
+    return codes, unique
+
+
+def _empty_sketches():
+    return pd.DataFrame({'cell': pd.Series(dtype='int64'), 'measure': pd.Series(dtype='string'),
+                         'bin': pd.Series(dtype='int32'), 'count': pd.Series(dtype='int64')})
+
+
+class AggregateStore:
+    """Zellen mit exakten Summen und Quantil-Sketches; Roll-ups ohne Rohdaten."""
+
+    def __init__(self, cells, sketches):
+        self.cells = cells.reset_index(drop=True)     # KEYS + {measure}_{stat}; Zeilennummer = Zell-ID
+        self.sketches = sketches                      # cell, measure, bin, count
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __repr__(self):
+        return f'AggregateStore({len(self.cells):,} Zellen, {len(self.sketches):,} Sketch-Bins)'
+
+    @classmethod
+    def from_frame(cls, df):
+        """Baue den Speicher aus Angeboten (Zeilen ohne ``price`` oder ``year`` werden ignoriert)."""
+        df = df[df['price'].notna() & df['year'].notna()]
+        if 'price_per_sqm' not in df.columns:
+            df = df.assign(price_per_sqm=(df['price'] / df['size']).replace([np.inf, -np.inf], np.nan))
+        df = assign_buckets(df)
+
+        keys = _key_frame(df)
+        cell_codes, cells = _group_codes(keys, KEYS)
+
+        sketches = [_empty_sketches()]
+        for measure in MEASURES:
+            values = df[measure].to_numpy(dtype='float64')
+            valid = ~np.isnan(values)
+            by_cell = pd.Series(values[valid]).groupby(cell_codes[valid])
+            stats = pd.DataFrame({
+                'count': by_cell.count(), 'sum': by_cell.sum(), 'sum_sq': (pd.Series(values[valid]) ** 2)
+                .groupby(cell_codes[valid]).sum(), 'min': by_cell.min(), 'max': by_cell.max(),
+            }).reindex(range(len(cells)))
+            stats['count'] = stats['count'].fillna(0).astype('int64')
+            for stat in ('sum', 'sum_sq'):
+                stats[stat] = stats[stat].fillna(0.0)
+            for stat in STATS:
+                cells[f'{measure}_{stat}'] = stats[stat].to_numpy()
+
+            counts = pd.DataFrame({'cell': cell_codes[valid], 'bin': sketch_bins(values[valid])})
+            counts = counts.groupby(['cell', 'bin']).size().rename('count').reset_index()
+            sketches.append(counts.assign(measure=measure))
+
+        sketches = pd.concat(sketches, ignore_index=True)[['cell', 'measure', 'bin', 'count']]
+        return cls(cells, sketches.astype({'cell': 'int64', 'measure': 'string', 'bin': 'int32', 'count': 'int64'}))
+
+    def merge(self, other):
+        """Neuer Speicher aus ``self`` und ``other`` (Summen addiert, Sketches gemergt)."""
+        left = self.cells.assign(_left=np.arange(len(self.cells)))
+        right = other.cells.assign(_right=np.arange(len(other.cells)))
+        for frame in (left, right):
+            for key in KEYS[1:]:
+                frame[key] = frame[key].astype('string')
+        merged = left.merge(right, on=KEYS, how='outer', suffixes=('', '_other'), sort=False)
+
+        cells = merged[KEYS].copy()
+        for measure in MEASURES:
+            for stat in ('count', 'sum', 'sum_sq'):
+                col = f'{measure}_{stat}'
+                cells[col] = merged[col].fillna(0) + merged[f'{col}_other'].fillna(0)
+            cells[f'{measure}_count'] = cells[f'{measure}_count'].astype('int64')
+            cells[f'{measure}_min'] = np.fmin(merged[f'{measure}_min'], merged[f'{measure}_min_other'])
+            cells[f'{measure}_max'] = np.fmax(merged[f'{measure}_max'], merged[f'{measure}_max_other'])
+
+        # Alte Zell-IDs → Zeilen des zusammengeführten Speichers
+        left_ids = np.full(len(self.cells), -1, dtype='int64')
+        right_ids = np.full(len(other.cells), -1, dtype='int64')
+        has_left, has_right = merged['_left'].notna().to_numpy(), merged['_right'].notna().to_numpy()
+        positions = np.arange(len(merged))
+        left_ids[merged.loc[has_left, '_left'].astype('int64')] = positions[has_left]
+        right_ids[merged.loc[has_right, '_right'].astype('int64')] = positions[has_right]
+
+        sketches = pd.concat([
+            self.sketches.assign(cell=left_ids[self.sketches['cell'].to_numpy()]),
+            other.sketches.assign(cell=right_ids[other.sketches['cell'].to_numpy()]),
+        ], ignore_index=True)
+        sketches = sketches.groupby(['cell', 'measure', 'bin'], observed=True)['count'].sum().reset_index()
+        return AggregateStore(cells, sketches)
+
+    def update(self, df):
+        """Neue Angebote aufnehmen (nur ``df`` wird gelesen); leert den Abfrage-Cache."""
+        updated = self.merge(AggregateStore.from_frame(df))
+        self.cells, self.sketches, self._cache = updated.cells, updated.sketches, {}
+        return self
+
+    def _select(self, where):
+        if not where:
+            return self.cells
+        mask = np.ones(len(self.cells), dtype=bool)
+        for key, value in where.items():
+            column = self.cells[key]
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            mask &= column.isin(values).fillna(False).to_numpy(dtype=bool)
+        return self.cells[mask]
+
+    def rollup(self, by=(), measures=MEASURES, where=None):
+        """
+        Kennzahlen je Gruppe ``by`` (Teilmenge von ``KEYS``), optional auf
+        ``where`` (``{Schlüssel: Wert oder Liste}``) eingeschränkt.
+
+        Spalten je Kennzahl: ``count``, ``mean``, ``std``, ``min``, ``q25``,
+        ``median``, ``q75``, ``iqr``, ``max`` (z.B. ``price_median``).
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        measures = [measures] if isinstance(measures, str) else list(measures)
+        filters = ((key, tuple(sorted(value, key=str)) if isinstance(value, (list, tuple, set)) else value)
+                   for key, value in (where or {}).items())
+        cache_key = (tuple(by), tuple(measures), tuple(sorted(filters, key=str)))
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+
+        cells = self._select(where)
+        if by:
+            group_codes, groups = _group_codes(cells, by)
+            index = pd.MultiIndex.from_frame(groups) if len(by) > 1 else pd.Index(groups[by[0]], name=by[0])
+        else:
+            group_codes, index = np.zeros(len(cells), dtype='int64'), pd.RangeIndex(1)
+        n_groups = len(index)
+        cell_group = np.full(len(self.cells), -1, dtype='int64')
+        cell_group[cells.index.to_numpy()] = group_codes
+
+        result = pd.DataFrame(index=index)
+        for measure in measures:
+            count = np.bincount(group_codes, cells[f'{measure}_count'].to_numpy('float64'), n_groups)
+            total = np.bincount(group_codes, cells[f'{measure}_sum'].to_numpy('float64'), n_groups)
+            total_sq = np.bincount(group_codes, cells[f'{measure}_sum_sq'].to_numpy('float64'), n_groups)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = total / count
+                variance = (total_sq - count * mean ** 2) / (count - 1)    # Stichprobenvarianz wie pandas
+            minimum = pd.Series(cells[f'{measure}_min'].to_numpy('float64')).groupby(group_codes).min()
+            maximum = pd.Series(cells[f'{measure}_max'].to_numpy('float64')).groupby(group_codes).max()
+
+            result[f'{measure}_count'] = count.astype('int64')
+            result[f'{measure}_mean'] = np.where(count > 0, mean, np.nan)
+            result[f'{measure}_std'] = np.where(count > 1, np.sqrt(np.maximum(variance, 0)), np.nan)
+            result[f'{measure}_min'] = minimum.reindex(range(n_groups)).to_numpy()
+            quantiles = self._quantiles(measure, cell_group, n_groups)
+            for name in QUANTILES:
+                result[f'{measure}_{name}'] = quantiles[name]
+            result[f'{measure}_iqr'] = quantiles['q75'] - quantiles['q25']
+            result[f'{measure}_max'] = maximum.reindex(range(n_groups)).to_numpy()
+
+        if by:
+            result = result.sort_index()
+        self._cache[cache_key] = result
+        return result
+
+    def _quantiles(self, measure, cell_group, n_groups):
+        """Quantile je Gruppe aus den gemergten Sketches (vektorisiert über alle Gruppen)."""
+        sketch = self.sketches[self.sketches['measure'] == measure]
+        group = cell_group[sketch['cell'].to_numpy()]
+        keep = group >= 0
+        merged = pd.DataFrame({'group': group[keep], 'bin': sketch['bin'].to_numpy()[keep],
+                               'count': sketch['count'].to_numpy()[keep]})
+        merged = merged.groupby(['group', 'bin'], sort=True)['count'].sum().reset_index()
+
+        groups = merged['group'].to_numpy()
+        cumulative = np.cumsum(merged['count'].to_numpy())
+        totals = np.bincount(groups, merged['count'].to_numpy(), n_groups)
+        starts = np.concatenate([[0], np.cumsum(totals)[:-1]])     # Zähler vor der Gruppe
+
+        results = {}
+        for name, q in QUANTILES.items():
+            values = np.full(n_groups, np.nan)
+            present = totals > 0
+            rank = starts[present] + q * (totals[present] - 1)     # Rang wie bei DDSketch
+            positions = np.searchsorted(cumulative, rank, side='right')
+            values[present] = bin_values(merged['bin'].to_numpy()[positions])
+            results[name] = values
+        return results
+
+    def describe(self, by, measure='price', where=None):
+        """``rollup`` für eine Kennzahl mit Spaltennamen wie ``DataFrame.agg`` (count, mean, median, ...)."""
+        result = self.rollup(by, [measure], where)
+        return result.rename(columns=lambda col: col[len(measure) + 1:])
+
+    def save(self, directory=STORE_DIR):
+        """Speichere Zellen und Sketches als CSV-Dateien."""
+        os.makedirs(directory, exist_ok=True)
+        for name, frame in (('cells', self.cells), ('sketches', self.sketches)):
+            path = os.path.join(directory, f'{name}.csv')
+            frame.to_csv(path + '.tmp', index=False)
+            os.replace(path + '.tmp', path)
+        return directory
+
+    @classmethod
+    def load(cls, directory=STORE_DIR):
+        dtype = {key: 'string' for key in KEYS[1:]}
+        cells = pd.read_csv(os.path.join(directory, 'cells.csv'), dtype=dtype)
+        sketches = pd.read_csv(os.path.join(directory, 'sketches.csv'),
+                               dtype={'cell': 'int64', 'measure': 'string', 'bin': 'int32', 'count': 'int64'})
+        return cls(cells, sketches)
+
+    @classmethod
+    def load_or_build(cls, directory=STORE_DIR):
+        """Gespeicherten Speicher laden oder einmal aus ``datasets.load_combined`` bauen."""
+        if os.path.exists(os.path.join(directory, 'cells.csv')):
+            return cls.load(directory)
+        from berlin_housing.datasets import load_combined
+
+        store = cls.from_frame(load_combined(columns=['price', 'size', 'rooms', 'year', 'bezirk', 'ortsteil']))
+        store.save(directory)
+        return store
@@ -0,0 +1,498 @@
+"""
+Benchmarks
+==========
+
+    python -m berlin_housing.benchmark encodings             # One-Hot vs. codes vs. Target-Encoding
+    python -m berlin_housing.benchmark encodings --scale 10  # Trainingsdaten 10× repliziert
+    python -m berlin_housing.benchmark stages                # Mapping, Cleaning, Aggregation, Karte bei 1×/10×/100×
+    python -m berlin_housing.benchmark stages --only price_categories interactive_map --scales 1 10
+    python -m berlin_housing.benchmark compare data/cache/benchmarks/stages_A.json data/cache/benchmarks/stages_B.json
+
+Jede Kombination aus Modell und Encoding bzw. aus Stufe und Skalierung läuft
+in einem eigenen Prozess, damit der Spitzen-Speicher (``ru_maxrss``) nicht von
+vorherigen Läufen stammt. Gemessen werden Fit- und Vorhersagezeit, Spitzen-RSS,
+Breite der Feature-Matrix sowie R² und MAE auf dem Testteil.
+
+``stages`` misst die Stufen aus ``STAGE_BENCHMARKS`` auf Eingaben, die aus den
+mitgelieferten Daten erzeugt werden: ``scale`` Kopien, ab der zweiten Kopie mit
+verrauschten Mieten, Flächen und Koordinaten (reproduzierbar über ``seed``).
+Je Lauf: beste und mittlere Zeit aus ``repeat`` Wiederholungen, Spitzen-RSS und
+die Spitze der Python-Allokationen (``tracemalloc``, eigener ungetimter Lauf).
+``compare`` stellt zwei Ergebnisdateien gegenüber und meldet Verlangsamungen.
+
+Die Ergebnisse landen als JSON unter ``data/cache/benchmarks/``.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from berlin_housing.model import DEFAULT_ENCODING, ENCODINGS, ESTIMATORS, SUPPORTED_ENCODINGS, TRAINING_PATH
+
+BENCHMARK_DIR = 'data/cache/benchmarks'
+
+LISTINGS_PATH = 'data/processed/berlin_housing_combined_enriched_final.csv'
+STAGE_SCALES = (1, 10, 100)
+NOISE = 0.03    # Standardabweichung des multiplikativen Rauschens (≈ 3 %)
+COORD_NOISE = 0.002    # Grad
+
+
+def _peak_rss_mb():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024   # macOS: Bytes, Linux: KiB
+
+
+def _run_encoding(data_path, estimator, encoding, scale, random_state):
+    """Ein Lauf (im Kindprozess): Daten laden, fitten, vorhersagen, messen."""
+    from berlin_housing.model import evaluate, fit_model, split
+
+    df = pd.read_csv(data_path, dtype={'plz': 'string'})
+    if scale > 1:
+        df = pd.concat([df] * scale, ignore_index=True)
+    X_train, X_test, y_train, y_test = split(df, random_state=random_state)
+    rss_before = _peak_rss_mb()
+
+    start = time.perf_counter()
+    preprocessor, model = fit_model(X_train, y_train, estimator, encoding, random_state)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matrix = preprocessor.transform(X_test)
+    y_pred = model.predict(matrix)
+    predict_seconds = time.perf_counter() - start
+
+    result = {
+        'estimator': estimator,
+        'encoding': encoding,
+        'scale': scale,
+        'rows_train': int(len(y_train)),
+        'n_features': int(matrix.shape[1]),
+        'fit_seconds': round(fit_seconds, 3),
+        'predict_seconds': round(predict_seconds, 3),
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+        'peak_rss_delta_mb': round(_peak_rss_mb() - rss_before, 1),
+    }
+    result.update({name: round(value, 4) for name, value in evaluate(y_test, y_pred).items()})
+    return result
+
+
+def benchmark_encodings(data_path=TRAINING_PATH, estimators=('random_forest', 'lightgbm'),
+                        encodings=ENCODINGS, scale=1, random_state=42, verbose=True):
+    """Vergleiche die Encodings je Modell; gibt eine Ergebnistabelle zurück."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for estimator in estimators:
+        for encoding in [e for e in encodings if e in SUPPORTED_ENCODINGS[estimator]]:
+            # Neuer Prozess je Lauf: ru_maxrss misst nur diesen Lauf
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(_run_encoding, data_path, estimator, encoding, scale, random_state).result()
+            results.append(result)
+            if verbose:
+                default = ' (Standard)' if DEFAULT_ENCODING[estimator] == encoding else ''
+                print(f"  {estimator:<14} {encoding:<7}{default:<11} {result['n_features']:>4} Spalten · "
+                      f"Fit {result['fit_seconds']:7.2f}s · Peak {result['peak_rss_mb']:7.1f} MB · "
+                      f"R² {result['r2']:.4f} · MAE {result['mae']:.2f} €")
+    return pd.DataFrame(results)
+
+
+# ---------------------------------------------------------------------------
+# Stufen-Benchmarks: Eingaben aus den mitgelieferten Daten erzeugen
+# ---------------------------------------------------------------------------
+
+def replicate(df, scale, seed=42, multiplicative=(), additive=()):
+    """
+    ``scale`` Kopien von ``df``; ab der zweiten Kopie werden die Spalten in
+    ``multiplicative`` mit ``exp(N(0, NOISE))`` multipliziert und auf
+    ``additive`` (Koordinaten) ``N(0, COORD_NOISE)`` addiert.
+    """
+    if scale <= 1:
+        return df.reset_index(drop=True)
+    out = pd.concat([df] * scale, ignore_index=True)
+    rng = np.random.default_rng(seed)
+    copies = np.arange(len(out)) >= len(df)     # erste Kopie bleibt unverändert
+    for column in multiplicative:
+        if column in out.columns:
+            factor = np.exp(rng.normal(0.0, NOISE, int(copies.sum())))
+            values = out[column].to_numpy(dtype='float64', copy=True)
+            values[copies] *= factor
+            out[column] = values.astype(out[column].dtype)
+    for column in additive:
+        if column in out.columns:
+            values = out[column].to_numpy(dtype='float64', copy=True)
+            values[copies] += rng.normal(0.0, COORD_NOISE, int(copies.sum()))
+            out[column] = values.astype(out[column].dtype)
+    return out
+
+
+def _listings(scale, seed):
+    """Angebote wie in der Heatmap (``load_data``): Schema, €/m², ohne Zeilen mit fehlenden Pflichtwerten."""
+    from berlin_housing.datasets import load_processed
+
+    df = replicate(load_processed(LISTINGS_PATH), scale, seed,
+                   multiplicative=('price', 'size'), additive=('lat', 'lon'))
+    df['price_per_sqm'] = (df['price'] / df['size']).replace([np.inf, -np.inf], np.nan)
+    return df.dropna(subset=['price', 'size', 'district'])
+
+
+def _register_csv(scale, seed, directory):
+    """
+    Synthetisches Adressregister im Format von ``wohnlagen_enriched.csv`` (liegt
+    nicht im Repository): ``scale`` × Anzahl Angebote Adressen, PLZ gezogen nach
+    den Adresszahlen (``Entries``) aus ``berlin_plz_mapping_detailed.csv``.
+    """
+    from berlin_housing.pipeline.common import PROCESSED_DIR
+
+    detailed = pd.read_csv(f'{PROCESSED_DIR}/berlin_plz_mapping_detailed.csv', dtype={'PLZ': str})
+    rows = scale * len(pd.read_csv(LISTINGS_PATH, usecols=['year']))
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(detailed), size=rows, p=detailed['Entries'] / detailed['Entries'].sum())
+    register = pd.DataFrame({
+        'plz': detailed['PLZ'].to_numpy()[picks],
+        'ortsteil_neu': detailed['Ortsteil'].to_numpy()[picks],
+        'bezirk_neu': detailed['Bezirk'].to_numpy()[picks],
+    })
+    path = os.path.join(directory, f'wohnlagen_x{scale}.csv')
+    register.to_csv(path, index=False)
+    return path, rows
+
+
+def _prepare_plz_mapping(scale, seed, workdir):
+    import create_enhanced_plz_mapping_with_coords as mapping
+
+    mapping.get_ortsteil_index()    # Index-Cache aufwärmen, nicht mitmessen
+    path, rows = _register_csv(scale, seed, workdir)
+    return {'path': path}, rows
+
+
+def _run_plz_mapping(path):
+    from create_enhanced_plz_mapping_with_coords import create_enhanced_plz_mapping
+
+    return create_enhanced_plz_mapping(path)
+
+
+def _prepare_normalize(raw_name, mapping_name, perturb):
+    def prepare(scale, seed, workdir):
+        from berlin_housing.pipeline.common import PROCESSED_DIR, RAW_DIR
+
+        raw = replicate(pd.read_csv(f'{RAW_DIR}/{raw_name}'), scale, seed, multiplicative=perturb)
+        return {'raw': raw, 'plz_mapping': pd.read_csv(f'{PROCESSED_DIR}/{mapping_name}')}, len(raw)
+    return prepare
+
+
+def _run_normalize(module_name):
+    def run(raw, plz_mapping):
+        import importlib
+
+        return importlib.import_module(f'berlin_housing.pipeline.{module_name}').normalize(raw, plz_mapping)
+    return run
+
+
+def _enriched_datasets(scale, seed):
+    from berlin_housing.pipeline.common import PROCESSED_DIR
+
+    frames = []
+    for name in ('dataset_2018_2019_enriched.csv', 'dataset_2022_enriched.csv', 'dataset_2025_enriched.csv'):
+        df = pd.read_csv(f'{PROCESSED_DIR}/{name}', dtype={'plz': 'string'})
+        frames.append(replicate(df, scale, seed, multiplicative=('price', 'size')))
+    return frames
+
+
+def _prepare_combine(scale, seed, workdir):
+    frames = _enriched_datasets(scale, seed)
+    return {'datasets': frames}, sum(len(df) for df in frames)
+
+
+def _run_combine(datasets):
+    from berlin_housing.pipeline.combine import combine
+
+    return combine(*datasets)
+
+
+def _prepare_enrich_final(scale, seed, workdir):
+    from berlin_housing.pipeline.combine import combine
+    from berlin_housing.pipeline.common import PLZ_MAPPING_ENHANCED_PATH
+
+    # Eingabe wie in der Pipeline-Stufe: das kombinierte Dataset mit PLZ
+    combined = combine(*_enriched_datasets(scale, seed))
+    return {'combined': combined, 'plz_mapping': pd.read_csv(PLZ_MAPPING_ENHANCED_PATH, dtype={'PLZ': 'str'})}, len(combined)
+
+
+def _run_enrich_final(combined, plz_mapping):
+    from berlin_housing.pipeline.combine import enrich_final
+
+    return enrich_final(combined, plz_mapping)
+
+
+def _prepare_listings(scale, seed, workdir):
+    import create_interactive_price_heatmap_FIXED  # noqa: F401 – Modul-Import nicht mitmessen (ohne folium)
+
+    df = _listings(scale, seed)
+    return {'df': df}, len(df)
+
+
+def _run_price_categories(df):
+    from create_interactive_price_heatmap_FIXED import calculate_price_categories
+
+    return calculate_price_categories(df)
+
+
+def _run_price_cube(df):
+    from berlin_housing.price_cube import build_price_cube
+
+    return build_price_cube(df)
+
+
+def _run_aggregate_store(df):
+    from berlin_housing.aggregate_store import AggregateStore
+
+    return AggregateStore.from_frame(df)
+
+
+def _prepare_map(scale, seed, workdir):
+    """Eingaben wie in ``main()`` der Heatmap bis unmittelbar vor ``create_interactive_map``."""
+    # Die Heatmap importiert folium und die Layer erst beim Aufbau der Karte; hier vorab laden,
+    # damit weder die erste gemessene Wiederholung noch die RSS-Basis den Import enthält
+    import folium  # noqa: F401
+    import folium.plugins  # noqa: F401
+    import berlin_housing.density_grid  # noqa: F401
+    import berlin_housing.map_fragments  # noqa: F401
+    import berlin_housing.map_layers  # noqa: F401
+    from create_interactive_price_heatmap_FIXED import calculate_price_categories, fill_missing_coordinates
+    from berlin_housing.price_cube import build_price_cube
+
+    df, price_quantiles = calculate_price_categories(_listings(scale, seed))
+    df = fill_missing_coordinates(df, seed=seed)
+    return {'df': df, 'price_quantiles': price_quantiles, 'cube': build_price_cube(df)}, len(df)
+
+
+def _run_map(df, price_quantiles, cube):
+    """Karte aufbauen und zu HTML rendern (das Schreiben der Datei selbst wird nicht gemessen)."""
+    from create_interactive_price_heatmap_FIXED import create_interactive_map
+
+    m = create_interactive_map(df, price_quantiles, cube)
+    return m.get_root().render()
+
+
+# Stufe → (Eingaben + Zeilenzahl erzeugen, Stufe ausführen); das Erzeugen wird nicht mitgemessen
+STAGE_BENCHMARKS = {
+    'plz_mapping': (_prepare_plz_mapping, _run_plz_mapping),
+    'normalize_2018_2019': (_prepare_normalize('Dataset_2018_2019.csv',
+                                               'berlin_plz_mapping_enhanced.csv', ('baseRent', 'livingSpace')),
+                            _run_normalize('dataset_2018_2019')),
+    'normalize_2022': (_prepare_normalize('Dataset_2022.csv',
+                                          'berlin_plz_mapping.csv', ('KALTMIETE', 'WOHNFLAECHE')),
+                       _run_normalize('dataset_2022')),
+    'normalize_2025': (_prepare_normalize('Dataset_2025.csv', 'berlin_plz_mapping.csv', ()),
+                       _run_normalize('dataset_2025')),
+    'combine': (_prepare_combine, _run_combine),
+    'enrich_final': (_prepare_enrich_final, _run_enrich_final),
+    'price_categories': (_prepare_listings, _run_price_categories),
+    'price_cube': (_prepare_listings, _run_price_cube),
+    'aggregate_store': (_prepare_listings, _run_aggregate_store),
+    'interactive_map': (_prepare_map, _run_map),
+}
+
+
+def _run_stage(stage, scale, repeat, seed, trace_memory):
+    """Ein Lauf (im Kindprozess): Eingaben erzeugen, Stufe ``repeat``-mal messen."""
+    prepare, run = STAGE_BENCHMARKS[stage]
+    with tempfile.TemporaryDirectory(prefix='berlin_housing_bench_') as workdir:
+        with contextlib.redirect_stdout(io.StringIO()):     # Fortschrittsausgaben der Stufen unterdrücken
+            inputs, rows = prepare(scale, seed, workdir)
+            rss_before = _peak_rss_mb()
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run(**inputs)
+                timings.append(time.perf_counter() - start)
+            peak_rss = _peak_rss_mb()
+
+            alloc_peak = None
+            if trace_memory:
+                tracemalloc.start()
+                run(**inputs)
+                alloc_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                tracemalloc.stop()
+
+    best = min(timings)
+    return {
+        'stage': stage,
+        'scale': scale,
+        'rows': rows,
+        'repeat': repeat,
+        'seconds_min': round(best, 4),
+        'seconds_median': round(statistics.median(timings), 4),
+        'rows_per_second': round(rows / best) if best > 0 else None,
+        'peak_rss_mb': round(peak_rss, 1),
+        'peak_rss_delta_mb': round(peak_rss - rss_before, 1),
+        'alloc_peak_mb': round(alloc_peak, 1) if alloc_peak is not None else None,
+    }
+
+
+def benchmark_stages(stages=tuple(STAGE_BENCHMARKS), scales=STAGE_SCALES, repeat=3, seed=42,
+                     trace_memory=True, verbose=True):
+    """Miss jede Stufe bei jeder Skalierung; gibt eine Ergebnistabelle zurück."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for stage in stages:
+        for scale in scales:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(_run_stage, stage, scale, repeat, seed, trace_memory).result()
+            results.append(result)
+            if verbose:
+                alloc = f" · Alloc {result['alloc_peak_mb']:7.1f} MB" if result['alloc_peak_mb'] is not None else ''
+                print(f"  {stage:<20} {scale:>4}× {result['rows']:>10,} Zeilen · "
+                      f"{result['seconds_min']:8.3f}s (Median {result['seconds_median']:.3f}s) · "
+                      f"Peak {result['peak_rss_mb']:7.1f} MB{alloc}")
+    return pd.DataFrame(results)
+
+
+def compare_results(base_path, new_path, threshold=0.10):
+    """
+    Stelle zwei ``stages``-Ergebnisdateien gegenüber (Schlüssel: Stufe + Skalierung).
+
+    ``ratio`` = neue / alte beste Zeit; ``regression`` ist gesetzt, wenn die
+    neue Zeit mehr als ``threshold`` (relativ) langsamer ist.
+    """
+    frames = []
+    for path in (base_path, new_path):
+        with open(path, encoding='utf-8') as f:
+            frames.append(pd.DataFrame(json.load(f)['results']))
+    keys = ['stage', 'scale']
+    columns = keys + ['seconds_min', 'peak_rss_mb', 'alloc_peak_mb']
+    merged = frames[0][columns].merge(frames[1][columns], on=keys, suffixes=('_base', '_new'))
+    merged['ratio'] = (merged['seconds_min_new'] / merged['seconds_min_base']).round(3)
+    merged['regression'] = merged['ratio'] > 1 + threshold
+    return merged
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(name, results, params, output_dir=BENCHMARK_DIR):
+    """Schreibe Ergebnisse + Parameter als JSON; gibt den Pfad zurück."""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f'{name}.json')
+    payload = {
+        'benchmark': name,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': params,
+        'results': results.to_dict(orient='records'),
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=1)
+    os.replace(tmp_path, path)
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m berlin_housing.benchmark', description='Benchmarks ausführen.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    encodings = commands.add_parser('encodings', help='Kategorien-Encodings vergleichen')
+    encodings.add_argument('--data', default=TRAINING_PATH, help='Trainings-CSV (Standard: %(default)s)')
+    encodings.add_argument('--estimators', nargs='+', default=['random_forest', 'lightgbm'], choices=ESTIMATORS)
+    encodings.add_argument('--encodings', nargs='+', default=list(ENCODINGS), choices=ENCODINGS)
+    encodings.add_argument('--scale', type=int, default=1,
+                           help='Daten n-fach replizieren (Standard: 1); R²/MAE sind dann zu optimistisch, '
+                                'weil Duplikate im Testteil landen')
+    encodings.add_argument('--output-dir', default=BENCHMARK_DIR)
+
+    stages = commands.add_parser('stages', help='Mapping, Cleaning, Aggregation und Karte bei mehreren Datengrößen')
+    stages.add_argument('--only', nargs='+', default=list(STAGE_BENCHMARKS), choices=list(STAGE_BENCHMARKS),
+                        metavar='STAGE', help='Nur diese Stufen (Standard: alle)')
+    stages.add_argument('--scales', nargs='+', type=int, default=list(STAGE_SCALES),
+                        help='Vielfache der Angebotsdaten (Standard: %(default)s)')
+    stages.add_argument('--repeat', type=int, default=3, help='Wiederholungen je Messung (Standard: %(default)s)')
+    stages.add_argument('--seed', type=int, default=42)
+    stages.add_argument('--no-tracemalloc', action='store_true', help='Keinen zusätzlichen Lauf mit tracemalloc')
+    stages.add_argument('--name', help='Name der Ergebnisdatei (Standard: stages_<Zeitstempel>)')
+    stages.add_argument('--output-dir', default=BENCHMARK_DIR)
+
+    compare = commands.add_parser('compare', help='Zwei stages-Ergebnisdateien vergleichen')
+    compare.add_argument('base', help='Ältere Ergebnisdatei (JSON)')
+    compare.add_argument('new', help='Neuere Ergebnisdatei (JSON)')
+    compare.add_argument('--threshold', type=float, default=0.10,
+                         help='Relative Verlangsamung, ab der eine Regression gemeldet wird (Standard: %(default)s)')
+    return parser.parse_args(argv)
+
+
+def main_stages(args):
+    print(f"⏱️  Stufen-Benchmark ({', '.join(f'{scale}×' for scale in args.scales)} Daten, {args.repeat} Wiederholungen)")
+    results = benchmark_stages(args.only, args.scales, args.repeat, args.seed, not args.no_tracemalloc)
+    params = {'stages': args.only, 'scales': args.scales, 'repeat': args.repeat, 'seed': args.seed,
+              'noise': NOISE, 'revision': _git_revision(), 'python': sys.version.split()[0],
+              'pandas': pd.__version__, 'numpy': np.__version__, 'cpus': os.cpu_count()}
+    name = args.name or f"stages_{time.strftime('%Y%m%d_%H%M%S')}"
+    path = save_results(name, results, params, args.output_dir)
+    print(f"✅ Ergebnisse gespeichert: {path}")
+    return 0
+
+
+def main_compare(args):
+    for path in (args.base, args.new):
+        if not os.path.exists(path):
+            print(f"❌ Datei nicht gefunden: {path}")
+            return 1
+    merged = compare_results(args.base, args.new, args.threshold)
+    if merged.empty:
+        print("⚠️  Keine gemeinsamen Stufen/Skalierungen")
+        return 1
+    for row in merged.to_dict('records'):
+        marker = '🔴' if row['regression'] else ('🟢' if row['ratio'] < 1 - args.threshold else '⚪')
+        print(f"  {marker} {row['stage']:<20} {row['scale']:>4}× {row['seconds_min_base']:8.3f}s → "
+              f"{row['seconds_min_new']:8.3f}s ({row['ratio']:.2f}×) · "
+              f"Peak {row['peak_rss_mb_base']:7.1f} → {row['peak_rss_mb_new']:7.1f} MB")
+    regressions = int(merged['regression'].sum())
+    if regressions:
+        print(f"❌ {regressions} Regression(en) über {args.threshold:.0%}")
+        return 1
+    print("✅ Keine Regressionen")
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'stages':
+        return main_stages(args)
+    if args.command == 'compare':
+        return main_compare(args)
+
+    if not os.path.exists(args.data):
+        print(f"❌ Datei nicht gefunden: {args.data}")
+        return 1
+    print(f"⏱️  Encoding-Benchmark ({args.scale}× Daten)")
+    results = benchmark_encodings(args.data, args.estimators, args.encodings, args.scale)
+    params = {'data': args.data, 'scale': args.scale}
+    path = save_results(f'encodings_x{args.scale}', results, params, args.output_dir)
+    print(f"✅ Ergebnisse gespeichert: {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Spaltenbasierter Cache für die verarbeiteten Datensätze
+=======================================================
+
+``load_processed`` liest eine CSV aus ``data/processed/`` über eine
+Parquet- (oder Feather-)Datei, die daneben liegt, z.B.
+``berlin_housing_combined_enriched_final.parquet``. Beim ersten Laden wird die
+CSV einmal gelesen, auf ein festes Schema gebracht und als Sidecar
+geschrieben; danach werden nur noch die angeforderten Spalten und Zeilen
+gelesen:
+
+- Kategorien für ``district``, ``ortsteil``, ``bezirk``, ``source``, ``wol``,
+  ``dataset_id``
+- PLZ als 5-stellige Strings (``plz`` und ``PLZ``), ungültige Werte als <NA>
+- Fließkommazahlen als float32, ``year`` als int16
+
+Der Sidecar trägt den SHA1 der CSV und die Schema-Version in seinen
+Metadaten und wird neu geschrieben, sobald sich eines davon ändert.
+Ohne pyarrow wird die CSV direkt gelesen (gleiches Schema, kein Cache).
+
+``load_combined`` liest das kombinierte Dataset zusammen mit allen
+angehängten Batches aus ``data/processed/partitions/year=…/source=…/``.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from berlin_housing.plz import normalize_plz
+
+PROCESSED_DIR = 'data/processed'
+COMBINED_PATH = os.path.join(PROCESSED_DIR, 'berlin_housing_combined_enriched_final.csv')
+# Angehängte Scrape-Batches (``berlin_housing.pipeline.batches``), Hive-partitioniert nach year/source
+PARTITIONS_DIR = os.path.join(PROCESSED_DIR, 'partitions')
+
+# Bei jeder Änderung an apply_schema erhöhen - vorhandene Sidecars werden dann neu geschrieben
+SCHEMA_VERSION = 2
+
+CATEGORICAL_COLUMNS = ('district', 'ortsteil', 'bezirk', 'source', 'wol', 'dataset_id')
+PLZ_COLUMNS = ('plz', 'PLZ')
+INT_COLUMNS = {'year': 'int16'}
+FLOAT_DTYPE = 'float32'
+
+FORMATS = {'parquet': '.parquet', 'feather': '.feather'}
+METADATA_KEY = b'berlin_housing'
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def apply_schema(df):
+    """Wende das feste Schema auf einen frisch gelesenen DataFrame an (unbekannte Spalten bleiben)."""
+    df = df.copy()
+    for col in df.columns:
+        if col in PLZ_COLUMNS:
+            df[col] = normalize_plz(df[col])
+        elif col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype('category')
+        elif col in INT_COLUMNS and not df[col].isna().any():
+            df[col] = df[col].astype(INT_COLUMNS[col])
+        elif pd.api.types.is_float_dtype(df[col]):
+            df[col] = df[col].astype(FLOAT_DTYPE)
+    return df
+
+
+def sidecar_path(csv_path, fmt='parquet'):
+    """Pfad des Sidecars zu einer CSV-Datei."""
+    return os.path.splitext(csv_path)[0] + FORMATS[fmt]
+
+
+def _read_csv(csv_path, columns=None):
+    dtype = {col: 'string' for col in PLZ_COLUMNS}
+    usecols = None if columns is None else lambda col: col in set(columns)
+    return pd.read_csv(csv_path, dtype=dtype, usecols=usecols)
+
+
+def _apply_filters(df, filters):
+    """Filter im pyarrow-Format [(Spalte, Operator, Wert), ...] auf einen DataFrame anwenden."""
+    ops = {
+        '==': lambda s, v: s == v, '=': lambda s, v: s == v, '!=': lambda s, v: s != v,
+        '<': lambda s, v: s < v, '<=': lambda s, v: s <= v,
+        '>': lambda s, v: s > v, '>=': lambda s, v: s >= v,
+        'in': lambda s, v: s.isin(v), 'not in': lambda s, v: ~s.isin(v),
+    }
+    mask = np.ones(len(df), dtype=bool)
+    for col, op, value in filters:
+        mask &= ops[op](df[col], value).fillna(False).to_numpy(dtype=bool)
+    return df[mask].reset_index(drop=True)
+
+
+def _sidecar_metadata(path, fmt):
+    import pyarrow.dataset as ds
+
+    metadata = ds.dataset(path, format=fmt).schema.metadata or {}
+    if METADATA_KEY not in metadata:
+        return None
+    return json.loads(metadata[METADATA_KEY])
+
+
+def write_sidecar(csv_path, fmt='parquet', source_hash=None):
+    """Lese die CSV, wende das Schema an und schreibe den Sidecar. Gibt den Pfad zurück."""
+    import pyarrow as pa
+
+    df = apply_schema(_read_csv(csv_path))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    info = {'source_hash': source_hash or _file_hash(csv_path), 'schema_version': SCHEMA_VERSION}
+    metadata = dict(table.schema.metadata or {})
+    metadata[METADATA_KEY] = json.dumps(info)
+    table = table.replace_schema_metadata(metadata)
+
+    path = sidecar_path(csv_path, fmt)
+    tmp_path = path + '.tmp'
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, tmp_path, compression='zstd')
+    else:
+        import pyarrow.feather as feather
+        feather.write_feather(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+    return path
+
+
+def ensure_sidecar(csv_path, fmt='parquet'):
+    """Gib den Pfad eines aktuellen Sidecars zurück und schreibe ihn bei Bedarf neu."""
+    path = sidecar_path(csv_path, fmt)
+    source_hash = _file_hash(csv_path)
+
+    if os.path.exists(path):
+        try:
+            info = _sidecar_metadata(path, fmt)
+            if info == {'source_hash': source_hash, 'schema_version': SCHEMA_VERSION}:
+                return path
+        except Exception:
+            pass  # Defekter Sidecar → neu schreiben
+
+    return write_sidecar(csv_path, fmt, source_hash)
+
+
+def load_processed(csv_path=COMBINED_PATH, columns=None, filters=None, fmt='parquet', use_cache=True):
+    """
+    Lade einen verarbeiteten Datensatz mit festem Schema.
+
+    ``columns`` beschränkt die gelesenen Spalten, ``filters`` ist eine Liste
+    von ``(Spalte, Operator, Wert)``-Tupeln wie bei pyarrow, z.B.
+    ``[('year', 'in', [2022, 2025])]``; beides wird beim Sidecar schon beim
+    Lesen angewendet. Filterspalten müssen nicht in ``columns`` enthalten sein.
+    """
+    try:
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+    except ImportError:
+        use_cache = False
+
+    if not use_cache:
+        read_columns = None if columns is None else list(columns) + [f[0] for f in filters or [] if f[0] not in columns]
+        df = apply_schema(_read_csv(csv_path, read_columns))
+        if filters:
+            df = _apply_filters(df, filters)
+        return df if columns is None else df[list(columns)]
+
+    dataset = ds.dataset(ensure_sidecar(csv_path, fmt), format=fmt)
+    expression = pq.filters_to_expression(filters) if filters else None
+    table = dataset.to_table(columns=list(columns) if columns is not None else None, filter=expression)
+    return table.to_pandas()
+
+
+def load_partitions(partitions_dir=PARTITIONS_DIR, columns=None, filters=None):
+    """Lade alle angehängten Batches (None, wenn es keine gibt)."""
+    if not os.path.isdir(partitions_dir):
+        return None
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    dataset = ds.dataset(partitions_dir, format='parquet', partitioning='hive')
+    if not dataset.files:
+        return None
+    expression = pq.filters_to_expression(filters) if filters else None
+    table = dataset.to_table(columns=list(columns) if columns is not None else None, filter=expression)
+    return table.to_pandas()
+
+
+def load_combined(columns=None, filters=None, partitions_dir=PARTITIONS_DIR, csv_path=COMBINED_PATH):
+    """
+    Lade das kombinierte Dataset inklusive angehängter Batches.
+
+    ``columns`` und ``filters`` wie bei ``load_processed``; beides wird auch
+    beim Lesen der Partitionen angewendet (Filter auf ``year``/``source``
+    überspringen ganze Partitionen).
+    """
+    base = load_processed(csv_path, columns=columns, filters=filters)
+    appended = load_partitions(partitions_dir, columns=columns, filters=filters)
+    if appended is None or appended.empty:
+        return base
+    # Kategorien unterscheiden sich je Teil → nach dem concat Schema erneut anwenden
+    return apply_schema(pd.concat([base, appended], ignore_index=True))
@@ -0,0 +1,99 @@
+"""
+Hexagon-Dichteraster aus Angebotskoordinaten
+============================================
+
+Verdichtet Angebote vektorisiert auf ein Hexagon-Raster (spitze Oberseite,
+Zellradius in Metern) und liefert je Zelle Mittelpunkt, Anzahl, Median-Miete
+und Median-€/m². Koordinaten werden dafür um Berlin-Mitte in Meter
+umgerechnet (äquirektangulär, für Berlin ausreichend genau); die Karte
+zeichnet die Sechsecke mit derselben Umrechnung, sodass sie lückenlos
+aneinanderliegen.
+
+``RESOLUTIONS`` ordnet jedem Zellradius die Zoomstufen zu, in denen sein
+Layer gezeichnet wird; feinere Raster erscheinen erst beim Hineinzoomen.
+
+    cells = density_grid(df, 500)   # lat, lon, count, price_median, price_per_sqm_median
+"""
+
+import numpy as np
+import pandas as pd
+
+ORIGIN = (52.52, 13.405)
+METERS_PER_DEGREE_LAT = 110_540.0
+METERS_PER_DEGREE_LON = 111_320.0
+
+# Zellradius (m) → (min. Zoom, max. Zoom)
+RESOLUTIONS = {
+    2000: (0, 11),
+    1000: (12, 12),
+    500: (13, 13),
+    250: (14, 18),
+}
+
+CELL_COLUMNS = ['lat', 'lon', 'count', 'price_median', 'price_per_sqm_median']
+
+
+def project(lat, lon, origin=ORIGIN):
+    """Grad → Meter relativ zu ``origin`` (x nach Osten, y nach Norden)."""
+    lat0, lon0 = origin
+    x = (np.asarray(lon, dtype='float64') - lon0) * METERS_PER_DEGREE_LON * np.cos(np.radians(lat0))
+    y = (np.asarray(lat, dtype='float64') - lat0) * METERS_PER_DEGREE_LAT
+    return x, y
+
+
+def unproject(x, y, origin=ORIGIN):
+    """Meter relativ zu ``origin`` → (lat, lon)."""
+    lat0, lon0 = origin
+    lat = lat0 + np.asarray(y, dtype='float64') / METERS_PER_DEGREE_LAT
+    lon = lon0 + np.asarray(x, dtype='float64') / (METERS_PER_DEGREE_LON * np.cos(np.radians(lat0)))
+    return lat, lon
+
+
+def hex_cells(x, y, size):
+    """Axiale Hexagon-Koordinaten (q, r) für Punkte in Metern, Zellradius ``size`` (gerundet in Würfelkoordinaten)."""
+    q = (np.sqrt(3) / 3 * x - y / 3) / size
+    r = (2 / 3 * y) / size
+    s = -q - r
+
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype('int64'), rr.astype('int64')
+
+
+def hex_centers(q, r, size):
+    """Mittelpunkte (x, y) in Metern zu axialen Hexagon-Koordinaten."""
+    x = size * np.sqrt(3) * (q + r / 2)
+    y = size * 1.5 * r
+    return x, y
+
+
+def density_grid(df, size, origin=ORIGIN):
+    """
+    Angebote → Hexagon-Zellen mit Radius ``size`` (m).
+
+    Zeilen ohne Koordinaten werden ignoriert. Ergebnis: eine Zeile je
+    besetzter Zelle mit ``CELL_COLUMNS`` (Mittelpunkt in Grad).
+    """
+    rows = df[df['lat'].notna() & df['lon'].notna()]
+    price = rows['price'].astype('float64')
+    price_per_sqm = rows['price_per_sqm'] if 'price_per_sqm' in rows.columns else price / rows['size']
+    x, y = project(rows['lat'], rows['lon'], origin)
+    q, r = hex_cells(x, y, size)
+
+    cells = pd.DataFrame({
+        'q': q, 'r': r,
+        'price': price.to_numpy(),
+        'price_per_sqm': price_per_sqm.astype('float64').replace([np.inf, -np.inf], np.nan).to_numpy(),
+    }).groupby(['q', 'r'], sort=True).agg(
+        count=('price', 'size'),
+        price_median=('price', 'median'),
+        price_per_sqm_median=('price_per_sqm', 'median'),
+    ).reset_index()
+
+    cx, cy = hex_centers(cells['q'].to_numpy(), cells['r'].to_numpy(), size)
+    cells['lat'], cells['lon'] = unproject(cx, cy, origin)
+    return cells[CELL_COLUMNS]
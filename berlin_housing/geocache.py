@@ -0,0 +1,197 @@
+"""
+Persistenter Geocoding-Cache (SQLite)
+=====================================
+
+Speichert aufgelöste Adressen bzw. Ortsangaben ("Biedenkopfer Straße 46-54,
+13507 Berlin", "Staaken_Spandau") unter ihrem getrimmten Text in
+``data/cache/geocode.sqlite``: PLZ, Ortsteil, Bezirk, Koordinaten und die
+Methode, die den Eintrag aufgelöst hat (z.B. ``plz_regex``, ``name_match``,
+``street_index``, ``unresolved``).
+
+``resolve(values, resolver)`` schlägt alle eindeutigen Schlüssel eines Batches
+mit einer Abfrage nach, ruft ``resolver`` nur für die fehlenden auf und
+schreibt deren Ergebnisse in einer Transaktion zurück. Fehlende Koordinaten
+werden über die PLZ aus ``berlin_plz_mapping_enhanced.csv`` ergänzt.
+
+Jeder Namensraum (z.B. ``dataset_2025.address``) hat einen Fingerabdruck aus
+den Inhalten der Mapping-CSVs, der GeoJSON, des Adressregisters und einer
+Resolver-Version. Ändert sich eine davon, werden die Einträge des
+Namensraums verworfen.
+
+    cache = GeocodeCache('dataset_2025.address', version=...)
+    resolved = cache.resolve(raw['address'], lambda missing: resolve_addresses(missing, ...))
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+from berlin_housing.plz import PLZ_MAPPING_ENHANCED_PATH, BerlinPlz
+
+CACHE_PATH = 'data/cache/geocode.sqlite'
+
+# Änderungen an diesen Dateien machen alle Einträge ungültig (fehlende Dateien zählen als "fehlt")
+DEPENDENCIES = (
+    'data/processed/berlin_plz_mapping.csv',
+    PLZ_MAPPING_ENHANCED_PATH,
+    'data/raw/lor_ortsteile.geojson',
+    'data/raw/wohnlagen_enriched.csv',
+)
+
+COLUMNS = ['plz', 'ortsteil', 'district', 'bezirk', 'lat', 'lon', 'method']
+
+
+def normalize_keys(values):
+    """
+    Adressen → Cache-Schlüssel (ohne Leerraum am Rand); None für fehlende.
+
+    Groß-/Kleinschreibung und Umlaut-Schreibweisen bleiben erhalten, weil die
+    Auflösung sie unterscheidet ("Mitte (Ortsteil)" vs. "mitte").
+    """
+    values = pd.Series(values)
+    keys = values.astype('string').str.strip()
+    return keys.astype(object).where(keys.notna() & (keys != ''), None)
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(dependencies=DEPENDENCIES, version=None):
+    """SHA1 über die Inhalte der Abhängigkeiten und die Resolver-Version."""
+    digest = hashlib.sha1(str(version).encode('utf-8'))
+    for path in dependencies:
+        digest.update(path.encode('utf-8'))
+        digest.update((_file_hash(path) if os.path.exists(path) else 'fehlt').encode('utf-8'))
+    return digest.hexdigest()
+
+
+class GeocodeCache:
+    """Auflösungs-Cache eines Namensraums in einer SQLite-Datei."""
+
+    def __init__(self, namespace, path=CACHE_PATH, dependencies=DEPENDENCIES, version=None):
+        self.namespace = namespace
+        self.path = path
+        self.fingerprint = fingerprint(dependencies, version)
+        self.hits = 0
+        self.misses = 0
+        self._locator = None
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self._create()
+        self._validate()
+
+    def __repr__(self):
+        return f'GeocodeCache({self.namespace!r}, {len(self):,} Einträge)'
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM entries WHERE namespace = ?',
+                                       (self.namespace,)).fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _create(self):
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS namespaces '
+                                    '(namespace TEXT PRIMARY KEY, fingerprint TEXT NOT NULL)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS entries (namespace TEXT NOT NULL, context TEXT NOT NULL, '
+                'key TEXT NOT NULL, plz TEXT, ortsteil TEXT, district TEXT, bezirk TEXT, lat REAL, lon REAL, '
+                'method TEXT, resolved_at TEXT, PRIMARY KEY (namespace, context, key)) WITHOUT ROWID')
+
+    def _validate(self):
+        """Verwirf die Einträge des Namensraums, wenn sich eine Abhängigkeit geändert hat."""
+        row = self.connection.execute('SELECT fingerprint FROM namespaces WHERE namespace = ?',
+                                      (self.namespace,)).fetchone()
+        if row and row[0] == self.fingerprint:
+            return
+        with self.connection:
+            self.connection.execute('DELETE FROM entries WHERE namespace = ?', (self.namespace,))
+            self.connection.execute('INSERT OR REPLACE INTO namespaces VALUES (?, ?)',
+                                    (self.namespace, self.fingerprint))
+
+    def lookup(self, keys, context=''):
+        """Gespeicherte Einträge zu ``keys`` (normalisiert) als DataFrame mit Index ``key``."""
+        keys = [key for key in pd.unique(pd.Series(keys, dtype=object)) if key is not None]
+        self.connection.execute('CREATE TEMP TABLE IF NOT EXISTS query (key TEXT PRIMARY KEY)')
+        with self.connection:
+            self.connection.execute('DELETE FROM temp.query')
+            self.connection.executemany('INSERT INTO temp.query VALUES (?)', ((key,) for key in keys))
+            rows = self.connection.execute(
+                f'SELECT e.key, {", ".join("e." + column for column in COLUMNS)} '
+                'FROM temp.query q JOIN entries e ON e.key = q.key AND e.namespace = ? AND e.context = ?',
+                (self.namespace, context)).fetchall()
+        frame = pd.DataFrame(rows, columns=['key'] + COLUMNS, dtype=object)
+        return frame.set_index(pd.Index(frame.pop('key'), dtype=object, name='key'))
+
+    def insert(self, resolved, context=''):
+        """Schreibe ``resolved`` (Index = normalisierter Schlüssel, Spalten aus ``COLUMNS``) in einer Transaktion."""
+        frame = resolved.reindex(columns=COLUMNS).astype(object)
+        frame = frame.where(frame.notna(), None)
+        now = time.strftime('%Y-%m-%dT%H:%M:%S')
+        rows = ((self.namespace, context, key, *values, now)
+                for key, values in zip(frame.index, frame.itertuples(index=False)))
+        with self.connection:
+            self.connection.executemany(
+                f'INSERT OR REPLACE INTO entries (namespace, context, key, {", ".join(COLUMNS)}, resolved_at) '
+                f'VALUES (?, ?, ?, {", ".join("?" for _ in COLUMNS)}, ?)', rows)
+
+    def _locate(self, resolved):
+        """Ergänze Bezirk und Koordinaten über die PLZ."""
+        if not os.path.exists(PLZ_MAPPING_ENHANCED_PATH) or resolved['plz'].isna().all():
+            return resolved
+        if self._locator is None:
+            self._locator = BerlinPlz.from_csv(PLZ_MAPPING_ENHANCED_PATH)
+        located = self._locator.lookup(resolved['plz'])
+        for column in ('bezirk', 'lat', 'lon'):
+            resolved[column] = resolved[column].where(resolved[column].notna(), located[column].astype(object))
+        return resolved
+
+    def resolve(self, values, resolver, context=''):
+        """
+        Löse ``values`` über den Cache auf; ``resolver(missing)`` bekommt je
+        fehlendem Schlüssel den ersten Originalwert (Series mit Schlüssel als
+        Index) und gibt einen DataFrame mit Spalten aus ``COLUMNS`` zurück.
+        ``context`` trennt Einträge, die mit anderen Resolver-Argumenten
+        entstanden sind (z.B. Hash der übergebenen Mappings).
+
+        Ergebnis: DataFrame mit ``COLUMNS`` und dem Index von ``values``.
+        """
+        values = pd.Series(values)
+        keys = normalize_keys(values)
+        cached = self.lookup(keys, context)
+
+        known = keys.notna()
+        firsts = values[known].groupby(keys[known], sort=False).first()
+        firsts.index = firsts.index.astype(object)
+        missing = firsts[~firsts.index.isin(cached.index)]
+        self.hits += len(firsts) - len(missing)
+        self.misses += len(missing)
+
+        if len(missing):
+            resolved = resolver(missing).reindex(columns=COLUMNS).astype(object)
+            resolved.index = missing.index
+            resolved['method'] = resolved['method'].where(resolved['method'].notna(), 'unresolved')
+            resolved = self._locate(resolved)
+            self.insert(resolved, context)
+            cached = pd.concat([cached, resolved])
+
+        result = cached.reindex(keys.to_numpy())
+        result.index = values.index
+        return result.astype(object).where(result.notna(), None)
@@ -0,0 +1,95 @@
+"""
+Fragment-Cache der Jahres-Layer
+===============================
+
+Die Karte besteht zum größten Teil aus Layern pro Jahr. Jedes Jahr wird als
+Fragment gespeichert: sein Ausschnitt des Preiswürfels (Werte der
+Jahres-Choropleths, Grundlage der Gesamt-Choropleths und der Legende) und
+die serialisierten Marker-Daten.
+
+Der Fingerabdruck eines Fragments ist ein SHA1 über die Zeilen des Jahres
+(nur die Spalten, die in die Layer eingehen) und die Darstellungsparameter.
+Bei einem erneuten Lauf werden nur Jahre mit geändertem Fingerabdruck neu
+aufgebaut; ein neues Jahr kostet damit unabhängig von der Anzahl der
+historischen Jahre gleich viel.
+
+Je Jahr liegen bis zu ``MAX_PER_YEAR`` Fragmente nebeneinander (eines je
+Fingerabdruck), damit ein Wechsel von ``--marker-mode``, ``--sample`` oder
+``--layers`` die Fragmente der anderen Einstellung nicht verdrängt. Darüber
+hinaus werden die am längsten nicht gelesenen Fragmente des Jahres gelöscht.
+
+    data/cache/map_fragments/<jahr>-<fingerabdruck>.pkl
+"""
+
+import glob
+import hashlib
+import inspect
+import json
+import os
+import pickle
+
+FRAGMENT_DIR = 'data/cache/map_fragments'
+MAX_PER_YEAR = 8
+
+
+def code_version(*functions):
+    """SHA1 über den Quelltext der Funktionen, die ein Fragment erzeugen."""
+    digest = hashlib.sha1()
+    for func in functions:
+        digest.update(inspect.getsource(func).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def fingerprint(frame, params):
+    """SHA1 über die Werte von ``frame`` (ohne Index), seine Spalten und die Parameter ``params``."""
+    import pandas as pd
+
+    digest = hashlib.sha1(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    digest.update(','.join(map(str, frame.columns)).encode('utf-8'))
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _fragment_path(year, key, fragment_dir):
+    return os.path.join(fragment_dir, f'{int(year)}-{key}.pkl')
+
+
+def load_fragment(year, key, fragment_dir=FRAGMENT_DIR):
+    """Gespeichertes Fragment des Jahres mit dem Fingerabdruck ``key`` (sonst None)."""
+    path = _fragment_path(year, key, fragment_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            fragment = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if fragment.get('fingerprint') != key:
+        return None
+    os.utime(path)    # zuletzt gelesen → wird beim Aufräumen zuletzt gelöscht
+    return fragment
+
+
+def prune_fragments(year, fragment_dir=FRAGMENT_DIR, keep=MAX_PER_YEAR):
+    """Lösche bis auf die ``keep`` zuletzt genutzten Fragmente des Jahres (auch alte ``<jahr>.pkl``)."""
+    paths = glob.glob(os.path.join(fragment_dir, f'{int(year)}-*.pkl'))
+    paths.sort(key=os.path.getmtime, reverse=True)
+    stale = paths[keep:] + glob.glob(os.path.join(fragment_dir, f'{int(year)}.pkl'))
+    for path in stale:
+        try:
+            os.remove(path)
+        except OSError:
+            pass    # parallel gelöscht
+    return len(stale)
+
+
+def save_fragment(fragment, fragment_dir=FRAGMENT_DIR):
+    """Speichere ein Fragment (mit ``year`` und ``fingerprint``) atomar und räume alte Fragmente des Jahres auf."""
+    os.makedirs(fragment_dir, exist_ok=True)
+    path = _fragment_path(fragment['year'], fragment['fingerprint'], fragment_dir)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(fragment, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    prune_fragments(fragment['year'], fragment_dir)
+    return path
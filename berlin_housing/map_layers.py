@@ -0,0 +1,480 @@
+"""
+Folium-Layer mit gemeinsamer Ortsteil-Geometrie
+===============================================
+
+Die Ortsteil-Polygone werden einmal geladen, topologieerhaltend vereinfacht
+und als eine JavaScript-Variable in die Karte geschrieben. Jeder
+Choropleth-Layer verweist auf diese Geometrie und bringt nur seinen
+Wertevektor (ein Wert pro Ortsteil) mit.
+
+Mit ``save_split_map`` werden die Daten aller anfangs ausgeblendeten Layer in
+eigene JSON-Dateien ausgelagert und erst beim Einblenden per ``fetch`` geladen.
+
+``HexDensityLayer`` zeichnet vorberechnete Hexagon-Zellen (Anzahl und Mediane
+je Zelle) statt einzelner Angebote.
+
+Große Daten-Arrays (Geometrie, Marker, Zellen) werden als ``RawScript`` eingebettet:
+branca übersetzt sonst die fertige Script-Ausgabe jedes Layers noch einmal als
+Jinja-Template, was mit der Datenmenge wächst.
+"""
+
+import json
+import os
+
+import numpy as np
+from branca.colormap import StepColormap
+from branca.element import Element, MacroElement
+from branca.utilities import color_brewer
+from folium.map import Layer
+from folium.plugins import MarkerCluster
+from folium.template import Template
+
+from berlin_housing.density_grid import CELL_COLUMNS, METERS_PER_DEGREE_LAT, METERS_PER_DEGREE_LON, ORIGIN
+
+GEOJSON_PATH = 'data/raw/lor_ortsteile.geojson'
+
+# Eigenschaften, die in der gemeinsamen Geometrie erhalten bleiben
+KEEP_PROPERTIES = ('spatial_alias', 'OTEIL', 'BEZIRK')
+
+
+def _round_coords(coords, precision):
+    if isinstance(coords[0], (int, float)):
+        return [round(c, precision) for c in coords]
+    return [_round_coords(c, precision) for c in coords]
+
+
+def script_json(data):
+    """Serialisiere ``data`` kompakt als JSON, das sicher in ein ``<script>`` eingebettet werden kann."""
+    text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return text.replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026')
+
+
+def load_ortsteil_geometry(path=GEOJSON_PATH, tolerance=0.0001, precision=5):
+    """
+    Lade und vereinfache die Ortsteil-Polygone.
+
+    ``tolerance`` ist die Vereinfachungstoleranz in Grad (0 = keine
+    Vereinfachung). Gemeinsame Grenzen bleiben deckungsgleich
+    (``shapely.coverage_simplify``). Ohne Vereinfachung wird die Datei nur mit
+    ``json`` gelesen, shapely ist dann nicht nötig. Gibt eine schlanke
+    FeatureCollection zurück, in der jedes Feature seine Position als
+    ``properties.idx`` trägt.
+    """
+    with open(path, encoding='utf-8') as f:
+        collection = json.load(f)
+
+    features = collection['features']
+    geometries = [feat['geometry'] for feat in features]
+
+    if tolerance:
+        import shapely
+        from shapely.geometry import mapping, shape
+
+        shapes = np.array([shape(geo) for geo in geometries], dtype=object)
+        if hasattr(shapely, 'coverage_simplify'):
+            shapes = shapely.coverage_simplify(shapes, tolerance)
+        else:
+            shapes = shapely.simplify(shapes, tolerance, preserve_topology=True)
+        geometries = [mapping(geom) for geom in shapes]
+
+    slim = []
+    for i, (feat, geo) in enumerate(zip(features, geometries)):
+        slim.append({
+            'type': 'Feature',
+            'properties': dict({k: feat['properties'].get(k) for k in KEEP_PROPERTIES}, idx=i),
+            'geometry': {'type': geo['type'], 'coordinates': _round_coords(geo['coordinates'], precision)},
+        })
+
+    return {'type': 'FeatureCollection', 'features': slim}
+
+
+def attach_properties(collection, columns):
+    """
+    Schreibe Kennzahlen direkt in die Feature-Eigenschaften.
+
+    ``columns`` bildet Eigenschaftsnamen auf Wertevektoren ab (ein Wert pro
+    Feature, Reihenfolge der Geometrie); NaN wird zu ``None``.
+    """
+    for name, values in columns.items():
+        for feature, value in zip(collection['features'], values):
+            missing = value is None or (isinstance(value, float) and np.isnan(value))
+            feature['properties'][name] = None if missing else value
+    return collection
+
+
+class RawScript(Element):
+    """Fertiges JavaScript, das unverändert (ohne Jinja-Durchlauf) in die Karte geschrieben wird."""
+
+    def __init__(self, text):
+        super().__init__()
+        self._name = 'RawScript'
+        self.text = text
+
+    def render(self, **kwargs):
+        return self.text
+
+
+class SharedGeometry(MacroElement):
+    """Schreibt die Ortsteil-Geometrie einmal als JavaScript-Variable in die Karte."""
+
+    def __init__(self, data):
+        super().__init__()
+        self._name = 'SharedGeometry'
+        self.data = data
+
+    def render(self, **kwargs):
+        script = RawScript(f'var {self.get_name()} = {script_json(self.data)};')
+        self.get_root().script.add_child(script, name=self.get_name())
+        super().render(**kwargs)
+
+    @property
+    def aliases(self):
+        """Ortsteil-Schlüssel (spatial_alias) in Feature-Reihenfolge."""
+        return [feat['properties']['spatial_alias'] for feat in self.data['features']]
+
+
+class SharedChoropleth(Layer):
+    """
+    Choropleth-Layer auf einer ``SharedGeometry``.
+
+    ``values`` enthält einen Wert pro Feature (Reihenfolge der Geometrie).
+    Ohne ``fill_color`` wird nur die Umrandung gezeichnet. ``tooltip`` ist eine
+    Liste von (Beschriftung, Feld)-Paaren; Felder werden zuerst in ``columns``
+    (zusätzliche Wertevektoren), dann in den Feature-Eigenschaften gesucht.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function () {
+                {%- if this.data_url %}
+                var values = [];
+                var columns = {};
+                {%- else %}
+                var values = {{ this.values|tojson }};
+                var columns = {{ this.columns|tojson }};
+                {%- endif %}
+                var edges = {{ this.edges|tojson }};
+                var colors = {{ this.colors|tojson }};
+                var tooltip = {{ this.tooltip|tojson }};
+                var base = {{ this.style|tojson }};
+
+                function fillColor(v) {
+                    if (v === null || v === undefined || colors.length === 0) { return null; }
+                    var k = 0;
+                    while (k < colors.length - 1 && v >= edges[k + 1]) { k++; }
+                    return colors[k];
+                }
+
+                var layer = L.geoJson({{ 'null' if this.data_url else this.geometry.get_name() }}, {
+                    style: function (feature) {
+                        var style = Object.assign({}, base);
+                        var color = fillColor(values[feature.properties.idx]);
+                        if (color !== null) { style.fillColor = color; }
+                        return style;
+                    },
+                    onEachFeature: function (feature, layer) {
+                        if (tooltip.length === 0) { return; }
+                        layer.bindTooltip(function () {
+                            var i = feature.properties.idx;
+                            return tooltip.map(function (t) {
+                                var v = (t[1] in columns) ? columns[t[1]][i] : feature.properties[t[1]];
+                                return '<b>' + t[0] + '</b> ' + (v === null || v === undefined ? '' : v);
+                            }).join('<br>');
+                        }, {sticky: true});
+                    }
+                });
+                {%- if this.data_url %}
+
+                // Wertevektor erst beim ersten Einblenden laden
+                var loaded = false;
+                layer.on('add', function () {
+                    if (loaded) { return; }
+                    loaded = true;
+                    fetch({{ this.data_url|tojson }})
+                        .then(function (response) { return response.json(); })
+                        .then(function (payload) {
+                            values = payload.values;
+                            columns = payload.columns;
+                            layer.addData({{ this.geometry.get_name() }});
+                        });
+                });
+                {%- endif %}
+                return layer;
+            })();
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, geometry, values=None, fill_color=None, bins=6, fill_opacity=0.7,
+                 line_color='black', line_weight=1, line_opacity=0.2, legend_name='',
+                 columns=None, tooltip=None, style=None, data_key=None,
+                 name=None, overlay=True, control=True, show=True):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = 'SharedChoropleth'
+        self.geometry = geometry
+        self.data_key = data_key
+        self.data_url = None
+        self.values = [None if v is None or np.isnan(v) else float(v) for v in values] if values is not None else []
+        self.columns = {k: [None if isinstance(v, float) and np.isnan(v) else v for v in vals]
+                        for k, vals in (columns or {}).items()}
+        self.tooltip = [list(t) for t in (tooltip or [])]
+        self.style = style or {
+            'weight': line_weight,
+            'opacity': line_opacity,
+            'color': line_color,
+            'fillOpacity': fill_opacity,
+        }
+        self.edges, self.colors = [], []
+        self.color_scale = None
+
+        real_values = np.array([v for v in self.values if v is not None], dtype='float64')
+        if fill_color and len(real_values):
+            # Gleiche Klassenbildung wie folium.Choropleth (gleich breite Bins)
+            _, bin_edges = np.histogram(real_values, bins=bins)
+            self.colors = color_brewer(fill_color, n=len(bin_edges) - 1)
+            self.edges = [float(e) for e in bin_edges]
+            self.color_scale = StepColormap(
+                self.colors,
+                index=self.edges,
+                vmin=self.edges[0],
+                vmax=self.edges[-1],
+                caption=legend_name,
+            )
+            self.add_child(self.color_scale)
+
+    def lazy_payload(self):
+        """Daten, die im Split-Modus in eine eigene Datei ausgelagert werden."""
+        return {'values': self.values, 'columns': self.columns}
+
+    def render(self, **kwargs):
+        if self.color_scale:
+            # Die Legende braucht die Karte als Parent (wie bei folium.Choropleth)
+            self.color_scale._parent = self._parent
+        super().render(**kwargs)
+
+
+class CompactMarkerCluster(MarkerCluster):
+    """
+    Marker-Cluster aus einem kompakten Daten-Array.
+
+    Jede Zeile in ``data`` wird im Browser an ``callback`` (JavaScript-Funktion,
+    die einen Leaflet-Layer zurückgibt) übergeben. Im Gegensatz zu
+    ``FastMarkerCluster`` wird ``show`` respektiert und die Daten können per
+    ``data_url`` nachgeladen werden. Statt ``data`` kann ``data_json`` ein
+    bereits serialisiertes Daten-Array sein (z.B. aus dem Fragment-Cache), das
+    unverändert eingebettet wird.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function () {
+                var callback = {{ this.callback }};
+                var cluster = L.markerClusterGroup({{ this.options|tojavascript }});
+
+                function populate(data) {
+                    var markers = new Array(data.length);
+                    for (var i = 0; i < data.length; i++) { markers[i] = callback(data[i]); }
+                    cluster.addLayers(markers);
+                }
+                {%- if this.data_url %}
+
+                // Marker erst beim ersten Einblenden laden
+                var loaded = false;
+                cluster.on('add', function () {
+                    if (loaded) { return; }
+                    loaded = true;
+                    fetch({{ this.data_url|tojson }})
+                        .then(function (response) { return response.json(); })
+                        .then(populate);
+                });
+                {%- else %}
+                populate({{ this.get_name() }}_data);
+                {%- endif %}
+                return cluster;
+            })();
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, data, callback, data_key=None, name=None, overlay=True, control=True, show=True,
+                 data_json=None, **kwargs):
+        super().__init__(name=name, overlay=overlay, control=control, show=show, **kwargs)
+        self._name = 'CompactMarkerCluster'
+        self.data = data
+        self.data_json = data_json
+        self.callback = callback.strip()
+        self.data_key = data_key
+        self.data_url = None
+
+    def lazy_payload(self):
+        """Daten, die im Split-Modus in eine eigene Datei ausgelagert werden."""
+        return self.data_json if self.data_json is not None else self.data
+
+    def render(self, **kwargs):
+        if not self.data_url:
+            # Daten vor dem Cluster-Script, ohne Jinja-Durchlauf
+            data = self.data_json if self.data_json is not None else script_json(self.data)
+            self.get_root().script.add_child(RawScript(f'var {self.get_name()}_data = {data};'),
+                                             name=self.get_name() + '_data')
+        super().render(**kwargs)
+
+
+class HexDensityLayer(Layer):
+    """
+    Hexagon-Dichte-Layer aus vorberechneten Zellen (``density_grid.density_grid``).
+
+    Je Zelle werden nur Mittelpunkt, Anzahl und die beiden Mediane übertragen;
+    die Sechsecke mit Radius ``size`` (m) entstehen im Browser auf einem Canvas
+    und nur in den Zoomstufen ``min_zoom``–``max_zoom``. Die Füllfarbe zeigt den
+    Median-€/m² (gleich breite Klassen wie bei ``SharedChoropleth``).
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function () {
+                {%- if this.data_url %}
+                var cells = null;
+                {%- else %}
+                var cells = {{ this.get_name() }}_data;
+                {%- endif %}
+                var zoom = {{ [this.min_zoom, this.max_zoom]|tojson }};
+                var edges = {{ this.edges|tojson }};
+                var colors = {{ this.colors|tojson }};
+                var dLat = {{ this.size }} / {{ this.meters_lat }};
+                var dLon = {{ this.size }} / ({{ this.meters_lon }} * Math.cos({{ this.origin[0] }} * Math.PI / 180));
+                var corners = [0, 1, 2, 3, 4, 5].map(function (k) {
+                    var angle = Math.PI / 180 * (60 * k - 30);
+                    return [Math.sin(angle) * dLat, Math.cos(angle) * dLon];
+                });
+                var renderer = L.canvas();
+                var group = L.featureGroup();
+                var drawn = false;
+
+                function fillColor(v) {
+                    if (v === null || colors.length === 0) { return 'grey'; }
+                    var k = 0;
+                    while (k < colors.length - 1 && v >= edges[k + 1]) { k++; }
+                    return colors[k];
+                }
+
+                function tooltip(c) {
+                    return '<b>Angebote:</b> ' + c[2]
+                         + '<br><b>Median-Miete:</b> ' + (c[3] === null ? '-' : c[3].toFixed(0) + '€')
+                         + '<br><b>Median €/m²:</b> ' + (c[4] === null ? '-' : c[4].toFixed(2) + '€');
+                }
+
+                function update() {
+                    var z = group._map ? group._map.getZoom() : -1;
+                    var visible = cells !== null && z >= zoom[0] && z <= zoom[1];
+                    if (visible === drawn) { return; }
+                    group.clearLayers();
+                    drawn = visible;
+                    if (!visible) { return; }
+                    cells.forEach(function (c) {
+                        var polygon = L.polygon(corners.map(function (d) { return [c[0] + d[0], c[1] + d[1]]; }), {
+                            renderer: renderer, color: 'white', weight: 0.5,
+                            fillColor: fillColor(c[4]), fillOpacity: 0.6
+                        });
+                        polygon.bindTooltip(function () { return tooltip(c); }, {sticky: true});
+                        group.addLayer(polygon);
+                    });
+                }
+
+                group.on('add', function () {
+                    group._map.on('zoomend', update);
+                    {%- if this.data_url %}
+                    if (cells === null) {
+                        fetch({{ this.data_url|tojson }})
+                            .then(function (response) { return response.json(); })
+                            .then(function (payload) { cells = payload; update(); });
+                    }
+                    {%- endif %}
+                    update();
+                });
+                group.on('remove', function () {
+                    group._map.off('zoomend', update);
+                    group.clearLayers();
+                    drawn = false;
+                });
+                return group;
+            })();
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, cells, size, origin=ORIGIN, min_zoom=0, max_zoom=18, fill_color='YlOrRd', bins=6,
+                 data_key=None, name=None, overlay=True, control=True, show=True):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = 'HexDensityLayer'
+        self.size = float(size)
+        self.origin = [float(c) for c in origin]
+        self.meters_lat = METERS_PER_DEGREE_LAT
+        self.meters_lon = METERS_PER_DEGREE_LON
+        self.min_zoom = int(min_zoom)
+        self.max_zoom = int(max_zoom)
+        self.data_key = data_key
+        self.data_url = None
+
+        rounded = cells[CELL_COLUMNS].astype('float64').round(
+            {'lat': 5, 'lon': 5, 'price_median': 2, 'price_per_sqm_median': 2})
+        self.data = [[None if np.isnan(v) else v for v in row] for row in rounded.itertuples(index=False)]
+        for row in self.data:
+            row[2] = int(row[2])
+
+        self.edges, self.colors = [], []
+        real_values = rounded['price_per_sqm_median'].dropna().to_numpy()
+        if fill_color and len(real_values):
+            _, bin_edges = np.histogram(real_values, bins=bins)
+            self.colors = color_brewer(fill_color, n=len(bin_edges) - 1)
+            self.edges = [float(e) for e in bin_edges]
+
+    def lazy_payload(self):
+        """Daten, die im Split-Modus in eine eigene Datei ausgelagert werden."""
+        return self.data
+
+    def render(self, **kwargs):
+        if not self.data_url:
+            self.get_root().script.add_child(RawScript(f'var {self.get_name()}_data = {script_json(self.data)};'),
+                                             name=self.get_name() + '_data')
+        super().render(**kwargs)
+
+
+def _iter_elements(element):
+    for child in list(element._children.values()):
+        yield child
+        yield from _iter_elements(child)
+
+
+def save_split_map(m, output_file):
+    """
+    Speichere die Karte als HTML-Hülle plus eine JSON-Datei pro ausgeblendetem Layer.
+
+    Die Dateien liegen in ``<name>_data/`` neben der HTML-Datei und werden
+    relativ geladen; die Karte muss daher über einen (lokalen) Webserver
+    geöffnet werden, z.B. ``python -m http.server``. Gibt die Liste der
+    geschriebenen Datendateien zurück.
+    """
+    output_dir = os.path.dirname(output_file)
+    data_dir_name = os.path.splitext(os.path.basename(output_file))[0] + '_data'
+    data_dir = os.path.join(output_dir, data_dir_name)
+    os.makedirs(data_dir, exist_ok=True)
+
+    written = []
+    for element in _iter_elements(m):
+        if not hasattr(element, 'lazy_payload') or element.show:
+            continue
+        file_name = f'{element.data_key or element.get_name()}.json'
+        payload = element.lazy_payload()
+        with open(os.path.join(data_dir, file_name), 'w', encoding='utf-8') as f:
+            if isinstance(payload, str):
+                f.write(payload)
+            else:
+                json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+        element.data_url = f'{data_dir_name}/{file_name}'
+        written.append(os.path.join(data_dir, file_name))
+
+    m.save(output_file)
+    return written
@@ -0,0 +1,331 @@
+"""
+Gespeichertes Mietpreis-Modell
+==============================
+
+Notebook 06 trainiert Vorverarbeitung (``ColumnTransformer`` aus
+``SimpleImputer`` und ``OneHotEncoder``) und Modell im Kernel. ``RentModel``
+hält beides zusammen mit dem Eingabe-Schema und einer Versionsnummer und wird
+als eine Datei unter ``data/models/`` gespeichert:
+
+    python -m berlin_housing.model train                # LightGBM auf dem finalen Dataset
+    python -m berlin_housing.model train --estimator random_forest
+    python -m berlin_housing.model serve --port 8000    # HTTP-Scoring (berlin_housing.serving)
+
+Zum Vorhersagen wird nur das Artefakt geladen (kein Neu-Training, kein
+Lesen der Trainings-CSV):
+
+    from berlin_housing.model import predict
+    df['predicted_price'] = predict(df)
+
+``predict`` akzeptiert beliebige DataFrames mit den Feature-Spalten; fehlende
+Spalten werden als leer behandelt, unbekannte Kategorien ignoriert.
+
+Kategorien (``district``, ``wol``, ``plz``, ``ortsteil``, ``bezirk``) werden je
+nach ``encoding`` kodiert:
+
+- ``onehot``: One-Hot wie in Notebook 06, immer als CSR-Matrix (Standard für
+  ``linear``)
+- ``codes``: eine Ganzzahl-Spalte je Merkmal; LightGBM nutzt sie als native
+  Kategorien (Standard für ``lightgbm``)
+- ``target``: Out-of-Fold-Target-Encoding (``sklearn.preprocessing.TargetEncoder``,
+  Standard für ``random_forest``)
+
+Bei ``codes`` und ``target`` bleibt die Matrix 10 Spalten breit, egal wie
+viele PLZ und Ortsteile dazukommen (Vergleich: ``python -m berlin_housing.benchmark encodings``).
+"""
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+MODEL_DIR = 'data/models'
+MODEL_PATH = os.path.join(MODEL_DIR, 'rent_model.joblib')
+TRAINING_PATH = 'data/processed/berlin_housing_combined_enriched_final.csv'
+
+# Bei inkompatiblen Änderungen an RentModel erhöhen - ältere Artefakte werden dann abgelehnt
+ARTIFACT_VERSION = 2
+
+TARGET = 'price'
+NUMERICAL_FEATURES = ['size', 'rooms', 'year', 'lat', 'lon']
+CATEGORICAL_FEATURES = ['district', 'wol', 'plz', 'ortsteil', 'bezirk']
+FEATURES = NUMERICAL_FEATURES + CATEGORICAL_FEATURES
+
+ESTIMATORS = ('linear', 'random_forest', 'lightgbm')
+ENCODINGS = ('onehot', 'codes', 'target')
+DEFAULT_ENCODING = {'linear': 'onehot', 'random_forest': 'target', 'lightgbm': 'codes'}
+# Ganzzahl-Codes sind für lineare Modelle bedeutungslos (und enthalten NaN)
+SUPPORTED_ENCODINGS = {'linear': ('onehot', 'target'), 'random_forest': ENCODINGS, 'lightgbm': ENCODINGS}
+# Spaltenpositionen der Kategorien in der Ausgabe von build_preprocessor (nach den Zahlen)
+CATEGORICAL_POSITIONS = list(range(len(NUMERICAL_FEATURES), len(FEATURES)))
+
+
+def build_preprocessor(encoding='onehot', random_state=42):
+    """Mittelwert-Imputation für Zahlen + Kodierung der Kategorien (``ENCODINGS``)."""
+    from sklearn.compose import ColumnTransformer
+    from sklearn.impute import SimpleImputer
+    from sklearn.model_selection import KFold
+    from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, TargetEncoder
+
+    if encoding == 'onehot':
+        categorical = OneHotEncoder(handle_unknown='ignore')
+    elif encoding == 'codes':
+        # Unbekannte und fehlende Kategorien → NaN (LightGBM: fehlender Wert)
+        categorical = OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=np.nan,
+                                     encoded_missing_value=np.nan)
+    elif encoding == 'target':
+        # fit_transform kodiert per Cross-Fitting (out-of-fold), transform mit allen Trainingsdaten
+        folds = KFold(n_splits=5, shuffle=True, random_state=random_state)
+        categorical = TargetEncoder(target_type='continuous', cv=folds)
+    else:
+        raise KeyError(f"Unbekanntes Encoding: {encoding} ({', '.join(ENCODINGS)})")
+
+    return ColumnTransformer(
+        transformers=[
+            ('num', SimpleImputer(strategy='mean'), NUMERICAL_FEATURES),
+            ('cat', categorical, CATEGORICAL_FEATURES),
+        ],
+        remainder='passthrough',
+        sparse_threshold=1.0 if encoding == 'onehot' else 0.0,   # One-Hot immer als CSR
+    )
+
+
+def build_estimator(name, random_state=42, **params):
+    """Modelle aus Notebook 06: ``linear``, ``random_forest``, ``lightgbm`` (``params`` überschreiben die Standards)."""
+    if name == 'linear':
+        from sklearn.linear_model import LinearRegression
+        return LinearRegression(**params)
+    if name == 'random_forest':
+        from sklearn.ensemble import RandomForestRegressor
+        return RandomForestRegressor(**{'n_estimators': 100, 'random_state': random_state, 'n_jobs': -1, **params})
+    if name == 'lightgbm':
+        import lightgbm as lgb
+        return lgb.LGBMRegressor(**{'random_state': random_state, 'verbose': -1, **params})
+    raise KeyError(f"Unbekanntes Modell: {name} ({', '.join(ESTIMATORS)})")
+
+
+def fit_params(estimator, encoding):
+    """Zusätzliche ``fit``-Argumente (LightGBM: Kategorien-Spalten bei ``codes``)."""
+    if estimator == 'lightgbm' and encoding == 'codes':
+        return {'categorical_feature': CATEGORICAL_POSITIONS}
+    return {}
+
+
+def fit_model(X, y, estimator='lightgbm', encoding=None, random_state=42):
+    """
+    Passe Vorverarbeitung und Modell auf vorbereiteten Features an.
+
+    Gibt ``(preprocessor, model)`` zurück; ``encoding=None`` wählt
+    ``DEFAULT_ENCODING[estimator]``.
+    """
+    encoding = encoding or DEFAULT_ENCODING[estimator]
+    if encoding not in SUPPORTED_ENCODINGS[estimator]:
+        raise ValueError(f"Encoding {encoding} passt nicht zu {estimator} ({', '.join(SUPPORTED_ENCODINGS[estimator])})")
+    preprocessor = build_preprocessor(encoding, random_state)
+    model = build_estimator(estimator, random_state)
+    model.fit(preprocessor.fit_transform(X, y), y, **fit_params(estimator, encoding))
+    return preprocessor, model
+
+
+def prepare_features(df):
+    """
+    DataFrame → Feature-Spalten im Trainingsformat.
+
+    Zahlen als float64, Kategorien als object mit ``np.nan`` für fehlende
+    Werte (wie beim Lesen der CSV); PLZ als 5-stellige Strings.
+    """
+    from berlin_housing.plz import normalize_plz
+
+    features = {}
+    for col in NUMERICAL_FEATURES:
+        values = df[col] if col in df.columns else np.nan
+        features[col] = pd.to_numeric(pd.Series(values, index=df.index), errors='coerce').astype('float64')
+    for col in CATEGORICAL_FEATURES:
+        if col not in df.columns:
+            features[col] = pd.Series(np.nan, index=df.index, dtype=object)
+            continue
+        values = normalize_plz(df[col]) if col == 'plz' else df[col].astype('string')
+        features[col] = values.astype(object).where(values.notna(), np.nan)
+    return pd.DataFrame(features, index=df.index)[FEATURES]
+
+
+def _library_versions():
+    import sklearn
+
+    versions = {'sklearn': sklearn.__version__, 'pandas': pd.__version__, 'numpy': np.__version__}
+    try:
+        import lightgbm
+        versions['lightgbm'] = lightgbm.__version__
+    except ImportError:
+        pass
+    return versions
+
+
+class RentModel:
+    """Vorverarbeitung + Modell + Schema als eine speicherbare Einheit."""
+
+    def __init__(self, preprocessor, estimator, name, encoding='onehot', metrics=None):
+        self.preprocessor = preprocessor
+        self.estimator = estimator
+        self.name = name
+        self.encoding = encoding
+        self.metrics = metrics or {}
+        self.version = ARTIFACT_VERSION
+        self.schema = {
+            'numerical': list(NUMERICAL_FEATURES),
+            'categorical': list(CATEGORICAL_FEATURES),
+            'target': TARGET,
+            'encoding': encoding,
+        }
+        self.libraries = _library_versions()
+        self.trained_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+    def __repr__(self):
+        return (f'RentModel({self.name!r}, encoding={self.encoding!r}, version={self.version}, '
+                f'trained_at={self.trained_at!r})')
+
+    def transform(self, df):
+        return self.preprocessor.transform(prepare_features(df))
+
+    def predict(self, df):
+        """Vorhergesagte Kaltmiete je Zeile (float64-Array in der Reihenfolge von ``df``)."""
+        if len(df) == 0:
+            return np.empty(0, dtype='float64')
+        return np.asarray(self.estimator.predict(self.transform(df)), dtype='float64')
+
+    def save(self, path=MODEL_PATH):
+        """Speichere das Artefakt (atomar über eine temporäre Datei). Gibt den Pfad zurück."""
+        import joblib
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        joblib.dump(self, tmp_path, compress=3)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        """Lade ein Artefakt; lehnt fremde Objekte und andere Artefakt-Versionen ab."""
+        import joblib
+
+        model = joblib.load(path)
+        if not isinstance(model, cls):
+            raise TypeError(f"{path} enthält kein RentModel, sondern {type(model).__name__}")
+        if model.version != ARTIFACT_VERSION:
+            raise ValueError(f"{path}: Artefakt-Version {model.version}, erwartet {ARTIFACT_VERSION} - neu trainieren")
+        current = _library_versions()
+        changed = {lib: (v, current.get(lib)) for lib, v in model.libraries.items() if current.get(lib) != v}
+        if changed:
+            warnings.warn(f"{path} wurde mit anderen Bibliotheksversionen trainiert: {changed}")
+        return model
+
+
+def split(df, test_size=0.2, random_state=42):
+    """Features und Ziel, aufgeteilt wie in Notebook 06: ``X_train, X_test, y_train, y_test``."""
+    from sklearn.model_selection import train_test_split
+
+    df = df[df[TARGET].notna()]
+    X = prepare_features(df)
+    y = df[TARGET].to_numpy(dtype='float64')
+    return train_test_split(X, y, test_size=test_size, random_state=random_state)
+
+
+def evaluate(y_true, y_pred):
+    """R², MAE und RMSE."""
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+    return {
+        'r2': float(r2_score(y_true, y_pred)),
+        'mae': float(mean_absolute_error(y_true, y_pred)),
+        'rmse': float(np.sqrt(mean_squared_error(y_true, y_pred))),
+    }
+
+
+def train(df, estimator='lightgbm', encoding=None, test_size=0.2, random_state=42):
+    """
+    Trainiere Vorverarbeitung + Modell auf ``df`` und gib ein ``RentModel`` zurück.
+
+    Anders als im Notebook wird der Preprocessor nur auf dem Trainingsteil
+    angepasst; ``metrics`` enthält R², MAE und RMSE auf dem Testteil.
+    ``encoding=None`` wählt ``DEFAULT_ENCODING[estimator]``.
+    """
+    encoding = encoding or DEFAULT_ENCODING[estimator]
+    X_train, X_test, y_train, y_test = split(df, test_size, random_state)
+    preprocessor, model = fit_model(X_train, y_train, estimator, encoding, random_state)
+
+    metrics = evaluate(y_test, model.predict(preprocessor.transform(X_test)))
+    metrics.update(n_train=int(len(y_train)), n_test=int(len(y_test)))
+    return RentModel(preprocessor, model, estimator, encoding, metrics)
+
+
+_LOADED = {}
+
+
+def load_model(path=MODEL_PATH):
+    """Geladenes Artefakt aus dem Prozess-Cache (neu geladen, wenn sich die Datei ändert)."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _LOADED:
+        _LOADED.clear()
+        _LOADED[key] = RentModel.load(path)
+    return _LOADED[key]
+
+
+def predict(df, path=MODEL_PATH):
+    """Batch-Vorhersage mit dem gespeicherten Modell."""
+    return load_model(path).predict(df)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m berlin_housing.model',
+                                     description='Mietpreis-Modell trainieren, speichern und bereitstellen.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = commands.add_parser('train', help='Modell trainieren und speichern')
+    train_parser.add_argument('--estimator', default='lightgbm', choices=ESTIMATORS)
+    train_parser.add_argument('--encoding', choices=ENCODINGS,
+                              help='Kodierung der Kategorien (Standard: je Modell, siehe DEFAULT_ENCODING)')
+    train_parser.add_argument('--data', default=TRAINING_PATH, help='Trainings-CSV (Standard: %(default)s)')
+    train_parser.add_argument('--output', default=MODEL_PATH, help='Artefakt (Standard: %(default)s)')
+
+    serve_parser = commands.add_parser('serve', help='HTTP-Scoring-Endpunkt starten')
+    serve_parser.add_argument('--model', default=MODEL_PATH, help='Artefakt (Standard: %(default)s)')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    serve_parser.add_argument('--max-batch', type=int, default=10000, help='Max. Zeilen je Micro-Batch')
+    serve_parser.add_argument('--max-wait-ms', type=float, default=5.0,
+                              help='Max. Wartezeit auf weitere Anfragen je Micro-Batch')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == 'train':
+        if not os.path.exists(args.data):
+            print(f"❌ Datei nicht gefunden: {args.data}")
+            return 1
+        encoding = args.encoding or DEFAULT_ENCODING[args.estimator]
+        print(f"🤖 Trainiere {args.estimator} ({encoding}) auf {args.data}")
+        start = time.perf_counter()
+        # Über den Paketnamen importieren, damit das Artefakt nicht auf __main__.RentModel verweist
+        from berlin_housing import model as rent_model
+        model = rent_model.train(pd.read_csv(args.data, dtype={'plz': 'string'}), args.estimator, encoding)
+        path = model.save(args.output)
+        m = model.metrics
+        print(f"  R² {m['r2']:.4f} · MAE {m['mae']:.2f} € · RMSE {m['rmse']:.2f} € "
+              f"({m['n_train']:,} Trainings-/{m['n_test']:,} Testzeilen, {time.perf_counter() - start:.1f}s)")
+        print(f"✅ Modell gespeichert: {path}")
+        return 0
+
+    from berlin_housing.serving import serve
+    serve(args.model, host=args.host, port=args.port, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
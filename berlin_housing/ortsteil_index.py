@@ -0,0 +1,203 @@
+"""
+Räumlicher Ortsteil-Index
+=========================
+
+Baut aus den 96 Polygonen in ``data/raw/lor_ortsteile.geojson`` einen Index mit
+Schwerpunkten, Bounding Boxes und einem STRtree auf. Der Index ersetzt die
+handgepflegte Koordinatentabelle:
+
+- Namens-Lookup in O(1) nach Normalisierung (``lookup`` / ``coordinates``)
+- Punkt-in-Polygon für viele Punkte in vektorisierten Batches (``locate``),
+  optional mit Nächster-Nachbar-Fallback über den STRtree
+
+Der Index wird als Pickle unter ``data/cache/`` zwischengespeichert und nur neu
+gebaut, wenn sich der Inhalt der GeoJSON-Datei ändert.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import re
+import unicodedata
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+GEOJSON_PATH = 'data/raw/lor_ortsteile.geojson'
+CACHE_PATH = 'data/cache/ortsteil_index.pkl'
+
+# Ortslagen ohne eigenes LOR-Polygon bzw. abweichende Schreibweisen
+# → kanonischer Ortsteil (OTEIL) in lor_ortsteile.geojson
+ORTSTEIL_ALIASES = {
+    'Hohenschönhausen': 'Alt-Hohenschönhausen',
+    'Treptow': 'Alt-Treptow',
+    'Hessenwinkel': 'Rahnsdorf',
+    'Wendenschloß': 'Köpenick',
+    'Köllnische Heide': 'Neukölln',
+    'Tegelort': 'Konradshöhe',
+}
+
+
+def normalize_name(name):
+    """Normalisiere einen Ortsteil-Namen für den Lookup (Groß/Klein, Umlaute, Trennzeichen)."""
+    if name is None:
+        return ''
+    text = unicodedata.normalize('NFC', str(name)).strip().casefold()
+    text = (text.replace('ä', 'ae').replace('ö', 'oe').replace('ü', 'ue')
+                .replace('ß', 'ss'))
+    return re.sub(r'[\s_\-]+', ' ', text)
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class OrtsteilIndex:
+    """Schwerpunkte, Bounding Boxes und STRtree der Berliner Ortsteile."""
+
+    def __init__(self, names, aliases, bezirke, geometries, source_hash):
+        self.names = list(names)                 # kanonische Namen (OTEIL)
+        self.aliases = list(aliases)             # spatial_alias aus der GeoJSON
+        self.bezirke = list(bezirke)
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.source_hash = source_hash
+
+        centroids = shapely.centroid(self.geometries)
+        # [lat, lon] wie in den Mapping-Tabellen
+        self.centroids = np.column_stack([shapely.get_y(centroids), shapely.get_x(centroids)])
+        self.bounds = shapely.bounds(self.geometries)  # minx, miny, maxx, maxy (lon/lat)
+
+        self._build_lookup()
+        shapely.prepare(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
+
+    def _build_lookup(self):
+        self._lookup = {}
+        for i, (name, alias) in enumerate(zip(self.names, self.aliases)):
+            self._lookup[normalize_name(name)] = i
+            self._lookup.setdefault(normalize_name(alias), i)
+        for alias, canonical in ORTSTEIL_ALIASES.items():
+            key = normalize_name(canonical)
+            if key in self._lookup:
+                self._lookup.setdefault(normalize_name(alias), self._lookup[key])
+
+    # Pickle ohne STRtree - der Baum ist für 96 Polygone in Millisekunden gebaut
+    def __getstate__(self):
+        return {
+            'names': self.names,
+            'aliases': self.aliases,
+            'bezirke': self.bezirke,
+            'geometries': self.geometries,
+            'source_hash': self.source_hash,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, name):
+        """Index des Ortsteils zu ``name`` oder None."""
+        return self._lookup.get(normalize_name(name))
+
+    def coordinates(self, name, decimals=4):
+        """Schwerpunkt ``[lat, lon]`` eines Ortsteils oder None."""
+        i = self.lookup(name)
+        if i is None:
+            return None
+        lat, lon = self.centroids[i]
+        return [round(float(lat), decimals), round(float(lon), decimals)]
+
+    def bezirk(self, name):
+        """Bezirk eines Ortsteils oder None."""
+        i = self.lookup(name)
+        return None if i is None else self.bezirke[i]
+
+    def locate(self, lat, lon, batch_size=1_000_000, max_distance=None):
+        """
+        Ordne Punkte ihrem Ortsteil zu.
+
+        Gibt ein int-Array mit Ortsteil-Indizes zurück (-1 = außerhalb Berlins
+        oder fehlende Koordinate). Punkte auf einer gemeinsamen Grenze erhalten
+        den Ortsteil mit dem kleinsten Index. Mit ``max_distance`` (in Grad)
+        werden Punkte knapp außerhalb über den STRtree dem nächsten Ortsteil
+        zugeordnet.
+        """
+        lat = np.asarray(lat, dtype='float64')
+        lon = np.asarray(lon, dtype='float64')
+        result = np.full(len(lat), -1, dtype='int32')
+
+        for start in range(0, len(lat), batch_size):
+            stop = min(start + batch_size, len(lat))
+            x, y = lon[start:stop], lat[start:stop]
+            codes = result[start:stop]
+            open_mask = ~(np.isnan(x) | np.isnan(y))
+
+            # Bounding-Box-Vorfilter in numpy, exakter Test nur für Kandidaten
+            for i, (minx, miny, maxx, maxy) in enumerate(self.bounds):
+                cand = np.flatnonzero(open_mask & (x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy))
+                if len(cand) == 0:
+                    continue
+                hit = cand[shapely.intersects_xy(self.geometries[i], x[cand], y[cand])]
+                codes[hit] = i
+                open_mask[hit] = False
+
+            if max_distance is not None:
+                rest = np.flatnonzero(open_mask)
+                if len(rest):
+                    points = shapely.points(x[rest], y[rest])
+                    point_idx, poly_idx = self.tree.query_nearest(points, max_distance=max_distance, all_matches=False)
+                    codes[rest[point_idx]] = poly_idx
+
+        return result
+
+    def locate_names(self, lat, lon, **kwargs):
+        """Wie ``locate``, aber mit Ortsteil-Namen (None für nicht zugeordnete Punkte)."""
+        codes = self.locate(lat, lon, **kwargs)
+        names = np.array(self.names + [None], dtype=object)
+        return names[codes]
+
+
+def build_ortsteil_index(geojson_path=GEOJSON_PATH, source_hash=None):
+    """Baue den Index direkt aus der GeoJSON-Datei."""
+    with open(geojson_path, encoding='utf-8') as f:
+        collection = json.load(f)
+
+    features = collection['features']
+    return OrtsteilIndex(
+        names=[feat['properties']['OTEIL'] for feat in features],
+        aliases=[feat['properties']['spatial_alias'] for feat in features],
+        bezirke=[feat['properties']['BEZIRK'] for feat in features],
+        geometries=[shape(feat['geometry']) for feat in features],
+        source_hash=source_hash or _file_hash(geojson_path),
+    )
+
+
+def load_ortsteil_index(geojson_path=GEOJSON_PATH, cache_path=CACHE_PATH):
+    """Lade den Index aus dem Cache; baue und speichere ihn neu, wenn sich die GeoJSON geändert hat."""
+    source_hash = _file_hash(geojson_path)
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                index = pickle.load(f)
+            if index.source_hash == source_hash:
+                return index
+        except Exception:
+            pass  # Defekter oder veralteter Cache → neu bauen
+
+    index = build_ortsteil_index(geojson_path, source_hash)
+
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        with open(cache_path, 'wb') as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return index
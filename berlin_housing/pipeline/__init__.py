@@ -0,0 +1,13 @@
+"""
+Bereinigungs-Pipeline
+=====================
+
+Die Bereinigung aus den Notebooks 01-04 als importierbare Stufen::
+
+    raw → normalized → enriched → combined → enriched_final
+
+Jede Stufe ist eine reine Funktion auf DataFrames (``dataset_2018_2019``,
+``dataset_2022``, ``dataset_2025``, ``combine``); ``stages`` verbindet sie zu
+einem Graphen und berechnet nur die Stufen neu, deren Eingaben oder Code sich
+geändert haben. Aufruf: ``python -m berlin_housing.pipeline``.
+"""
@@ -0,0 +1,76 @@
+"""
+Kommandozeile der Cleaning-Pipeline
+===================================
+
+    python -m berlin_housing.pipeline                 # alle veralteten Stufen neu berechnen
+    python -m berlin_housing.pipeline enriched_final  # nur diese Stufe und ihre Vorgänger
+    python -m berlin_housing.pipeline --force         # alles neu berechnen
+    python -m berlin_housing.pipeline --list          # Stufen anzeigen
+    python -m berlin_housing.pipeline --append batch.csv [--year 2026]   # Scrape-Batch anhängen
+"""
+
+import argparse
+import os
+import sys
+
+from berlin_housing.pipeline.stages import MANIFEST_PATH, STAGES, run_pipeline
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m berlin_housing.pipeline',
+        description='Berechnet die Cleaning-Stufen (raw → normalized → enriched → combined) inkrementell.',
+    )
+    parser.add_argument('stages', nargs='*', metavar='STUFE',
+                        help='Zielstufen (Standard: alle); Vorgänger werden mitgeprüft')
+    parser.add_argument('--force', action='store_true', help='Stufen unabhängig vom Cache neu berechnen')
+    parser.add_argument('--list', action='store_true', help='Stufen mit Ein- und Ausgaben anzeigen')
+    parser.add_argument('--append', nargs='+', metavar='CSV',
+                        help='Scrape-Batches im Format von Dataset_2025.csv als neue Partitionen anhängen')
+    parser.add_argument('--year', type=int, help='Jahr der angehängten Batches (Standard: 2025)')
+    parser.add_argument('--expand', action='store_true',
+                        help='Projektanzeigen der Batches in einzelne Wohneinheiten aufteilen')
+    parser.add_argument('--no-geocache', action='store_true',
+                        help='regio3-Werte und Adressen (Stufen und Batches) ohne Geocoding-Cache '
+                             '(data/cache/geocode.sqlite) auflösen')
+    parser.add_argument('--manifest', default=MANIFEST_PATH, help=f'Cache-Manifest (Standard: {MANIFEST_PATH})')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.list:
+        for stage in STAGES:
+            print(f"{stage.name}")
+            for arg, (path, _) in stage.inputs.items():
+                print(f"    {arg:<20} ← {path}")
+            print(f"    {'':<20} → {stage.output}")
+        return 0
+
+    if args.append:
+        from berlin_housing.pipeline.batches import ingest_batch
+
+        print("📥 Batches anhängen")
+        for path in args.append:
+            if not os.path.exists(path):
+                print(f"❌ Datei nicht gefunden: {path}")
+                return 1
+            ingest_batch(path, year=args.year, expand=args.expand, geocache=not args.no_geocache)
+        return 0
+
+    print("🔧 Cleaning-Pipeline")
+    try:
+        status = run_pipeline(args.stages or None, force=args.force, manifest_path=args.manifest,
+                              geocache=not args.no_geocache)
+    except (KeyError, FileNotFoundError) as exc:
+        print(f"❌ {exc}")
+        return 1
+
+    rebuilt = sum(1 for s in status.values() if s == 'neu berechnet')
+    print(f"✅ {len(status)} Stufen geprüft, {rebuilt} neu berechnet")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""
+Inkrementelles Anhängen neuer Scrape-Batches
+============================================
+
+Ein neuer Batch im Format von ``Dataset_2025.csv`` wird für sich allein
+normalisiert, angereichert und als eigene Partition unter
+``data/processed/partitions/year=<Jahr>/source=<Quelle>/`` geschrieben. Die
+bestehenden CSV-Dateien und älteren Partitionen werden nicht gelesen; die
+Kosten hängen von der Batch-Größe ab, nicht von der Historie.
+
+``data/processed/partitions/_batches.json`` protokolliert alle Batches (ID =
+SHA1 des Inhalts); ein bereits angehängter Batch wird übersprungen.
+
+Der Aggregat-Speicher (``berlin_housing.aggregate_store``) nimmt den Batch
+per ``update`` auf. Der Preiswürfel (``berlin_housing.price_cube``) wird nur
+für die Zellen (year, ortsteil, bezirk) aktualisiert, in denen der Batch
+Angebote hat: Anzahl und Summe werden addiert, die Mediane dieser Zellen aus
+den gemergten Quantil-Sketches des Speichers gelesen (auf etwa 1 % genau). Fehlt
+der Speicher, wird er einmal aus allen Angeboten gebaut; danach liest kein
+Batch mehr die Historie.
+
+Adressen werden über den Geocoding-Cache (``berlin_housing.geocache``)
+aufgelöst: bei wöchentlichen Scrapes stehen fast alle schon im Cache, nur neue
+Adressen laufen durch ``dataset_2025.resolve_addresses``.
+
+    python -m berlin_housing.pipeline --append data/raw/scrape_2025_w42.csv
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from berlin_housing.aggregate_store import STORE_DIR, AggregateStore
+from berlin_housing.datasets import PARTITIONS_DIR, apply_schema, load_combined
+from berlin_housing.pipeline import combine, dataset_2025
+from berlin_housing.pipeline.common import PLZ_MAPPING_ENHANCED_PATH, PLZ_MAPPING_PATH, WOHNLAGEN_PATH
+from berlin_housing.price_cube import CUBE_KEYS, CUBE_PATH, MEASURES, build_price_cube, load_price_cube, save_price_cube
+
+PARTITION_KEYS = ['year', 'source']
+BATCH_LOG_NAME = '_batches.json'   # Unterstrich: wird von pyarrow beim Lesen der Partitionen ignoriert
+
+
+def batch_id(raw):
+    """Inhalts-ID eines Batches (SHA1 über alle Werte, unabhängig vom Index)."""
+    hashes = pd.util.hash_pandas_object(raw, index=False).to_numpy()
+    return hashlib.sha1(hashes.tobytes() + ','.join(raw.columns).encode('utf-8')).hexdigest()[:16]
+
+
+def _load_log(partitions_dir):
+    path = os.path.join(partitions_dir, BATCH_LOG_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_log(log, partitions_dir):
+    path = os.path.join(partitions_dir, BATCH_LOG_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(log, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def prepare_batch(raw, plz_mapping, plz_mapping_enhanced, wohnlagen=None, year=None, expand=False, cache=None):
+    """
+    Roh-Batch → Zeilen im Format von ``berlin_housing_combined_enriched_final.csv``.
+
+    Gleiche Stufen wie die Pipeline (``dataset_2025.normalize``/``enrich``,
+    ``combine.combine``/``enrich_final``), nur auf den Zeilen des Batches.
+    Ohne ``wohnlagen`` bleiben ``wol`` und ``ortsteil_neu`` leer. ``year``
+    überschreibt das Jahr (Standard: ``dataset_2025.YEAR``), ``cache`` ist
+    ein optionaler Geocoding-Cache (``dataset_2025.address_cache``).
+    """
+    normalized = dataset_2025.normalize(raw, plz_mapping, wohnlagen, expand=expand, cache=cache)
+    if year is not None:
+        normalized['year'] = year
+
+    if wohnlagen is not None:
+        enriched = dataset_2025.enrich(normalized, wohnlagen, plz_mapping_enhanced)
+    else:
+        enriched = normalized.assign(wol=np.nan, ortsteil_neu=np.nan)
+
+    return combine.enrich_final(combine.combine(enriched), plz_mapping_enhanced)
+
+
+def write_partitions(rows, partitions_dir, name):
+    """Schreibe ``rows`` Hive-partitioniert nach year/source; gibt die Partitionen zurück."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    table = pa.Table.from_pandas(apply_schema(rows), preserve_index=False)
+    partitioning = ds.partitioning(
+        pa.schema([('year', table.schema.field('year').type), ('source', pa.string())]), flavor='hive'
+    )
+    table = table.set_column(table.schema.get_field_index('source'), 'source',
+                             table.column('source').cast(pa.string()))
+    ds.write_dataset(
+        table, partitions_dir, format='parquet', partitioning=partitioning,
+        basename_template=f'batch-{name}-{{i}}.parquet', existing_data_behavior='overwrite_or_ignore',
+        file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'),
+    )
+    keys = rows[PARTITION_KEYS].drop_duplicates().sort_values(PARTITION_KEYS)
+    return [{'year': int(year), 'source': str(source)} for year, source in keys.itertuples(index=False)]
+
+
+def update_price_cube(batch_rows, store, cube_path=CUBE_PATH):
+    """
+    Aktualisiere nur die Würfelzellen, in denen ``batch_rows`` liegen.
+
+    Anzahl und Summe werden addiert (Mittelwert = Summe / Anzahl). Die
+    Mediane der betroffenen Zellen kommen aus ``store`` (``AggregateStore``,
+    der ``batch_rows`` schon enthält): Roll-up der Sketches auf
+    (year, ortsteil, bezirk), also auf etwa 1 % genau statt exakt. Gibt die
+    Anzahl der aktualisierten Zellen zurück.
+    """
+    if not os.path.exists(cube_path):
+        return 0
+
+    delta = build_price_cube(batch_rows)
+    cube = load_price_cube(cube_path)
+    keys = [key for key in CUBE_KEYS if key in delta.columns]
+    for frame in (cube, delta):
+        for key in keys:
+            frame[key] = frame[key].astype('int64' if key == 'year' else 'string')
+
+    merged = cube.merge(delta, on=keys, how='outer', suffixes=('', '_batch'), indicator=True)
+    touched = merged['_merge'] != 'left_only'
+    for measure in MEASURES:
+        for stat in ('count', 'sum'):
+            col = f'{measure}_{stat}'
+            merged[col] = merged[col].fillna(0) + merged[f'{col}_batch'].fillna(0)
+        merged[f'{measure}_count'] = merged[f'{measure}_count'].astype('int64')
+        count = merged[f'{measure}_count']
+        merged[f'{measure}_mean'] = merged[f'{measure}_sum'] / count.where(count > 0)
+
+    # Mediane: gemergte Sketches des Aggregat-Speichers, nur für die Jahre des Batches
+    years = sorted(int(year) for year in delta['year'].unique())
+    medians = store.rollup(keys, MEASURES, where={'year': years}).reset_index()
+    for key in keys:
+        medians[key] = medians[key].astype('int64' if key == 'year' else 'string')
+    medians = merged.loc[touched, keys].merge(medians, on=keys, how='left')
+    for measure in MEASURES:
+        merged.loc[touched, f'{measure}_median'] = medians[f'{measure}_median'].to_numpy()
+
+    save_price_cube(merged[cube.columns].sort_values(keys, na_position='last'), cube_path)
+    return int(touched.sum())
+
+
+def update_aggregate_store(batch_rows, store_dir=STORE_DIR, partitions_dir=PARTITIONS_DIR):
+    """
+    Batch in den Aggregat-Speicher aufnehmen und den Speicher zurückgeben.
+
+    Fehlt der Speicher, wird er einmal aus allen Angeboten gebaut; die
+    Partition des Batches muss dann schon geschrieben sein.
+    """
+    if os.path.exists(os.path.join(store_dir, 'cells.csv')):
+        store = AggregateStore.load(store_dir).update(batch_rows)
+    else:
+        store = AggregateStore.from_frame(load_combined(columns=['price', 'size', 'rooms', 'year', 'bezirk',
+                                                                 'ortsteil'], partitions_dir=partitions_dir))
+    store.save(store_dir)
+    return store
+
+
+def ingest_batch(raw, partitions_dir=PARTITIONS_DIR, cube_path=CUBE_PATH, year=None, expand=False,
+                 plz_mapping=None, plz_mapping_enhanced=None, wohnlagen=None, verbose=True,
+                 store_dir=STORE_DIR, geocache=True):
+    """
+    Hänge einen Roh-Batch (DataFrame oder CSV-Pfad) als neue Partition an.
+
+    Fehlende Mappings werden aus ``data/processed/`` bzw. ``data/raw/``
+    gelesen. ``geocache=False`` löst alle Adressen ohne Geocoding-Cache auf.
+    Gibt den Protokolleintrag des Batches zurück (``status``:
+    ``'angehängt'`` oder ``'bereits vorhanden'``).
+    """
+    start = time.perf_counter()
+    if isinstance(raw, str):
+        raw = pd.read_csv(raw)
+
+    name = batch_id(raw)
+    log = _load_log(partitions_dir)
+    if name in log:
+        if verbose:
+            print(f"  ✓ Batch {name} bereits angehängt ({log[name]['rows']:,} Zeilen)")
+        return dict(log[name], status='bereits vorhanden')
+
+    if plz_mapping is None:
+        plz_mapping = pd.read_csv(PLZ_MAPPING_PATH)
+    if plz_mapping_enhanced is None:
+        plz_mapping_enhanced = pd.read_csv(PLZ_MAPPING_ENHANCED_PATH)
+    if wohnlagen is None and os.path.exists(WOHNLAGEN_PATH):
+        wohnlagen = pd.read_csv(WOHNLAGEN_PATH)
+
+    cache = dataset_2025.address_cache() if geocache else None
+    try:
+        rows = prepare_batch(raw, plz_mapping, plz_mapping_enhanced, wohnlagen, year=year, expand=expand,
+                             cache=cache)
+    finally:
+        if cache is not None:
+            cache.close()
+    os.makedirs(partitions_dir, exist_ok=True)
+    partitions = write_partitions(rows, partitions_dir, name) if len(rows) else []
+    cells = 0
+    if len(rows):
+        store = update_aggregate_store(rows, store_dir, partitions_dir)
+        cells = update_price_cube(rows, store, cube_path)
+
+    entry = {
+        'rows_raw': len(raw),
+        'rows': len(rows),
+        'partitions': partitions,
+        'cube_cells': cells,
+        'geocache_hits': cache.hits if cache is not None else 0,
+        'geocache_misses': cache.misses if cache is not None else 0,
+        'ingested_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    log[name] = entry
+    _save_log(log, partitions_dir)
+
+    if verbose:
+        print(f"  🔄 Batch {name}: {len(raw):,} → {len(rows):,} Zeilen, "
+              f"{len(partitions)} Partition(en), {cells} Würfelzellen ({time.perf_counter() - start:.2f}s)")
+        if cache is not None:
+            print(f"     Geocoding-Cache: {cache.hits:,} Treffer, {cache.misses:,} neu aufgelöst")
+    return dict(entry, status='angehängt')
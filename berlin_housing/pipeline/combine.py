@@ -0,0 +1,35 @@
+"""
+Kombination und PLZ-Geolocation
+===============================
+
+Stufen aus ``04_Combine_Datasets.ipynb``:
+
+- ``combine``: Basisspalten der drei angereicherten Datasets untereinander
+  (``berlin_housing_combined_base.csv``)
+- ``enrich_final``: Ortsteil, Bezirk und Koordinaten je PLZ aus
+  ``berlin_plz_mapping_enhanced.csv`` per ``BerlinPlz.lookup``
+  (``berlin_housing_combined_enriched_final.csv``)
+"""
+
+import pandas as pd
+
+from berlin_housing.pipeline.common import STANDARD_COLUMNS, plz_to_string_series
+from berlin_housing.plz import BerlinPlz
+
+BASE_COLUMNS = STANDARD_COLUMNS + ['wol', 'plz']
+
+
+def combine(*datasets):
+    """Angereicherte Datasets → kombiniertes Dataset mit den Basisspalten."""
+    standard = []
+    for df in datasets:
+        if 'plz' in df.columns:
+            df = df.assign(plz=plz_to_string_series(df['plz']))
+        standard.append(df[[col for col in BASE_COLUMNS if col in df.columns]])
+    return pd.concat(standard, ignore_index=True, sort=False)
+
+
+def enrich_final(combined, plz_mapping):
+    """Kombiniertes Dataset + erweitertes PLZ-Mapping → finales Dataset mit ``ortsteil``, ``bezirk``, ``lat``, ``lon``."""
+    located = BerlinPlz(plz_mapping).lookup(combined['plz'])
+    return pd.concat([combined, located], axis=1)
@@ -0,0 +1,31 @@
+"""
+Gemeinsame Pfade und Hilfsfunktionen der Pipeline-Stufen.
+"""
+
+from berlin_housing.plz import normalize_plz
+
+RAW_DIR = 'data/raw'
+PROCESSED_DIR = 'data/processed'
+
+WOHNLAGEN_PATH = f'{RAW_DIR}/wohnlagen_enriched.csv'
+PLZ_MAPPING_PATH = f'{PROCESSED_DIR}/berlin_plz_mapping.csv'
+PLZ_MAPPING_ENHANCED_PATH = f'{PROCESSED_DIR}/berlin_plz_mapping_enhanced.csv'
+
+# Standardspalten aller normalisierten Datasets
+STANDARD_COLUMNS = ['price', 'size', 'district', 'rooms', 'year', 'dataset_id', 'source']
+
+
+def plz_to_string_series(series):
+    """PLZ-Spalte → 5-stellige Strings als object-Spalte mit None (siehe ``berlin_housing.plz.normalize_plz``)."""
+    plz = normalize_plz(series)
+    return plz.astype(object).where(plz.notna(), None)
+
+
+def first_by_key(df, key):
+    """Erste Zeile je Schlüsselwert (wie ein dict, das nur beim ersten Auftreten befüllt wird)."""
+    return df[df[key].notna()].drop_duplicates(subset=[key], keep='first').set_index(key)
+
+
+def last_by_key(df, key, value):
+    """Letzter Wert je Schlüssel (wie ``dict(zip(df[key], df[value]))``)."""
+    return df.drop_duplicates(subset=[key], keep='last').set_index(key)[value]
@@ -0,0 +1,152 @@
+"""
+Dataset 2018-2019 (Kaggle/Immobilienscout24)
+============================================
+
+Stufen aus ``01_Clean_Dataset_2018_2019.ipynb``:
+
+- ``normalize``: Plausibilitätsfilter, Bezirk aus ``regio3``, Standardspalten
+  und PLZ über ``match_regio3`` (Ortsteil in ``berlin_plz_mapping_enhanced.csv``)
+- ``enrich``: Wohnlage, Ortsteil und fehlende PLZ aus ``wohnlagen_enriched.csv``
+  (zuerst über die Straße mit dem ``AddressIndex``, dann über den Ortsteil)
+"""
+
+import hashlib
+import sys
+
+import numpy as np
+import pandas as pd
+
+from berlin_housing.address_index import AddressIndex
+from berlin_housing.geocache import CACHE_PATH, GeocodeCache
+from berlin_housing.pipeline import matching
+from berlin_housing.pipeline.common import plz_to_string_series
+from berlin_housing.pipeline.matching import NameMatcher
+
+YEAR = 2019
+DATASET_ID = 'historical'
+SOURCE = 'Kaggle/Immobilienscout24'
+
+EXTRA_COLUMNS = ['street', 'floor', 'typeOfFlat', 'yearConstructed', 'totalRent']
+
+
+def normalize_district(regio3):
+    """Bezirk aus ``regio3`` (Teil vor dem ersten Unterstrich, z.B. "Prenzlauer_Berg" → "Prenzlauer")."""
+    return regio3.astype('string').str.split('_').str[0]
+
+
+def _resolver_version():
+    """SHA1 über den Quelltext der Auflösung (dieses Modul und ``matching``) für den Geocoding-Cache."""
+    digest = hashlib.sha1()
+    for module in (sys.modules[__name__], matching):
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def regio3_cache(path=CACHE_PATH):
+    """Geocoding-Cache für ``match_regio3`` (verworfen bei geänderten Mappings oder geändertem Code)."""
+    return GeocodeCache('dataset_2018_2019.regio3', path=path, version=_resolver_version())
+
+
+def match_regio3(regio3, plz_mapping, cache=None):
+    """
+    Ortsteil, Bezirk und PLZ aus dem vollständigen ``regio3`` ("Mariendorf_Tempelhof").
+
+    Sucht alle Ortsteile aus ``berlin_plz_mapping_enhanced.csv`` mit dem
+    ``NameMatcher``; der früheste Treffer gewinnt, weil ``regio3`` mit dem
+    Ortsteil beginnt ("Tegel_Reinickendorf" → Tegel, "Alt_Hohenschönhausen_Hohenschönhausen"
+    → Alt-Hohenschönhausen). PLZ ist wie im Notebook die letzte PLZ des Ortsteils
+    im Mapping, Bezirk der des ersten Eintrags.
+
+    Mit ``cache`` (``regio3_cache``) werden nur ``regio3``-Werte gesucht, die
+    noch nicht im Geocoding-Cache stehen.
+    """
+    if cache is not None:
+        def resolver(missing):
+            matched = match_regio3(missing, plz_mapping)
+            return matched.assign(method=np.where(matched['ortsteil'].notna(), 'name_match', 'unresolved'))
+
+        context = hashlib.sha1(plz_mapping[['PLZ', 'Ortsteil', 'Bezirk']].to_csv(index=False).encode('utf-8'))
+        resolved = cache.resolve(regio3, resolver, context=context.hexdigest())
+        return pd.DataFrame({
+            'ortsteil': resolved['ortsteil'],
+            'bezirk': resolved['bezirk'],
+            'plz': plz_to_string_series(resolved['plz']),
+        }, index=regio3.index)
+
+    first = plz_mapping.drop_duplicates('Ortsteil', keep='first').set_index('Ortsteil')
+    last = plz_mapping.drop_duplicates('Ortsteil', keep='last').set_index('Ortsteil')
+    matcher = NameMatcher(dict(zip(first.index, zip(first['Bezirk'].str.strip(), last['PLZ'].reindex(first.index)))),
+                          prefer='first')
+    matched = matcher.match(regio3)
+
+    return pd.DataFrame({
+        'ortsteil': matched['name'],
+        'bezirk': matched['value'].map(lambda v: v[0], na_action='ignore'),
+        'plz': plz_to_string_series(matched['value'].map(lambda v: v[1], na_action='ignore')),
+    }, index=regio3.index)
+
+
+def normalize(raw, plz_mapping, cache=None):
+    """
+    Rohdaten → normalisiertes Dataset (``dataset_2018_2019_normalized.csv``).
+
+    ``cache`` (``regio3_cache``) übernimmt bereits aufgelöste ``regio3``-Werte.
+    """
+    df = raw[(raw['baseRent'] >= 100) & (raw['baseRent'] <= 10000)]
+    df = df[(df['livingSpace'] >= 10) & (df['livingSpace'] <= 500)]
+    df = df[(df['noRooms'] >= 0.5) & (df['noRooms'] <= 10)]
+
+    normalized = pd.DataFrame({
+        'price': df['baseRent'].astype('float64'),
+        'size': df['livingSpace'].astype('float64'),
+        'district': normalize_district(df['regio3']),
+        'rooms': df['noRooms'].astype('float64'),
+        'year': YEAR,
+        'dataset_id': DATASET_ID,
+        'source': SOURCE,
+    })
+    for col in EXTRA_COLUMNS:
+        normalized[col] = df[col]
+
+    normalized['plz'] = match_regio3(df['regio3'], plz_mapping, cache=cache)['plz']
+
+    return normalized.reset_index(drop=True)
+
+
+def enrich(normalized, wohnlagen):
+    """Normalisiertes Dataset + Wohnlagendaten → ``dataset_2018_2019_enriched.csv``."""
+    df = normalized.copy()
+    plz = df['plz'].astype(object).where(df['plz'].notna(), None)
+    wol = pd.Series(np.nan, index=df.index, dtype=object)
+    ortsteil = pd.Series(np.nan, index=df.index, dtype=object)
+
+    lagen = wohnlagen.assign(plz=plz_to_string_series(wohnlagen['plz']))
+
+    # Straße (+ Hausnummer, falls im Text) → PLZ, Wohnlage, Ortsteil: modaler Eintrag aus dem Adress-Index;
+    # normalisierte Namen, daher passen auch "Grabenstra&szlig;e" und "Grabenstr."
+    hits = AddressIndex.from_wohnlagen(lagen).lookup(df['street'])
+    matched = hits['method'].notna()
+    street_plz = hits['plz']
+    street_wol = hits['wol']
+    street_ortsteil = hits['ortsteil']
+
+    plz = plz.mask(matched & plz.isna() & street_plz.notna(), street_plz)
+    wol = wol.mask(matched & street_wol.notna(), street_wol)
+    ortsteil = ortsteil.mask(matched & street_ortsteil.notna(), street_ortsteil)
+
+    # Ortsteil → PLZ, Wohnlage für Zeilen ohne Straßen-Treffer (Bezirk als Ortsteil)
+    ortsteile = lagen[lagen['ortsteil_neu'].notna()].drop_duplicates('ortsteil_neu').set_index('ortsteil_neu')
+    by_district = ortsteil.isna() & df['district'].notna() & df['district'].isin(ortsteile.index)
+    district = df['district'].astype(object)
+    ortsteil_plz = district.map(ortsteile['plz'])
+    ortsteil_wol = district.map(ortsteile['wol'])
+
+    plz = plz.mask(by_district & plz.isna() & ortsteil_plz.notna(), ortsteil_plz)
+    wol = wol.mask(by_district & ortsteil_wol.notna(), ortsteil_wol)
+    ortsteil = ortsteil.mask(by_district, district)
+
+    df['plz'] = plz_to_string_series(plz)
+    df['wol'] = wol.where(wol.notna() & (wol.astype(str) != ''), np.nan)
+    df['ortsteil_neu'] = ortsteil.where(ortsteil.notna() & (ortsteil.astype(str) != ''), np.nan)
+    return df
@@ -0,0 +1,101 @@
+"""
+Dataset 2022 (Springer/Immowelt/Immonet)
+========================================
+
+Stufen aus ``02_Clean_Dataset_2022.ipynb``:
+
+- ``normalize``: Plausibilitätsfilter, Bezirk über die PLZ
+  (``berlin_plz_mapping.csv`` plus Ergänzungen), Standardspalten und
+  Ausstattungsmerkmale
+- ``enrich``: Wohnlage und Ortsteil aus ``wohnlagen_enriched.csv`` per PLZ-Join
+"""
+
+import pandas as pd
+
+from berlin_housing.pipeline.common import plz_to_string_series
+
+YEAR = 2022
+DATASET_ID = 'current'
+SOURCE = 'Springer/Immowelt/Immonet'
+
+# PLZ, die in berlin_plz_mapping.csv fehlen
+ADDITIONAL_PLZ_MAPPING = {
+    12627: 'Marzahn-Hellersdorf', 12629: 'Marzahn-Hellersdorf',
+    13593: 'Spandau', 13595: 'Spandau', 13597: 'Spandau', 13599: 'Spandau',
+    14052: 'Charlottenburg-Wilmersdorf', 14055: 'Charlottenburg-Wilmersdorf',
+    14057: 'Charlottenburg-Wilmersdorf', 14059: 'Charlottenburg-Wilmersdorf',
+    10315: 'Lichtenberg', 10317: 'Lichtenberg', 10318: 'Lichtenberg', 10319: 'Lichtenberg',
+    10365: 'Lichtenberg', 10367: 'Lichtenberg', 10369: 'Lichtenberg',
+    13125: 'Pankow', 13127: 'Pankow', 13129: 'Pankow', 13156: 'Pankow',
+    13158: 'Pankow', 13159: 'Pankow', 13187: 'Pankow', 13189: 'Pankow',
+    12305: 'Tempelhof-Schöneberg', 12307: 'Tempelhof-Schöneberg', 12309: 'Tempelhof-Schöneberg',
+    12347: 'Neukölln', 12349: 'Neukölln', 12351: 'Neukölln', 12353: 'Neukölln',
+    12355: 'Neukölln', 12357: 'Neukölln', 12359: 'Neukölln',
+    12681: 'Marzahn-Hellersdorf', 12683: 'Marzahn-Hellersdorf', 12685: 'Marzahn-Hellersdorf',
+    12687: 'Marzahn-Hellersdorf', 12689: 'Marzahn-Hellersdorf', 12679: 'Marzahn-Hellersdorf',
+    13051: 'Pankow', 13053: 'Pankow', 13055: 'Pankow', 13057: 'Pankow',
+    13059: 'Pankow', 13086: 'Pankow', 13088: 'Pankow', 13089: 'Pankow',
+    13403: 'Reinickendorf', 13405: 'Reinickendorf', 13407: 'Reinickendorf', 13409: 'Reinickendorf',
+    13435: 'Reinickendorf', 13437: 'Reinickendorf', 13439: 'Reinickendorf',
+    13465: 'Reinickendorf', 13467: 'Reinickendorf', 13469: 'Reinickendorf',
+    13503: 'Reinickendorf', 13505: 'Reinickendorf', 13507: 'Reinickendorf', 13509: 'Reinickendorf',
+    13581: 'Spandau', 13583: 'Spandau', 13585: 'Spandau', 13587: 'Spandau',
+    13589: 'Spandau', 13591: 'Spandau',
+    14195: 'Steglitz-Zehlendorf', 14197: 'Steglitz-Zehlendorf', 14199: 'Steglitz-Zehlendorf',
+    14163: 'Steglitz-Zehlendorf', 14165: 'Steglitz-Zehlendorf', 14167: 'Steglitz-Zehlendorf',
+    14169: 'Steglitz-Zehlendorf', 14129: 'Steglitz-Zehlendorf', 14109: 'Steglitz-Zehlendorf',
+}
+
+# Originalspalte → Spalte im normalisierten Dataset
+EXTRA_COLUMNS = {
+    'WARMMIETE': 'warmmiete',
+    'NEBENKOSTEN': 'nebenkosten',
+    'KAUTION': 'kaution',
+    'BAUJAHR': 'baujahr',
+    'ZUSTAND': 'zustand',
+    'ENERGIEEFFIZIENSKLASSE': 'energieeffiziensklasse',
+}
+AUSSTATTUNG_COLUMNS = ['möbliert', 'Balkon', 'Terrasse', 'Garten', 'Einbauküche',
+                       'Garage', 'Stellplatz', 'Personenaufzug', 'Keller']
+
+
+def normalize(raw, plz_mapping):
+    """Rohdaten → normalisiertes Dataset (``dataset_2022_normalized.csv``)."""
+    plz_to_district = dict(zip(plz_mapping['PLZ'], plz_mapping['Bezirk']))
+    plz_to_district.update(ADDITIONAL_PLZ_MAPPING)
+
+    df = raw[raw['KALTMIETE'].notna()]
+    df = df[(df['KALTMIETE'] >= 100) & (df['KALTMIETE'] <= 10000)]
+    df = df[(df['WOHNFLAECHE'] >= 10) & (df['WOHNFLAECHE'] <= 500)]
+    df = df.assign(district=df['PLZ'].map(plz_to_district))
+    df = df[df['district'].notna()]
+    df = df[(df['ZIMMER'] >= 1) & (df['ZIMMER'] <= 10)]
+
+    normalized = pd.DataFrame({
+        'price': df['KALTMIETE'].astype('float64'),
+        'size': df['WOHNFLAECHE'].astype('float64'),
+        'district': df['district'].astype('string'),
+        'rooms': df['ZIMMER'].astype('float64'),
+        'year': YEAR,
+        'dataset_id': DATASET_ID,
+        'source': SOURCE,
+        'plz': df['PLZ'].astype('string'),
+    })
+    for col, name in EXTRA_COLUMNS.items():
+        if col in df.columns:
+            normalized[name] = df[col]
+    for col in AUSSTATTUNG_COLUMNS:
+        if col in df.columns:
+            normalized[f'ausstattung_{col.lower()}'] = df[col]
+
+    return normalized.reset_index(drop=True)
+
+
+def enrich(normalized, wohnlagen):
+    """Normalisiertes Dataset + Wohnlagendaten → ``dataset_2022_enriched.csv`` (Left Join über die PLZ)."""
+    df = normalized.assign(plz=plz_to_string_series(normalized['plz']))
+
+    lagen = wohnlagen.assign(plz=plz_to_string_series(wohnlagen['plz']))
+    lagen = lagen.loc[lagen['plz'].notna(), ['plz', 'wol', 'ortsteil_neu']].drop_duplicates(subset=['plz'])
+
+    return df.merge(lagen, how='left', on='plz')
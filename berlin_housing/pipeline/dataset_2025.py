@@ -0,0 +1,424 @@
+"""
+Dataset 2025 (ImmobilienScout24)
+================================
+
+Stufen aus ``03_Clean_Dataset_2025.ipynb``:
+
+- ``normalize``: Bezirk und PLZ aus der Freitext-Adresse, Preis-/Größenfelder
+  parsen ("1.235,65€", "725 - 1.965€" → Unter-/Obergrenze und Mittelwert), optional
+  Projektanzeigen in einzelne Wohneinheiten aufteilen, Plausibilitätsfilter,
+  Standardspalten
+- ``enrich``: Dual-Strategie - Einträge mit PLZ per Join auf
+  ``wohnlagen_enriched.csv``, Einträge ohne PLZ über Bezirk → Ortsteil;
+  danach fehlende PLZ aus ``berlin_plz_mapping_enhanced.csv``
+"""
+
+import hashlib
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+from berlin_housing.address_index import AddressIndex
+from berlin_housing.geocache import CACHE_PATH, GeocodeCache
+from berlin_housing.pipeline import matching
+from berlin_housing.pipeline.common import plz_to_string_series
+from berlin_housing.pipeline.matching import NameMatcher
+
+YEAR = 2025
+DATASET_ID = 'recent'
+SOURCE = 'ImmobilienScout24'
+
+# Ergänzungen zu berlin_plz_mapping.csv
+EXTENDED_PLZ_MAPPING = {
+    10115: 'Mitte', 10117: 'Mitte', 10119: 'Mitte', 10178: 'Mitte', 10179: 'Mitte',
+    10243: 'Friedrichshain-Kreuzberg', 10245: 'Friedrichshain-Kreuzberg',
+    10247: 'Friedrichshain-Kreuzberg', 10249: 'Friedrichshain-Kreuzberg',
+    10315: 'Lichtenberg', 10317: 'Lichtenberg', 10318: 'Lichtenberg', 10319: 'Lichtenberg',
+    10365: 'Lichtenberg', 10367: 'Lichtenberg', 10369: 'Lichtenberg',
+    12305: 'Tempelhof-Schöneberg', 12307: 'Tempelhof-Schöneberg', 12309: 'Tempelhof-Schöneberg',
+    12347: 'Neukölln', 12349: 'Neukölln', 12351: 'Neukölln', 12353: 'Neukölln',
+    12355: 'Neukölln', 12357: 'Neukölln', 12359: 'Neukölln',
+    12524: 'Treptow-Köpenick', 12555: 'Treptow-Köpenick',
+    14612: 'Falkensee',  # Außerhalb Berlin
+    13507: 'Reinickendorf',
+    10585: 'Charlottenburg-Wilmersdorf', 10709: 'Charlottenburg-Wilmersdorf',
+    10559: 'Mitte',
+}
+
+# Schreibweisen in den Adressen → einheitlicher Bezirk (Reihenfolge = Suchreihenfolge)
+DISTRICT_ALIASES = {
+    'Mitte (Ortsteil)': 'Mitte',
+    'Pankow (Ortsteil)': 'Pankow',
+    'Spandau (Ortsteil)': 'Spandau',
+    'Neukölln (Ortsteil)': 'Neukölln',
+    'Friedrichshain': 'Friedrichshain-Kreuzberg',
+    'Kreuzberg': 'Friedrichshain-Kreuzberg',
+    'Charlottenburg': 'Charlottenburg-Wilmersdorf',
+    'Wilmersdorf': 'Charlottenburg-Wilmersdorf',
+    'Tempelhof': 'Tempelhof-Schöneberg',
+    'Schöneberg': 'Tempelhof-Schöneberg',
+    'Prenzlauer Berg': 'Pankow',
+    'Weißensee': 'Pankow',
+    'Buch': 'Pankow',
+    'Niederschönhausen': 'Pankow',
+    'Gesundbrunnen': 'Mitte',
+    'Wedding': 'Mitte',
+    'Moabit': 'Mitte',
+    'Tiergarten': 'Mitte',
+    'Friedenau': 'Tempelhof-Schöneberg',
+    'Steglitz': 'Steglitz-Zehlendorf',
+    'Zehlendorf': 'Steglitz-Zehlendorf',
+    'Schmargendorf': 'Charlottenburg-Wilmersdorf',
+    'Grunewald': 'Charlottenburg-Wilmersdorf',
+    'Halensee': 'Charlottenburg-Wilmersdorf',
+    'Tegel': 'Reinickendorf',
+    'Heiligensee': 'Reinickendorf',
+    'Staaken': 'Spandau',
+    'Siemensstadt': 'Spandau',
+    'Malchow': 'Pankow',
+    'Reinickendorf': 'Reinickendorf',
+    'Lichtenberg': 'Lichtenberg',
+    'Marzahn-Hellersdorf': 'Marzahn-Hellersdorf',
+    'Spandau': 'Spandau',
+    'Neukölln': 'Neukölln',
+    'Mitte': 'Mitte',
+    'Pankow': 'Pankow',
+}
+
+# Bekannte Straßen → PLZ (letzter Fallback der PLZ-Extraktion)
+STREET_TO_PLZ = {
+    'Unter den Linden': '10117',
+    'Alexanderplatz': '10178',
+    'Potsdamer Platz': '10785',
+    'Kurfürstendamm': '10719',
+    'Friedrichstraße': '10117',
+    'Hackescher Markt': '10178',
+    'Warschauer Straße': '10243',
+    'Boxhagener Straße': '10245',
+    'Kastanienallee': '10435',
+    'Oranienstraße': '10999',
+    'Bergmannstraße': '10961',
+    'Savignyplatz': '10623',
+    'Rosenthaler Straße': '10119',
+    'Torstraße': '10119',
+    'Invalidenstraße': '10115',
+    'Chausseestraße': '10115',
+    'Brunnenstraße': '10119',
+    'Bernauer Straße': '10119',
+}
+
+# Ortsteile, die in Adressen ohne PLZ gesucht werden (Reihenfolge = Suchreihenfolge)
+ORTSTEIL_NAMES = [
+    'Mitte', 'Prenzlauer Berg', 'Friedrichshain', 'Kreuzberg', 'Charlottenburg', 'Wilmersdorf',
+    'Tempelhof', 'Schöneberg', 'Neukölln', 'Steglitz', 'Zehlendorf', 'Wedding', 'Moabit',
+    'Tiergarten', 'Spandau', 'Reinickendorf', 'Pankow', 'Weißensee', 'Lichtenberg', 'Marzahn',
+    'Hellersdorf', 'Treptow', 'Köpenick', 'Rudow', 'Buckow', 'Gropiusstadt', 'Britz',
+    'Mariendorf', 'Lichtenrade', 'Dahlem', 'Grunewald', 'Westend', 'Hakenfelde',
+    'Falkenhagener Feld', 'Gatow', 'Kladow', 'Siemensstadt', 'Tegel', 'Waidmannslust',
+    'Hermsdorf', 'Französisch Buchholz', 'Karow', 'Buch', 'Blankenburg', 'Heinersdorf',
+    'Malchow', 'Wartenberg', 'Falkenberg', 'Hohenschönhausen', 'Karlshorst', 'Rummelsburg',
+    'Fennpfuhl', 'Biesdorf', 'Kaulsdorf', 'Mahlsdorf', 'Friedrichsfelde', 'Altglienicke',
+    'Adlershof', 'Johannisthal', 'Niederschöneweide', 'Oberschöneweide', 'Plänterwald',
+    'Baumschulenweg', 'Friedenau', 'Lankwitz', 'Lichterfelde', 'Marienfelde',
+    'Kleinmachnow',  # Manchmal fälschlicherweise als Berlin klassifiziert
+]
+ORTSTEIL_PATTERNS = [re.compile(rf'\b({re.escape(name)})\b', re.IGNORECASE) for name in ORTSTEIL_NAMES]
+ORTSTEIL_SUFFIX_PATTERN = re.compile(r'\b([A-Za-zäöüÄÖÜß\s]+)\s*\(Ortsteil\)')
+
+# Zusammengesetzte Bezirke → Namensbestandteile ihrer Ortsteile
+COMPOSITE_DISTRICTS = {
+    'Friedrichshain-Kreuzberg': ('Friedrichshain', 'Kreuzberg'),
+    'Charlottenburg-Wilmersdorf': ('Charlottenburg', 'Wilmersdorf'),
+    'Tempelhof-Schöneberg': ('Tempelhof', 'Schöneberg'),
+    'Steglitz-Zehlendorf': ('Steglitz', 'Zehlendorf'),
+    'Marzahn-Hellersdorf': ('Marzahn', 'Hellersdorf'),
+    'Treptow-Köpenick': ('Treptow', 'Köpenick'),
+}
+
+PLZ_PATTERN = re.compile(r'\b(\d{5})\b')
+BERLIN_PLZ_PATTERN = re.compile(r'\b(1[0-4]\d{3})\b')
+
+# "725 - 1.965 €" → ("725", "1.965"); {unit} wird durch die Einheit ersetzt
+RANGE_PATTERN = r'^\s*(\d[\d.,\s]*?)\s*(?:-\s*(\d[\d.,\s]*?)\s*)?(?:{unit})?\s*$'
+UNIT_COUNT_PATTERN = r'^\s*(\d+)\s+passende\s+Wohneinheit'
+
+# Zusätzliche Spalten aus den Preis-/Größenspannen und Projektanzeigen
+RANGE_COLUMNS = ['price_max', 'price_mid', 'size_max', 'size_mid', 'units', 'unit']
+
+
+# Alle Aliase und Bezirksnamen in einem Matcher (ganzer Adressabschnitt vor längstem Treffer)
+DISTRICT_MATCHER = NameMatcher({**DISTRICT_ALIASES, **{name: name for name in DISTRICT_ALIASES.values()}})
+ORTSTEIL_MATCHER = NameMatcher({name: name for name in ORTSTEIL_NAMES}, word_boundary=True)
+STREET_MATCHER = NameMatcher(STREET_TO_PLZ)
+
+
+def resolve_addresses(addresses, plz_to_district, ortsteil_to_plz=None, cache=None):
+    """
+    PLZ, Ortsteil und Bezirk für eine ganze Series von Freitext-Adressen.
+
+    Bezirk: 1. PLZ im Text über ``plz_to_district`` ("Johannisplatz 3, 10117 Berlin"),
+    2. bester bekannter Bezirk/Ortsteil/Alias im Text (``NameMatcher``) ("Johannisplatz 5, Mitte (Ortsteil), Berlin").
+
+    PLZ: 1. Berliner PLZ (10xxx-14xxx) im Text, 2. Ortsteil im Text → PLZ aus
+    ``ortsteil_to_plz`` (aus den Wohnlagendaten), 3. bekannte Straßennamen.
+
+    ``method`` nennt die Quelle der PLZ (bzw. des Bezirks): ``plz_regex``,
+    ``name_match``, ``street_index`` oder ``unresolved``. Mit ``cache``
+    (``address_cache``) werden nur Adressen aufgelöst, die noch nicht im
+    Geocoding-Cache stehen.
+    """
+    if cache is not None:
+        context = hashlib.sha1(repr((sorted(plz_to_district.items(), key=str),
+                                     sorted((ortsteil_to_plz or {}).items(), key=str))).encode('utf-8'))
+        resolved = cache.resolve(addresses, lambda missing: resolve_addresses(missing, plz_to_district,
+                                                                              ortsteil_to_plz),
+                                 context=context.hexdigest())
+        return resolved[['plz', 'ortsteil', 'district', 'method']]
+
+    text = addresses.astype('string').str.strip()
+
+    plz_any = pd.to_numeric(text.str.extract(PLZ_PATTERN, expand=False), errors='coerce')
+    district = plz_any.map(plz_to_district).astype(object)
+    district_by_plz = district.notna()
+    stripped = text.str.replace(', Berlin', '', regex=False).str.replace(' Berlin', '', regex=False)
+    missing = district.isna()
+    district[missing] = DISTRICT_MATCHER.match(stripped[missing])['value']
+
+    ortsteil = ORTSTEIL_MATCHER.match(text)['name']
+    plz = text.str.extract(BERLIN_PLZ_PATTERN, expand=False).astype(object)
+    by_regex = plz.notna()
+    if ortsteil_to_plz:
+        known = NameMatcher({name: ortsteil_to_plz[name] for name in ORTSTEIL_NAMES if name in ortsteil_to_plz},
+                            word_boundary=True)
+        suffix = text.str.extract(ORTSTEIL_SUFFIX_PATTERN, expand=False).str.strip().map(ortsteil_to_plz)
+        plz = plz.where(plz.notna(), known.match(text)['value'])
+        plz = plz.where(plz.notna(), suffix.astype(object))
+    by_name = plz.notna() & ~by_regex
+    missing = plz.isna()
+    plz[missing] = STREET_MATCHER.match(text[missing])['value']
+
+    method = np.select(
+        [by_regex, by_name, plz.notna(), district_by_plz, district.notna()],
+        ['plz_regex', 'name_match', 'street_index', 'plz_regex', 'name_match'],
+        default='unresolved',
+    )
+    return pd.DataFrame({
+        'plz': plz.where(plz.notna(), None),
+        'ortsteil': ortsteil,
+        'district': district.where(district.notna(), None),
+        'method': method,
+    }, index=addresses.index)
+
+
+def _resolver_version():
+    """SHA1 über den Quelltext der Auflösung (dieses Modul und ``matching``) für den Geocoding-Cache."""
+    digest = hashlib.sha1()
+    for module in (sys.modules[__name__], matching):
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def address_cache(path=CACHE_PATH):
+    """Geocoding-Cache für ``resolve_addresses`` (verworfen bei geänderten Mappings oder geändertem Code)."""
+    return GeocodeCache('dataset_2025.address', path=path, version=_resolver_version())
+
+
+def extract_district_from_address(address, plz_to_district):
+    """Bezirk aus einer einzelnen Adresse (siehe ``resolve_addresses``)."""
+    return resolve_addresses(pd.Series([address]), plz_to_district)['district'].iloc[0]
+
+
+def extract_plz_from_address(address, ortsteil_to_plz=None):
+    """PLZ aus einer einzelnen Adresse (siehe ``resolve_addresses``)."""
+    return resolve_addresses(pd.Series([address]), {}, ortsteil_to_plz)['plz'].iloc[0]
+
+
+def _to_float(numbers, thousands):
+    """Deutsche Zahlen-Strings → float ("1.235,65" → 1235.65); ``thousands`` entfernt Tausenderpunkte."""
+    numbers = numbers.str.replace(' ', '', regex=False)
+    if thousands:
+        # "12.50" ohne Komma bleibt eine Dezimalzahl, sonst ist der Punkt Tausendertrenner
+        decimal_dot = ~numbers.str.contains(',', regex=False) & numbers.str.contains(r'\.\d{2}$')
+        numbers = numbers.where(decimal_dot.fillna(False), numbers.str.replace('.', '', regex=False))
+    return pd.to_numeric(numbers.str.replace(',', '.', regex=False), errors='coerce').astype('float64')
+
+
+def parse_range_field(values, unit, thousands=True):
+    """
+    Einzelwerte und Spannen einer Freitext-Spalte in einem Durchgang parsen.
+
+    "1.235,65 €" → min = max = 1235.65, "725 - 1.965 €" → min 725.0, max 1965.0.
+    Gibt einen DataFrame mit ``min``, ``max`` und ``mid`` zurück; nicht parsbare Werte sind NaN.
+    """
+    # Scrapes wiederholen dieselben Strings sehr oft: nur eindeutige Werte parsen
+    codes, uniques = pd.factorize(values.astype('string'))
+    parts = pd.Series(uniques, dtype='string').str.extract(RANGE_PATTERN.format(unit=re.escape(unit)))
+    low = _to_float(parts[0], thousands).to_numpy()
+    high = _to_float(parts[1], thousands).to_numpy()
+    high = np.where(np.isnan(high), low, high)
+
+    low = np.append(low, np.nan)[codes]     # Code -1 (fehlender Wert) → NaN
+    high = np.append(high, np.nan)[codes]
+    return pd.DataFrame({'min': low, 'max': high, 'mid': (low + high) / 2}, index=values.index)
+
+
+def parse_price(values):
+    """Preisspalte: "1.235€" → 1235.0, "1.235,65€" → 1235.65, "725 - 1.965€" → 725.0 bis 1965.0."""
+    return parse_range_field(values, '€')
+
+
+def parse_size(values):
+    """Größenspalte: "67,5m²" → 67.5, "26,55 - 112,82m²" → 26.55 bis 112.82."""
+    return parse_range_field(values, 'm²', thousands=False)
+
+
+def parse_unit_count(titles):
+    """Anzahl Wohneinheiten aus Projekt-Titeln ("6 passende Wohneinheiten: ..." → 6), sonst 1."""
+    titles = titles.astype('string')
+    project = titles.str.contains('passende', regex=False).fillna(False)
+    counts = pd.Series(1, index=titles.index, dtype='int64')
+    found = pd.to_numeric(titles[project].str.extract(UNIT_COUNT_PATTERN, expand=False), errors='coerce')
+    counts[project] = found.fillna(1).clip(lower=1).astype('int64')
+    return counts
+
+
+def expand_units(df):
+    """
+    Projektanzeigen in einzelne Wohneinheiten aufteilen.
+
+    Eine Zeile mit ``units`` = n wird n-mal wiederholt; ``price`` und ``size``
+    werden linear zwischen ``*_min`` und ``*_max`` interpoliert (kleinste
+    Einheit zum niedrigsten Preis), ``unit`` nummeriert die Einheiten. Bei
+    n = 1 gilt der Mittelwert der Spanne.
+    """
+    units = df['units'].to_numpy()
+    expanded = df.loc[df.index.repeat(units)].copy()
+
+    repeats = np.repeat(units, units)
+    position = np.arange(len(expanded)) - np.repeat(np.cumsum(units) - units, units)
+    fraction = np.where(repeats > 1, position / np.maximum(repeats - 1, 1), 0.5)
+
+    for col in ('price', 'size'):
+        low = expanded[f'{col}_min'].to_numpy()
+        high = expanded[f'{col}_max'].to_numpy()
+        expanded[col] = low + (high - low) * fraction
+    expanded['unit'] = position + 1
+    return expanded
+
+
+def _map_unique(series, func):
+    """Wende ``func`` einmal pro eindeutigem Wert an."""
+    uniques = series.dropna().unique()
+    return series.map({value: func(value) for value in uniques})
+
+
+def ortsteil_to_plz_mapping(wohnlagen):
+    """Ortsteil → PLZ aus den Wohnlagendaten (letzter Eintrag je Ortsteil)."""
+    rows = wohnlagen[wohnlagen['plz'].notna() & wohnlagen['ortsteil_neu'].notna()]
+    plz = plz_to_string_series(rows['plz'])
+    return dict(zip(rows['ortsteil_neu'], plz))
+
+
+def normalize(raw, plz_mapping, wohnlagen=None, expand=False, cache=None):
+    """
+    Rohdaten → normalisiertes Dataset (``dataset_2025_normalized.csv``).
+
+    ``price``/``size`` sind wie im Notebook die Untergrenze einer Spanne,
+    Obergrenze und Mittelwert stehen in ``*_max`` und ``*_mid``, die Anzahl der
+    Wohneinheiten einer Projektanzeige in ``units``. Mit ``expand=True`` wird
+    jede Projektanzeige in ``units`` Zeilen aufgeteilt (``expand_units``).
+    Mit ``wohnlagen`` werden Adressen ohne PLZ zusätzlich über den Ortsteil zugeordnet;
+    ``cache`` (``address_cache``) übernimmt bereits aufgelöste Adressen.
+    """
+    plz_to_district = dict(zip(plz_mapping['PLZ'], plz_mapping['Bezirk']))
+    plz_to_district.update(EXTENDED_PLZ_MAPPING)
+
+    ortsteil_to_plz = ortsteil_to_plz_mapping(wohnlagen) if wohnlagen is not None else None
+    resolved = resolve_addresses(raw['address'], plz_to_district, ortsteil_to_plz, cache=cache)
+    df = raw.assign(district=resolved['district'], plz=resolved['plz'])
+    df = df[df['district'].notna()]
+
+    price, size = parse_price(df['price']), parse_size(df['size'])
+    df = df.rename(columns={'price': 'price_original', 'size': 'size_original'}).assign(
+        price_min=price['min'], price_max=price['max'], price_mid=price['mid'],
+        size_min=size['min'], size_max=size['max'], size_mid=size['mid'],
+        units=parse_unit_count(df['title']),
+    )
+    if expand:
+        df = expand_units(df)
+    else:
+        df = df.assign(price=df['price_min'], size=df['size_min'], unit=1)
+
+    df = df[df['price'].notna() & df['size'].notna()]
+    df = df[(df['price'] >= 100) & (df['price'] <= 10000)]
+    df = df[(df['size'] >= 10) & (df['size'] <= 500)]
+
+    normalized = pd.DataFrame({
+        'price': df['price'],
+        'size': df['size'],
+        'district': df['district'],
+        'rooms': np.nan,  # Nicht verfügbar im 2025 Dataset
+        'year': YEAR,
+        'dataset_id': DATASET_ID,
+        'source': SOURCE,
+        'title': df['title'],
+        'address': df['address'],
+        'link': df['link'],
+        'price_original': df['price_original'],
+        'size_original': df['size_original'],
+    })
+    for col in RANGE_COLUMNS:
+        normalized[col] = df[col]
+    normalized['plz'] = df['plz']
+
+    return normalized.reset_index(drop=True)
+
+
+def district_to_ortsteil_mapping(wohnlagen):
+    """Bezirk → Ortsteil aus den Wohnlagendaten (zusammengesetzte Bezirke → letzter passender Ortsteil)."""
+    mapping = {}
+    for ortsteil in wohnlagen['ortsteil_neu'].dropna():
+        mapping[ortsteil] = ortsteil
+        for district, parts in COMPOSITE_DISTRICTS.items():
+            if any(part in ortsteil for part in parts):
+                mapping[district] = ortsteil
+                break
+    return mapping
+
+
+def enrich(normalized, wohnlagen, plz_mapping):
+    """Normalisiertes Dataset + Wohnlagendaten → ``dataset_2025_enriched.csv``."""
+    df = normalized.copy()
+    df['plz'] = _map_unique(
+        df['address'], lambda a: (m.group(1) if (m := PLZ_PATTERN.search(str(a).strip())) else None)
+    ).astype(object)
+
+    lagen = wohnlagen.assign(plz=plz_to_string_series(wohnlagen['plz']))
+    lagen_by_plz = lagen.loc[lagen['plz'].notna(), ['plz', 'wol', 'ortsteil_neu']].drop_duplicates(subset=['plz'])
+
+    # Strategie 1: Einträge mit PLZ → Join auf die Wohnlagendaten; Adressen mit Hausnummer
+    # bekommen Wohnlage und Ortsteil der Adresse bzw. ihres Hausnummern-Bereichs, aber nur
+    # mit derselben PLZ (sonst träfe "Hauptstraße 12, 10827" die Hauptstraße in 13055)
+    with_plz = df[df['plz'].notna()].merge(lagen_by_plz, how='left', on='plz')
+    hits = AddressIndex.from_wohnlagen(lagen).lookup(with_plz['address'], plz=with_plz['plz'])
+    by_address = hits['method'].isin(['exact_plz', 'exact', 'range'])
+    with_plz['wol'] = with_plz['wol'].mask(by_address, hits['wol'])
+    with_plz['ortsteil_neu'] = with_plz['ortsteil_neu'].mask(by_address, hits['ortsteil'])
+
+    # Strategie 2: Einträge ohne PLZ → Bezirk → Ortsteil, keine Wohnlage
+    without_plz = df[df['plz'].isna()].copy()
+    without_plz['ortsteil_neu'] = without_plz['district'].map(district_to_ortsteil_mapping(lagen))
+    without_plz['wol'] = None
+
+    enriched = pd.concat([with_plz, without_plz[with_plz.columns]], ignore_index=True)
+
+    # Fehlende PLZ über den Ortsteil aus dem erweiterten PLZ-Mapping
+    ortsteil_to_plz = dict(zip(plz_mapping['Ortsteil'], plz_to_string_series(plz_mapping['PLZ'])))
+    missing = enriched['plz'].isna() & enriched['ortsteil_neu'].notna()
+    enriched.loc[missing, 'plz'] = enriched.loc[missing, 'ortsteil_neu'].map(ortsteil_to_plz)
+    enriched['plz'] = plz_to_string_series(enriched['plz'])
+
+    return enriched
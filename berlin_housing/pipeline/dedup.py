@@ -0,0 +1,191 @@
+"""
+Dubletten über Quellen und Jahre
+================================
+
+Dieselbe Wohnung taucht mehrfach auf: neu eingestellte Anzeigen im Scrape 2025
+und Immobilienscout24-Anzeigen sowohl im Kaggle-Datensatz als auch im Scrape.
+``assign_clusters`` vergibt dafür eine ``cluster_id`` (kleinster Zeilenindex
+des Clusters; Einzelanzeigen bekommen ihren eigenen Index).
+
+Kandidatenpaare entstehen nur innerhalb eines Blocks (PLZ, Zimmerzahl,
+Wohnfläche auf ``SIZE_STEP`` m² gerundet); benachbarte Flächen-Blöcke werden
+mitverglichen, damit 61,9 und 62,1 m² nicht an der Blockgrenze getrennt
+werden. Fehlt die Zimmerzahl (Scrape 2025), gilt sie als Platzhalter: solche
+Zeilen werden über (PLZ, Flächen-Block) mit allen Zeilen verglichen. Die
+Anzahl der Paare wächst damit mit der Blockgröße, nicht mit n².
+Ein Paar ist eine Dublette, wenn
+
+- Miete und Fläche innerhalb von ``PRICE_TOLERANCE`` bzw. ``SIZE_TOLERANCE``
+  liegen und
+- der Gesamtscore aus Preis-, Flächen- und Textähnlichkeit (Titel und
+  Adresse, Token-Jaccard) mindestens ``SCORE_THRESHOLD`` erreicht. Fehlt der
+  Text auf einer Seite (2022 hat weder Titel noch Adresse), zählen nur Preis
+  und Fläche.
+
+Cluster werden nicht transitiv verkettet: Jede Anzeige wird (in
+Zeilenreihenfolge) nur der ersten Anzeige eines Clusters zugeordnet, mit der
+sie selbst ein Dubletten-Paar bildet, und nur, solange Miete und Fläche aller
+Mitglieder zusammen innerhalb der Toleranzen bleiben. Sonst beginnt sie einen
+eigenen Cluster.
+"""
+
+import html
+import re
+
+import numpy as np
+import pandas as pd
+
+SIZE_STEP = 2.0             # m² je Flächen-Block
+PRICE_TOLERANCE = 0.02      # relative Mietabweichung
+SIZE_TOLERANCE = 0.5        # m²
+SCORE_THRESHOLD = 0.75
+WEIGHTS = {'price': 0.4, 'size': 0.3, 'text': 0.3}
+
+TEXT_COLUMNS = ('title', 'address')
+
+_ABBREVIATIONS = [(re.compile(r'stra(ss|ß)e\b|str\.'), 'str'), (re.compile(r'\b\d{5}\b|\bberlin\b'), ' ')]
+_TOKEN = re.compile(r'\w+')
+
+
+def _tokens(values):
+    """Token-Mengen je Wert (eindeutige Werte werden einmal zerlegt); fehlende Werte → None."""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    sets = []
+    for text in uniques:
+        text = html.unescape(str(text)).lower()
+        for pattern, replacement in _ABBREVIATIONS:
+            text = pattern.sub(replacement, text)
+        sets.append(frozenset(_TOKEN.findall(text)) or None)
+    sets.append(None)           # Code -1
+    return np.array(sets, dtype=object)[codes]
+
+
+def _jaccard(left, right):
+    """Jaccard-Ähnlichkeit je Paar; NaN, wenn eine Seite keinen Text hat."""
+    return np.array([
+        len(a & b) / len(a | b) if a is not None and b is not None else np.nan
+        for a, b in zip(left, right)
+    ], dtype='float64')
+
+
+def _block_pairs(left, right, keys):
+    """Paare aus demselben und dem benachbarten Flächen-Block (``left`` × ``right``, gleiche ``keys``)."""
+    same = left.merge(right, on=keys + ['bucket'], suffixes=('_i', '_j'))
+    upper = left.merge(right.assign(bucket=right['bucket'] + 1), on=keys + ['bucket'], suffixes=('_i', '_j'))
+    lower = left.merge(right.assign(bucket=right['bucket'] - 1), on=keys + ['bucket'], suffixes=('_i', '_j'))
+    return np.concatenate([frame[['pos_i', 'pos_j']].to_numpy() for frame in (same, upper, lower)])
+
+
+def candidate_pairs(df, size_step=SIZE_STEP):
+    """
+    Kandidatenpaare ``(i, j)`` mit ``i < j`` (Positionen in ``df``) aus demselben
+    oder dem benachbarten Flächen-Block bei gleicher PLZ und Zimmerzahl; eine
+    fehlende Zimmerzahl passt zu jeder.
+    """
+    blocks = pd.DataFrame({
+        'pos': np.arange(len(df)),
+        'plz': df['plz'].astype('string').to_numpy(),
+        'rooms': df['rooms'].to_numpy(dtype='float64'),
+        'bucket': np.floor(df['size'].to_numpy(dtype='float64') / size_step),
+    }).dropna(subset=['plz', 'bucket'])
+    known = blocks[blocks['rooms'].notna()]
+    wildcard = blocks[blocks['rooms'].isna()].drop(columns='rooms')
+
+    pairs = np.concatenate([
+        _block_pairs(known, known, ['plz', 'rooms']),
+        _block_pairs(wildcard, blocks.drop(columns='rooms'), ['plz']),
+    ])
+    pairs = np.sort(pairs[pairs[:, 0] != pairs[:, 1]], axis=1)
+    return np.unique(pairs, axis=0) if len(pairs) else pairs.reshape(0, 2)
+
+
+def score_pairs(df, pairs, tokens=None):
+    """Score je Kandidatenpaar (NaN = verworfen, weil Miete oder Fläche außerhalb der Toleranz)."""
+    i, j = pairs[:, 0], pairs[:, 1]
+    price = df['price'].to_numpy(dtype='float64')
+    size = df['size'].to_numpy(dtype='float64')
+
+    price_diff = np.abs(price[i] - price[j]) / np.maximum(np.fmax(price[i], price[j]), 1.0)
+    size_diff = np.abs(size[i] - size[j])
+    price_sim = 1 - price_diff / PRICE_TOLERANCE
+    size_sim = 1 - size_diff / SIZE_TOLERANCE
+
+    if tokens is None:
+        tokens = {col: _tokens(df[col]) for col in TEXT_COLUMNS if col in df.columns}
+    text_sims = [_jaccard(column[i], column[j]) for column in tokens.values()]
+    text_sim = np.fmax.reduce(text_sims) if text_sims else np.full(len(pairs), np.nan)
+
+    has_text = ~np.isnan(text_sim)
+    weighted = WEIGHTS['price'] * price_sim + WEIGHTS['size'] * size_sim
+    score = np.where(
+        has_text,
+        weighted + WEIGHTS['text'] * np.nan_to_num(text_sim),
+        weighted / (WEIGHTS['price'] + WEIGHTS['size']),
+    )
+    valid = (price_sim >= 0) & (size_sim >= 0)
+    return np.where(valid, score, np.nan)
+
+
+def leader_clusters(df, pairs, score, threshold=SCORE_THRESHOLD):
+    """
+    Cluster-Label je Zeile (Position der ersten Anzeige des Clusters).
+
+    Zeilen werden in Positionsreihenfolge zugeordnet: ``j`` schließt sich dem
+    Cluster mit dem besten Score an, dessen erste Anzeige ``i < j`` mit ``j``
+    ein Paar über ``threshold`` bildet und dessen Miet- und Flächenspanne mit
+    ``j`` innerhalb von ``PRICE_TOLERANCE`` bzw. ``SIZE_TOLERANCE`` bleibt.
+    """
+    labels = np.arange(len(df))
+    keep = np.nan_to_num(score, nan=-1.0) >= threshold
+    if not keep.any():
+        return labels
+    pairs, score = pairs[keep], score[keep]
+    price = df['price'].to_numpy(dtype='float64')
+    size = df['size'].to_numpy(dtype='float64')
+
+    # Je Zeile j ihre Partner i < j, bester Score zuerst
+    order = np.lexsort((-score, pairs[:, 1]))
+    bounds = {}     # Cluster → [min. Miete, max. Miete, min. Fläche, max. Fläche]
+    for i, j in pairs[order].tolist():
+        if labels[j] != j or labels[i] != i:
+            continue    # j ist schon zugeordnet bzw. i ist nicht die erste Anzeige seines Clusters
+        low_price, high_price, low_size, high_size = bounds.get(i, (price[i], price[i], size[i], size[i]))
+        low_price, high_price = min(low_price, price[j]), max(high_price, price[j])
+        low_size, high_size = min(low_size, size[j]), max(high_size, size[j])
+        if (high_price - low_price) / max(high_price, 1.0) > PRICE_TOLERANCE or high_size - low_size > SIZE_TOLERANCE:
+            continue
+        labels[j] = i
+        bounds[i] = (low_price, high_price, low_size, high_size)
+    return labels
+
+
+def assign_clusters(df, threshold=SCORE_THRESHOLD, size_step=SIZE_STEP):
+    """``cluster_id`` je Zeile (Position des ersten Eintrags im Cluster)."""
+    pairs = candidate_pairs(df, size_step)
+    score = score_pairs(df, pairs)
+    return pd.Series(leader_clusters(df, pairs, score, threshold), index=df.index, name='cluster_id')
+
+
+def deduplicate(final, enriched_2018_2019, enriched_2022, enriched_2025):
+    """
+    Finales Dataset + ``cluster_id`` (``berlin_housing_combined_deduplicated.csv``).
+
+    Titel und Adresse fehlen im kombinierten Dataset; sie werden aus den
+    angereicherten Datasets übernommen, die ``combine`` in dieser Reihenfolge
+    untereinander gesetzt hat (2018/2019: ``street``, 2025: ``address``, ``title``).
+    """
+    parts = [enriched_2018_2019, enriched_2022, enriched_2025]
+    if sum(len(part) for part in parts) != len(final):
+        raise ValueError('Zeilenzahl der angereicherten Datasets passt nicht zum finalen Dataset')
+
+    text = pd.concat([
+        pd.DataFrame({
+            'title': part['title'] if 'title' in part.columns else None,
+            'address': part['address'] if 'address' in part.columns else part.get('street'),
+        }, index=part.index)
+        for part in parts
+    ], ignore_index=True)
+
+    df = final.reset_index(drop=True)
+    df = df.assign(cluster_id=assign_clusters(pd.concat([df, text], axis=1)).to_numpy())
+    return df
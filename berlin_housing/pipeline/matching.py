@@ -0,0 +1,129 @@
+"""
+Namenssuche in Freitext
+=======================
+
+``NameMatcher`` sucht viele bekannte Namen (Bezirke, Ortsteile, Aliase,
+Straßen) gleichzeitig in Adressen bzw. ``regio3``-Werten. Alle Namen stehen
+in einer einzigen vorkompilierten Regex (als Präfixbaum); ein Lookahead liefert
+auch überlappende Treffer. Die Auswahl ist deterministisch: Ein Treffer, der
+einen ganzen Abschnitt zwischen Kommas ausfüllt ("..., Kreuzberg, Berlin";
+Klammerzusätze wie "(Ortsteil)" zählen mit), schlägt Treffer innerhalb eines
+Straßennamens ("Schöneberger Ufer"); danach gewinnt der längste, bei gleicher
+Länge der frühere Treffer (mit ``prefer='first'`` der früheste, z.B. für
+``regio3`` = "Ortsteil_Bezirk"). Leerzeichen, Bindestriche und Unterstriche gelten als
+gleichwertig ("Prenzlauer_Berg" = "Prenzlauer Berg", "Neu-Hohenschönhausen"
+= "Neu Hohenschönhausen").
+
+``match`` arbeitet auf einer ganzen Series und durchsucht jeden
+eindeutigen Text nur einmal.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+SEPARATORS = r'[\s_-]+'
+SEGMENT_AFTER = re.compile(r'\s*(?:\([^)]*\)\s*)?(?:,|$)')
+
+
+def _canonical(text):
+    return re.sub(SEPARATORS, ' ', text.strip().lower())
+
+
+def _trie_pattern(keys):
+    """
+    Regex aus einem Präfixbaum der Schlüssel.
+
+    Gemeinsame Präfixe werden nur einmal geprüft; an jeder Position wird
+    gierig der längste Schlüssel erkannt.
+    """
+    trie = {}
+    for key in keys:
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        terminal = '' in node
+        branches = [
+            (SEPARATORS if char == ' ' else re.escape(char)) + build(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if terminal:
+            body = f'(?:{body})?'
+        return body
+
+    return build(trie) if trie else r'(?!)'
+
+
+class NameMatcher:
+    """
+    Vorkompilierte Suche nach ``names`` (Name → Wert) in Texten.
+
+    ``word_boundary=True`` verlangt, dass vor und nach dem Treffer kein
+    Buchstabe bzw. keine Ziffer steht, sonst genügt ein Teilstring.
+    ``prefer`` wählt unter gleichrangigen Treffern den längsten (``'longest'``)
+    oder den frühesten (``'first'``; an derselben Position der längste).
+    """
+
+    def __init__(self, names, word_boundary=False, prefer='longest'):
+        if prefer not in ('longest', 'first'):
+            raise ValueError(f"prefer muss 'longest' oder 'first' sein, nicht {prefer!r}")
+        self.prefer = prefer
+        self.values = {}
+        self.names = {}
+        for name, value in names.items():
+            key = _canonical(name)
+            if key and key not in self.values:    # erster Eintrag gewinnt
+                self.values[key] = value
+                self.names[key] = name
+
+        body = _trie_pattern(self.values)
+        if word_boundary:
+            body = rf'(?<!\w)(?:{body})(?!\w)'
+        # Schlüssel sind kleingeschrieben; Texte werden vor der Suche einmal
+        # kleingeschrieben, statt re.IGNORECASE (deutlich langsamer) zu nutzen
+        self.pattern = re.compile(rf'(?=({body}))')
+
+    def __len__(self):
+        return len(self.values)
+
+    def find(self, text):
+        """Kanonischer Schlüssel des besten Treffers in ``text`` oder None."""
+        if not isinstance(text, str):
+            return None
+        text = text.lower()
+        best, best_rank = None, None
+        for match in self.pattern.finditer(text):
+            key = match.group(1)
+            if key not in self.values:      # abweichende Trennzeichen ("prenzlauer_berg")
+                key = _canonical(key)
+            before = text[:match.start(1)].rstrip()
+            segment = (not before or before[-1] == ',') and SEGMENT_AFTER.match(text, match.end(1)) is not None
+            rank = (segment, -match.start(1), len(key)) if self.prefer == 'first' else (segment, len(key))
+            if best_rank is None or rank > best_rank:
+                best, best_rank = key, rank
+        return best
+
+    def lookup(self, text):
+        """Wert des besten Treffers in ``text`` oder None."""
+        key = self.find(text)
+        return None if key is None else self.values[key]
+
+    def match(self, texts):
+        """
+        Bester Treffer je Text einer Series.
+
+        Gibt einen DataFrame mit ``name`` (Name wie übergeben) und ``value``
+        zurück; ohne Treffer sind beide fehlend.
+        """
+        codes, uniques = pd.factorize(texts)
+        keys = [self.find(text) for text in uniques]
+        names = np.array([None if key is None else self.names[key] for key in keys] + [None], dtype=object)
+        values = np.array([None if key is None else self.values[key] for key in keys] + [None], dtype=object)
+        return pd.DataFrame({'name': names[codes], 'value': values[codes]}, index=texts.index)
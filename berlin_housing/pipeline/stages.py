@@ -0,0 +1,310 @@
+"""
+Stufen-Graph mit inhaltsbasiertem Cache
+=======================================
+
+Jede Stufe liest ihre Eingabedateien, ruft eine reine Funktion auf und
+schreibt genau eine CSV-Datei. Der Schlüssel einer Stufe ist ein SHA1 über
+
+- den Inhalt aller Eingabedateien (auch der Ausgaben vorgelagerter Stufen),
+- den Quelltext des Moduls mit der Stufenfunktion und aller
+  ``berlin_housing``-Module, die es (auch innerhalb von Funktionen und
+  transitiv) importiert, z.B. ``matching.py``, ``plz.py``, ``geocache.py``,
+- die Stufendefinition selbst (Pfade, Lese-Optionen).
+
+Schlüssel und Ausgabe-Hash jeder Stufe stehen in
+``data/cache/pipeline_manifest.json``. Eine Stufe wird nur neu berechnet, wenn
+sich ihr Schlüssel geändert hat oder ihre Ausgabe fehlt bzw. von Hand
+verändert wurde. Ändert eine Stufe ihre Ausgabe nicht, bleiben die
+nachgelagerten Stufen unberührt.
+
+Fehlt eine Eingabedatei (z.B. ``wohnlagen_enriched.csv``, die nicht im
+Repository liegt), bleibt eine vorhandene Ausgabe der Stufe bestehen.
+
+Stufen, die Freitext auflösen (``regio3`` 2018/2019, Adressen 2025), bekommen
+den Geocoding-Cache (``data/cache/geocode.sqlite``) übergeben. Er beschleunigt
+nur die Neuberechnung; ob eine Stufe veraltet ist, entscheidet weiter der
+Schlüssel oben.
+"""
+
+import ast
+import hashlib
+import importlib
+import importlib.util
+import inspect
+import json
+import os
+import time
+
+import pandas as pd
+
+from berlin_housing.pipeline import combine, dataset_2018_2019, dataset_2022, dataset_2025, dedup
+from berlin_housing.pipeline.common import (
+    PLZ_MAPPING_ENHANCED_PATH, PLZ_MAPPING_PATH, PROCESSED_DIR, RAW_DIR, WOHNLAGEN_PATH
+)
+
+MANIFEST_PATH = 'data/cache/pipeline_manifest.json'
+
+PLZ_AS_STRING = {'dtype': {'plz': 'string'}}
+
+# Zwischenstand der Stufe combined (Basisspalten inkl. wol/plz, nicht versioniert). Die versionierte
+# berlin_housing_combined_final.csv ist ein älterer Export ohne wol/plz und wird nicht überschrieben.
+COMBINED_BASE = 'berlin_housing_combined_base.csv'
+
+
+PACKAGE = 'berlin_housing'
+
+
+def _imported_modules(module):
+    """Namen der ``berlin_housing``-Module, die ``module`` irgendwo in seinem Quelltext importiert."""
+    names = set()
+    for node in ast.walk(ast.parse(inspect.getsource(module))):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names if alias.name.split('.')[0] == PACKAGE)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and (node.module or '').split('.')[0] == PACKAGE:
+            # "from berlin_housing.pipeline import matching" importiert ein Modul, sonst Namen aus node.module
+            package = hasattr(importlib.import_module(node.module), '__path__')
+            for alias in node.names:
+                submodule = f'{node.module}.{alias.name}'
+                names.add(submodule if package and importlib.util.find_spec(submodule) else node.module)
+    return names
+
+
+def module_closure(module):
+    """``module`` und alle transitiv importierten ``berlin_housing``-Module, sortiert nach Name."""
+    seen = {module.__name__: module}
+    todo = [module]
+    while todo:
+        for name in _imported_modules(todo.pop()):
+            if name not in seen:
+                seen[name] = importlib.import_module(name)
+                todo.append(seen[name])
+    return [seen[name] for name in sorted(seen)]
+
+
+class Stage:
+    """
+    Eine Pipeline-Stufe: ``func(**inputs)`` → DataFrame → ``output``.
+
+    Mit ``positional=True`` bekommt ``func`` die Eingaben in der Reihenfolge
+    von ``inputs`` als Positionsargumente (z.B. ``combine.combine(*datasets)``).
+    """
+
+    def __init__(self, name, func, inputs, output, cache=None, positional=False):
+        self.name = name
+        self.func = func
+        self.inputs = inputs    # Argumentname → (Pfad, read_csv-Optionen)
+        self.output = output
+        self.cache = cache      # Fabrik für einen GeocodeCache, übergeben als ``cache=``
+        self.positional = positional
+
+    def __repr__(self):
+        return f'Stage({self.name!r})'
+
+    def code_hash(self):
+        digest = hashlib.sha1()
+        for module in module_closure(inspect.getmodule(self.func)):
+            digest.update(module.__name__.encode('utf-8'))
+            digest.update(inspect.getsource(module).encode('utf-8'))
+        return digest.hexdigest()
+
+    def definition(self):
+        return json.dumps({
+            'func': f'{self.func.__module__}.{self.func.__qualname__}',
+            'positional': self.positional,
+            'inputs': {arg: [path, kwargs] for arg, (path, kwargs) in self.inputs.items()},
+            'output': self.output,
+        }, sort_keys=True)
+
+    def call(self, frames, **kwargs):
+        if self.positional:
+            return self.func(*frames.values(), **kwargs)
+        return self.func(**frames, **kwargs)
+
+    def run(self, geocache=True):
+        frames = {arg: pd.read_csv(path, **kwargs) for arg, (path, kwargs) in self.inputs.items()}
+        if self.cache is None or not geocache:
+            return self.call(frames)
+        with self.cache() as cache:
+            return self.call(frames, cache=cache)
+
+
+def _processed(name):
+    return f'{PROCESSED_DIR}/{name}'
+
+
+# In topologischer Reihenfolge: raw → normalized → enriched → combined → enriched_final → deduplicated
+STAGES = [
+    Stage('normalized_2018_2019', dataset_2018_2019.normalize,
+          {'raw': (f'{RAW_DIR}/Dataset_2018_2019.csv', {}),
+           'plz_mapping': (PLZ_MAPPING_ENHANCED_PATH, {})},
+          _processed('dataset_2018_2019_normalized.csv'),
+          cache=dataset_2018_2019.regio3_cache),
+    Stage('enriched_2018_2019', dataset_2018_2019.enrich,
+          {'normalized': (_processed('dataset_2018_2019_normalized.csv'), PLZ_AS_STRING),
+           'wohnlagen': (WOHNLAGEN_PATH, {})},
+          _processed('dataset_2018_2019_enriched.csv')),
+    Stage('normalized_2022', dataset_2022.normalize,
+          {'raw': (f'{RAW_DIR}/Dataset_2022.csv', {}),
+           'plz_mapping': (PLZ_MAPPING_PATH, {})},
+          _processed('dataset_2022_normalized.csv')),
+    Stage('enriched_2022', dataset_2022.enrich,
+          {'normalized': (_processed('dataset_2022_normalized.csv'), PLZ_AS_STRING),
+           'wohnlagen': (WOHNLAGEN_PATH, {})},
+          _processed('dataset_2022_enriched.csv')),
+    Stage('normalized_2025', dataset_2025.normalize,
+          {'raw': (f'{RAW_DIR}/Dataset_2025.csv', {}),
+           'plz_mapping': (PLZ_MAPPING_PATH, {}),
+           'wohnlagen': (WOHNLAGEN_PATH, {})},
+          _processed('dataset_2025_normalized.csv'),
+          cache=dataset_2025.address_cache),
+    Stage('enriched_2025', dataset_2025.enrich,
+          {'normalized': (_processed('dataset_2025_normalized.csv'), PLZ_AS_STRING),
+           'wohnlagen': (WOHNLAGEN_PATH, {}),
+           'plz_mapping': (PLZ_MAPPING_ENHANCED_PATH, {})},
+          _processed('dataset_2025_enriched.csv')),
+    Stage('combined', combine.combine,
+          {'enriched_2018_2019': (_processed('dataset_2018_2019_enriched.csv'), PLZ_AS_STRING),
+           'enriched_2022': (_processed('dataset_2022_enriched.csv'), PLZ_AS_STRING),
+           'enriched_2025': (_processed('dataset_2025_enriched.csv'), PLZ_AS_STRING)},
+          _processed(COMBINED_BASE), positional=True),
+    Stage('enriched_final', combine.enrich_final,
+          {'combined': (_processed(COMBINED_BASE), PLZ_AS_STRING),
+           'plz_mapping': (PLZ_MAPPING_ENHANCED_PATH, {'dtype': {'PLZ': 'str'}})},
+          _processed('berlin_housing_combined_enriched_final.csv')),
+    Stage('deduplicated', dedup.deduplicate,
+          {'final': (_processed('berlin_housing_combined_enriched_final.csv'), PLZ_AS_STRING),
+           'enriched_2018_2019': (_processed('dataset_2018_2019_enriched.csv'), PLZ_AS_STRING),
+           'enriched_2022': (_processed('dataset_2022_enriched.csv'), PLZ_AS_STRING),
+           'enriched_2025': (_processed('dataset_2025_enriched.csv'), PLZ_AS_STRING)},
+          _processed('berlin_housing_combined_deduplicated.csv')),
+]
+STAGES_BY_NAME = {stage.name: stage for stage in STAGES}
+
+
+class _FileHashes:
+    """SHA1 von Dateien; unveränderte Dateien (Größe + mtime) werden nicht erneut gelesen."""
+
+    def __init__(self, known=None):
+        self.known = dict(known or {})
+
+    def __call__(self, path):
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        entry = self.known.get(path)
+        if entry and entry[:2] == signature:
+            return entry[2]
+
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self.known[path] = signature + [digest.hexdigest()]
+        return digest.hexdigest()
+
+
+def _load_manifest(path):
+    if path and os.path.exists(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass  # Defektes Manifest → alles neu prüfen
+    return {'stages': {}, 'files': {}}
+
+
+def _save_manifest(manifest, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def stage_key(stage, file_hash, code_hashes):
+    """Schlüssel einer Stufe aus Eingaben, Code und Definition."""
+    digest = hashlib.sha1()
+    digest.update(code_hashes[stage.name].encode())
+    digest.update(stage.definition().encode('utf-8'))
+    for arg, (path, _) in sorted(stage.inputs.items()):
+        digest.update(f'{arg}={file_hash(path)}'.encode())
+    return digest.hexdigest()
+
+
+def resolve_stages(targets=None):
+    """Stufen für ``targets`` inklusive aller vorgelagerten Stufen, in Ausführungsreihenfolge."""
+    if not targets:
+        return list(STAGES)
+
+    unknown = [name for name in targets if name not in STAGES_BY_NAME]
+    if unknown:
+        raise KeyError(f"Unbekannte Stufe(n): {', '.join(unknown)}")
+
+    producers = {stage.output: stage for stage in STAGES}
+    needed, todo = set(), list(targets)
+    while todo:
+        stage = STAGES_BY_NAME[todo.pop()]
+        if stage.name in needed:
+            continue
+        needed.add(stage.name)
+        todo.extend(producers[path].name for path, _ in stage.inputs.values() if path in producers)
+    return [stage for stage in STAGES if stage.name in needed]
+
+
+def run_pipeline(targets=None, force=False, manifest_path=MANIFEST_PATH, verbose=True, geocache=True):
+    """
+    Führe die Pipeline aus und berechne nur veraltete Stufen neu.
+
+    ``targets`` begrenzt den Lauf auf diese Stufen und ihre Vorgänger,
+    ``force`` berechnet alle gewählten Stufen neu, ``geocache=False`` löst
+    ``regio3`` und Adressen ohne Geocoding-Cache auf. Gibt ein dict
+    Stufe → Status zurück (``'aktuell'``, ``'neu berechnet'``, ``'beibehalten'``).
+    """
+    manifest = _load_manifest(manifest_path)
+    file_hash = _FileHashes(manifest.get('files'))
+    code_hashes = {}
+    status = {}
+
+    for stage in resolve_stages(targets):
+        missing = [path for path, _ in stage.inputs.values() if not os.path.exists(path)]
+        if missing:
+            if not os.path.exists(stage.output):
+                raise FileNotFoundError(f"{stage.name}: Eingabe fehlt: {', '.join(missing)}")
+            status[stage.name] = 'beibehalten'
+            if verbose:
+                print(f"  ⚠️  {stage.name}: Eingabe fehlt ({', '.join(missing)}) - vorhandene Ausgabe bleibt")
+            continue
+
+        if stage.name not in code_hashes:
+            code_hashes[stage.name] = stage.code_hash()
+        key = stage_key(stage, file_hash, code_hashes)
+        entry = manifest['stages'].get(stage.name, {})
+
+        up_to_date = (
+            not force
+            and entry.get('key') == key
+            and os.path.exists(stage.output)
+            and file_hash(stage.output) == entry.get('output')
+        )
+        if up_to_date:
+            status[stage.name] = 'aktuell'
+            if verbose:
+                print(f"  ✓ {stage.name}: aktuell")
+            continue
+
+        start = time.perf_counter()
+        result = stage.run(geocache=geocache)
+        os.makedirs(os.path.dirname(stage.output) or '.', exist_ok=True)
+        tmp_path = stage.output + '.tmp'
+        result.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, stage.output)
+
+        manifest['stages'][stage.name] = {'key': key, 'output': file_hash(stage.output)}
+        status[stage.name] = 'neu berechnet'
+        if verbose:
+            print(f"  🔄 {stage.name}: {len(result):,} Zeilen → {stage.output} "
+                  f"({time.perf_counter() - start:.2f}s)")
+
+    manifest['files'] = file_hash.known
+    if manifest_path:
+        _save_manifest(manifest, manifest_path)
+    return status
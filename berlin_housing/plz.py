@@ -0,0 +1,118 @@
+"""
+PLZ-Normalisierung und Berliner PLZ-Index
+=========================================
+
+``normalize_plz`` bringt eine ganze Spalte in einem Durchgang auf
+5-stellige PLZ-Strings (wie das frühere ``convert_plz_to_string`` der
+Notebooks 02-04, aber ohne Python-Aufruf pro Wert):
+
+    10117.0 → "10117", 10117 → "10117", "10117.0" → "10117",
+    " 10117 " → "10117", nan/"nan"/"None"/"" → <NA>, "1011" → <NA>
+
+``BerlinPlz`` enthält die PLZ aus ``berlin_plz_mapping_enhanced.csv`` als
+feste Kategorien. ``validate`` liefert die PLZ als Categorical (int16-Codes)
+und eine Gültigkeitsmaske, ``lookup`` Ortsteil, Bezirk und Koordinaten per
+Code-Indexierung in Arrays statt per String-Merge.
+"""
+
+import numpy as np
+import pandas as pd
+
+PLZ_MAPPING_ENHANCED_PATH = 'data/processed/berlin_plz_mapping_enhanced.csv'
+
+# Werte, die in den Rohdaten für "keine PLZ" stehen
+MISSING_TOKENS = ['nan', 'none', '']
+
+# Spalten des PLZ-Mappings → Spalten im angereicherten Dataset
+LOOKUP_COLUMNS = {'Ortsteil': 'ortsteil', 'Bezirk': 'bezirk', 'Lat': 'lat', 'Lon': 'lon'}
+
+
+def _normalize_unique(values):
+    """Vektorisierte Normalisierung (ohne fehlende Werte, meist die eindeutigen Werte einer Spalte)."""
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        numbers = values.astype('float64').to_numpy()
+        valid = np.isfinite(numbers)
+        numbers = np.trunc(np.where(valid, numbers, 0))
+        valid &= (numbers >= 10000) & (numbers <= 99999)
+        plz = pd.Series(numbers.astype('int64')).astype('string')
+        return plz.where(valid, pd.NA)
+
+    text = values.astype('string').str.strip()
+    text = text.mask(text.str.lower().isin(MISSING_TOKENS))
+    text = text.str.replace(r'\.0$', '', regex=True)
+    return text.where(text.str.fullmatch(r'\d{5}').fillna(False), pd.NA)
+
+
+def _factorized(values):
+    """(Codes, normalisierte eindeutige PLZ) - jeder eindeutige Rohwert wird einmal normalisiert."""
+    codes, uniques = pd.factorize(values)
+    plz = _normalize_unique(pd.Series(uniques)).reset_index(drop=True)
+    return codes, plz
+
+
+def normalize_plz(values):
+    """
+    PLZ-Spalte → 5-stellige Strings (``string``-Dtype), ungültige Werte → <NA>.
+
+    Zahlen zählen im Bereich 10000-99999 (Nachkommastellen werden wie bei
+    ``int()`` abgeschnitten), Strings müssen nach Entfernen eines ``.0``
+    genau 5 Ziffern haben.
+    """
+    values = pd.Series(values)
+    codes, plz = _factorized(values)
+    result = plz.reindex(codes)     # Code -1 (fehlender Wert) → <NA>
+    result.index = values.index
+    return result
+
+
+class BerlinPlz:
+    """Berliner PLZ mit Ortsteil, Bezirk und Koordinaten, indexiert über Kategorie-Codes."""
+
+    def __init__(self, mapping):
+        mapping = mapping.assign(PLZ=normalize_plz(mapping['PLZ']))
+        mapping = mapping[mapping['PLZ'].notna()].drop_duplicates('PLZ').sort_values('PLZ')
+
+        self.dtype = pd.CategoricalDtype(mapping['PLZ'].astype(str).tolist())
+        # Eine Zeile mehr am Ende: Code -1 (unbekannte PLZ) greift auf fehlende Werte zu
+        self.columns = {}
+        for source, target in LOOKUP_COLUMNS.items():
+            if source not in mapping.columns:
+                continue
+            if pd.api.types.is_float_dtype(mapping[source]):
+                self.columns[target] = np.append(mapping[source].to_numpy(dtype='float64'), np.nan)
+            else:
+                self.columns[target] = np.append(mapping[source].to_numpy(dtype=object), None)
+
+    @classmethod
+    def from_csv(cls, path=PLZ_MAPPING_ENHANCED_PATH):
+        return cls(pd.read_csv(path, dtype={'PLZ': str}))
+
+    def __len__(self):
+        return len(self.dtype.categories)
+
+    def __contains__(self, plz):
+        return plz in self.dtype.categories
+
+    def codes(self, values):
+        """Kategorie-Code je Wert (-1 = keine gültige Berliner PLZ)."""
+        codes, plz = _factorized(pd.Series(values))
+        plz_codes = pd.Categorical(plz, dtype=self.dtype).codes
+        return np.where(codes >= 0, plz_codes[codes], -1).astype(plz_codes.dtype)
+
+    def validate(self, values):
+        """
+        PLZ-Spalte prüfen.
+
+        Gibt ``(plz, valid)`` zurück: ``plz`` als Categorical mit den Berliner
+        PLZ als Kategorien, ``valid`` als bool-Maske (True = Berliner PLZ).
+        """
+        values = pd.Series(values)
+        codes = self.codes(values)
+        plz = pd.Series(pd.Categorical.from_codes(codes, dtype=self.dtype), index=values.index)
+        return plz, pd.Series(codes >= 0, index=values.index)
+
+    def lookup(self, values):
+        """Ortsteil, Bezirk, Lat, Lon je PLZ (fehlend bei unbekannter PLZ)."""
+        values = pd.Series(values)
+        codes = self.codes(values)
+        return pd.DataFrame({name: array[codes] for name, array in self.columns.items()}, index=values.index)
@@ -0,0 +1,102 @@
+"""
+Aggregat-Würfel (Jahr × Ortsteil × Bezirk)
+==========================================
+
+Ein einziger groupby über alle Angebote liefert pro (year, ortsteil, bezirk)
+Anzahl, Summe, Mittelwert und Median von ``price`` und ``price_per_sqm``.
+Karten-Layer, Legende und Notebook 05 lesen ihre Kennzahlen als Ausschnitte
+bzw. Roll-ups aus diesem Würfel, statt die Angebote erneut zu filtern.
+
+Anzahl, Summe und Mittelwert lassen sich exakt auf gröbere Gruppierungen
+verdichten. Mediane sind nur auf Würfelebene exakt; Roll-ups liefern den
+mit der Anzahl gewichteten Median der Zellmediane als Näherung. Zellen, die
+``--append`` aktualisiert hat, tragen den Sketch-Median des Aggregat-Speichers
+(auf etwa 1 % genau).
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+CUBE_KEYS = ['year', 'ortsteil', 'bezirk']
+CUBE_PATH = 'data/processed/berlin_price_cube.csv'
+MEASURES = ['price', 'price_per_sqm']
+
+
+def build_price_cube(df):
+    """Berechne den Würfel in einem groupby (Zeilen ohne Ortsteil bleiben als eigene Zelle erhalten)."""
+    if 'price_per_sqm' not in df.columns:
+        df = df.assign(price_per_sqm=(df['price'] / df['size']).replace([np.inf, -np.inf], np.nan))
+
+    aggregations = {}
+    for measure in MEASURES:
+        aggregations[f'{measure}_count'] = (measure, 'count')
+        aggregations[f'{measure}_sum'] = (measure, 'sum')
+        aggregations[f'{measure}_mean'] = (measure, 'mean')
+        aggregations[f'{measure}_median'] = (measure, 'median')
+
+    keys = [key for key in CUBE_KEYS if key in df.columns]
+    cube = df.groupby(keys, dropna=False, observed=True, sort=True).agg(**aggregations)
+    return cube.reset_index()
+
+
+def _weighted_median(values, weights):
+    mask = ~(np.isnan(values) | (weights <= 0))
+    if not mask.any():
+        return np.nan
+    values, weights = values[mask], weights[mask]
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    return values[order][np.searchsorted(cumulative, cumulative[-1] / 2)]
+
+
+def rollup(cube, by):
+    """Verdichte den Würfel auf die Schlüssel ``by`` (z.B. ``['ortsteil']`` oder ``['year']``)."""
+    by = [by] if isinstance(by, str) else list(by)
+    sums = [f'{m}_{s}' for m in MEASURES for s in ('count', 'sum')]
+
+    if not by:
+        result = cube[sums].sum().to_frame().T
+        groups = [(None, cube)]
+    else:
+        grouped = cube.groupby(by, dropna=False, sort=True)
+        result = grouped[sums].sum()
+        groups = grouped
+
+    for measure in MEASURES:
+        count = result[f'{measure}_count']
+        result[f'{measure}_mean'] = result[f'{measure}_sum'] / count.where(count > 0)
+
+        if set(by) == set(CUBE_KEYS):
+            result[f'{measure}_median'] = cube.set_index(by)[f'{measure}_median']
+        else:
+            result[f'{measure}_median'] = [
+                _weighted_median(group[f'{measure}_median'].to_numpy('float64'),
+                                 group[f'{measure}_count'].to_numpy('float64'))
+                for _, group in groups
+            ]
+
+    return result
+
+
+def ortsteil_slice(cube, year=None):
+    """Kennzahlen pro Ortsteil für ein Jahr (oder alle Jahre zusammen)."""
+    part = cube[cube['ortsteil'].notna()]
+    if year is not None:
+        part = part[part['year'] == year]
+    return rollup(part, ['ortsteil'])
+
+
+def save_price_cube(cube, path=CUBE_PATH):
+    """Speichere den Würfel als CSV."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    cube.to_csv(path, index=False)
+    return path
+
+
+def load_price_cube(path=CUBE_PATH):
+    """Lade einen gespeicherten Würfel."""
+    cube = pd.read_csv(path, dtype={'ortsteil': 'string', 'bezirk': 'string'})
+    cube['year'] = cube['year'].astype('int64')
+    return cube
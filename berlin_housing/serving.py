@@ -0,0 +1,132 @@
+"""
+Lokaler HTTP-Scoring-Endpunkt mit Micro-Batching
+================================================
+
+    python -m berlin_housing.model serve --port 8000
+
+- ``POST /predict`` mit ``{"rows": [{"size": 60, "rooms": 2, "year": 2025, "plz": "10115", ...}]}``
+  (oder direkt einer Liste von Zeilen) → ``{"predictions": [...], "model": ..., "version": ...}``
+- ``GET /health`` → Modellname, Version, Schema, Metriken
+
+Gleichzeitige Anfragen werden gesammelt (bis ``max_batch`` Zeilen oder
+``max_wait`` Sekunden) und in einem einzigen ``RentModel.predict`` bewertet;
+jede Anfrage bekommt danach ihren Ausschnitt zurück. Das Modell wird beim
+Start einmal geladen.
+"""
+
+import json
+import queue
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from berlin_housing.model import MODEL_PATH, RentModel
+
+
+class MicroBatcher:
+    """Sammelt DataFrames aus mehreren Threads und bewertet sie gemeinsam."""
+
+    def __init__(self, model, max_batch=10000, max_wait=0.005):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, df):
+        """Reihe ``df`` ein; das Future liefert die Vorhersagen als Array."""
+        future = Future()
+        self._queue.put((df, future))
+        return future
+
+    def predict(self, df, timeout=30):
+        return self.submit(df).result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        rows = len(batch[0][0])
+        while rows < self.max_batch:
+            try:
+                item = self._queue.get(timeout=self.max_wait)
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                frames = [df for df, _ in batch]
+                predictions = self.model.predict(pd.concat(frames, ignore_index=True))
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            start = 0
+            for df, future in batch:
+                future.set_result(predictions[start:start + len(df)])
+                start += len(df)
+
+
+def _handler(batcher):
+    model = batcher.model
+
+    class ScoringHandler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != '/health':
+                return self._send(404, {'error': f'Unbekannter Pfad: {self.path}'})
+            self._send(200, {'status': 'ok', 'model': model.name, 'version': model.version,
+                             'trained_at': model.trained_at, 'schema': model.schema, 'metrics': model.metrics})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                return self._send(404, {'error': f'Unbekannter Pfad: {self.path}'})
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                rows = payload['rows'] if isinstance(payload, dict) else payload
+                df = pd.DataFrame.from_records(rows)
+            except (ValueError, KeyError, TypeError) as exc:
+                return self._send(400, {'error': f'Ungültige Anfrage: {exc}'})
+            try:
+                predictions = batcher.predict(df)
+            except Exception as exc:
+                return self._send(500, {'error': str(exc)})
+            self._send(200, {'predictions': predictions.round(2).tolist(),
+                             'model': model.name, 'version': model.version})
+
+        def log_message(self, format, *args):
+            pass    # kein Log pro Anfrage
+
+    return ScoringHandler
+
+
+def make_server(model, host='127.0.0.1', port=8000, max_batch=10000, max_wait=0.005):
+    """HTTP-Server für ein geladenes ``RentModel`` (Port 0 = freier Port)."""
+    batcher = MicroBatcher(model, max_batch=max_batch, max_wait=max_wait)
+    return ThreadingHTTPServer((host, port), _handler(batcher))
+
+
+def serve(path=MODEL_PATH, host='127.0.0.1', port=8000, max_batch=10000, max_wait=0.005):
+    """Modell laden und den Scoring-Endpunkt bis Strg+C bereitstellen."""
+    model = RentModel.load(path)
+    server = make_server(model, host, port, max_batch, max_wait)
+    print(f"🚀 {model!r} auf http://{host}:{server.server_address[1]}/predict")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Server beendet")
+    finally:
+        server.server_close()
@@ -0,0 +1,321 @@
+"""
+Kreuzvalidierte Modellsuche
+===========================
+
+    python -m berlin_housing.tuning                          # RandomForest + LightGBM, nach Ortsteil gruppiert
+    python -m berlin_housing.tuning --group-by year --workers 4
+    python -m berlin_housing.tuning --estimators lightgbm --folds 10
+
+Statt eines einzelnen ``train_test_split`` (Notebook 06) wird jede
+Kandidaten-Konfiguration aus ``SEARCH_SPACE`` mit gruppierter K-Fold-CV
+bewertet: alle Angebote eines Ortsteils (bzw. Jahres) landen im selben Fold,
+das Modell wird also immer auf unbekannten Ortsteilen (Jahren) getestet. Gibt
+es weniger Gruppen als Folds (``year``: 3 Jahre), wird die Fold-Anzahl auf die
+Gruppenzahl begrenzt, also Leave-One-Group-Out.
+
+- Die vorverarbeiteten Fold-Matrizen (``ColumnTransformer`` auf dem
+  Trainingsteil angepasst) werden unter ``data/cache/tuning/folds/`` abgelegt.
+  Der Schlüssel enthält den Inhalt der Trainings-CSV, Gruppierung, Fold,
+  Encoding und den Quelltext der Vorverarbeitung; eine wiederholte Suche
+  lädt die Matrizen nur noch.
+- Alle (Kandidat, Fold)-Paare laufen in einem Prozess-Pool.
+- LightGBM-Kandidaten trainieren mit vielen Bäumen und stoppen früh auf
+  einem Validierungsteil des Trainings-Folds; die Bestiteration wird
+  mitprotokolliert. Der Validierungsteil besteht aus ganzen Gruppen, sonst
+  sähe das Early Stopping Angebote derselben Ortsteile (Jahre) wie das
+  Training.
+
+Die Ergebnisse (Mittelwert/Streuung von R², MAE, RMSE je Kandidat) werden an
+``data/cache/tuning/leaderboard.csv`` angehängt und nach R² sortiert.
+"""
+
+import argparse
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from berlin_housing import model as rent_model
+from berlin_housing.model import DEFAULT_ENCODING, ESTIMATORS, SUPPORTED_ENCODINGS, TARGET, TRAINING_PATH
+
+TUNING_DIR = 'data/cache/tuning'
+FOLD_CACHE_DIR = os.path.join(TUNING_DIR, 'folds')
+LEADERBOARD_PATH = os.path.join(TUNING_DIR, 'leaderboard.csv')
+
+GROUP_COLUMNS = ('ortsteil', 'year')
+
+# Raster je Modell; Listen werden kombiniert, Skalare gelten für alle Kandidaten
+SEARCH_SPACE = {
+    'random_forest': {
+        'n_estimators': 200,
+        'max_depth': [None, 20],
+        'min_samples_leaf': [1, 3, 10],
+        'max_features': [1.0, 0.5],
+        'n_jobs': 1,                # parallelisiert wird über den Prozess-Pool
+    },
+    'lightgbm': {
+        'n_estimators': 2000,       # Obergrenze, Early Stopping bestimmt die Anzahl
+        'learning_rate': [0.03, 0.1],
+        'num_leaves': [15, 31, 63],
+        'min_child_samples': [10, 30],
+        'n_jobs': 1,
+    },
+    'linear': {},
+}
+
+EARLY_STOPPING_ROUNDS = 50
+VALIDATION_SIZE = 0.1       # Anteil der Gruppen des Trainings-Folds (mindestens eine)
+
+# Aufbau der Fold-Dateien; erhöhen, wenn sich ihr Inhalt ändert
+FOLD_FORMAT = 2
+
+
+def candidates(estimator, space=None):
+    """Alle Parameter-Kombinationen eines Modells als Liste von dicts."""
+    space = SEARCH_SPACE[estimator] if space is None else space
+    grid = {name: values if isinstance(values, list) else [values] for name, values in space.items()}
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _preprocessing_source_hash():
+    digest = hashlib.sha1()
+    for func in (rent_model.prepare_features, rent_model.build_preprocessor):
+        digest.update(inspect.getsource(func).encode('utf-8'))
+    digest.update(str(rent_model.ARTIFACT_VERSION).encode())
+    return digest.hexdigest()
+
+
+def make_groups(df, group_by):
+    """Gruppen-Label je Zeile (fehlende Werte bilden eine eigene Gruppe)."""
+    if group_by not in GROUP_COLUMNS:
+        raise KeyError(f"Unbekannte Gruppierung: {group_by} ({', '.join(GROUP_COLUMNS)})")
+    return df[group_by].astype('string').fillna('<unbekannt>').to_numpy()
+
+
+def count_groups(data_path, group_by):
+    """Anzahl der Gruppen unter den Zeilen mit Zielwert (liest nur zwei Spalten)."""
+    if group_by not in GROUP_COLUMNS:
+        raise KeyError(f"Unbekannte Gruppierung: {group_by} ({', '.join(GROUP_COLUMNS)})")
+    df = pd.read_csv(data_path, usecols=[TARGET, group_by])
+    return len(np.unique(make_groups(df[df[TARGET].notna()], group_by)))
+
+
+def fold_matrices(data_path=TRAINING_PATH, group_by='ortsteil', n_splits=5, encodings=('codes',),
+                  random_state=42, cache_dir=FOLD_CACHE_DIR, verbose=True):
+    """
+    Vorverarbeitete Fold-Matrizen je Encoding, auf der Platte memoisiert.
+
+    Gibt ``{encoding: [Pfad je Fold]}`` zurück; jede Datei enthält
+    ``X_train``, ``y_train``, ``groups_train``, ``X_test``, ``y_test`` (joblib).
+    """
+    import joblib
+    from sklearn.model_selection import GroupKFold
+
+    base = {
+        'data': _file_hash(data_path),
+        'group_by': group_by,
+        'n_splits': n_splits,
+        'random_state': random_state,
+        'code': _preprocessing_source_hash(),
+        'format': FOLD_FORMAT,
+    }
+    paths = {}
+    missing = []
+    for encoding in encodings:
+        paths[encoding] = []
+        for fold in range(n_splits):
+            key = json.dumps(dict(base, encoding=encoding, fold=fold), sort_keys=True)
+            path = os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + '.joblib')
+            paths[encoding].append(path)
+            if not os.path.exists(path):
+                missing.append((encoding, fold, path))
+
+    if verbose:
+        total = sum(len(p) for p in paths.values())
+        print(f"  📦 Fold-Matrizen: {total - len(missing)}/{total} aus dem Cache")
+    if not missing:
+        return paths
+
+    df = pd.read_csv(data_path, dtype={'plz': 'string'})
+    df = df[df[TARGET].notna()].reset_index(drop=True)
+    X = rent_model.prepare_features(df)
+    y = df[TARGET].to_numpy(dtype='float64')
+    groups = make_groups(df, group_by)
+    n_groups = len(np.unique(groups))
+    if n_groups < n_splits:
+        raise ValueError(f"{group_by} hat nur {n_groups} Gruppen für {n_splits} Folds")
+    splits = list(GroupKFold(n_splits=n_splits).split(X, y, groups))
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for encoding, fold, path in missing:
+        train_idx, test_idx = splits[fold]
+        preprocessor = rent_model.build_preprocessor(encoding, random_state)
+        matrices = {
+            'X_train': preprocessor.fit_transform(X.iloc[train_idx], y[train_idx]),
+            'y_train': y[train_idx],
+            'groups_train': groups[train_idx],
+            'X_test': preprocessor.transform(X.iloc[test_idx]),
+            'y_test': y[test_idx],
+        }
+        tmp_path = path + '.tmp'
+        joblib.dump(matrices, tmp_path)
+        os.replace(tmp_path, path)
+    return paths
+
+
+def _evaluate_candidate(path, estimator, encoding, params, random_state):
+    """Ein (Kandidat, Fold)-Paar im Worker-Prozess: Matrix laden, fitten, bewerten."""
+    import joblib
+    from sklearn.model_selection import GroupShuffleSplit
+
+    fold = joblib.load(path)
+    model = rent_model.build_estimator(estimator, random_state, **params)
+    kwargs = rent_model.fit_params(estimator, encoding)
+    X_train, y_train = fold['X_train'], fold['y_train']
+
+    start = time.perf_counter()
+    best_iteration = None
+    if estimator == 'lightgbm':
+        import lightgbm as lgb
+
+        # Validierung auf ganzen Gruppen des Trainings-Folds, wie die äußere CV
+        splitter = GroupShuffleSplit(n_splits=1, test_size=VALIDATION_SIZE, random_state=random_state)
+        fit_idx, valid_idx = next(splitter.split(X_train, y_train, fold['groups_train']))
+        X_fit, X_valid = X_train[fit_idx], X_train[valid_idx]
+        y_fit, y_valid = y_train[fit_idx], y_train[valid_idx]
+        # LightGBM >= 4.6: eval_X/eval_y statt eval_set
+        if 'eval_X' in inspect.signature(model.fit).parameters:
+            kwargs.update(eval_X=(X_valid,), eval_y=(y_valid,))
+        else:
+            kwargs.update(eval_set=[(X_valid, y_valid)])
+        model.fit(X_fit, y_fit, callbacks=[lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)], **kwargs)
+        best_iteration = int(model.best_iteration_ or params.get('n_estimators', 100))
+    else:
+        model.fit(X_train, y_train, **kwargs)
+    fit_seconds = time.perf_counter() - start
+
+    metrics = rent_model.evaluate(fold['y_test'], model.predict(fold['X_test']))
+    return dict(metrics, fit_seconds=fit_seconds, best_iteration=best_iteration)
+
+
+def search(data_path=TRAINING_PATH, estimators=('random_forest', 'lightgbm'), group_by='ortsteil', n_splits=5,
+           workers=None, space=None, random_state=42, leaderboard_path=LEADERBOARD_PATH, verbose=True):
+    """
+    Gruppierte K-Fold-Suche über ``SEARCH_SPACE`` (oder ``space[estimator]``).
+
+    Gibt die Ergebnisse dieses Laufs als DataFrame zurück (ein Eintrag je
+    Kandidat) und hängt sie an die Leaderboard-Datei an.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    n_groups = count_groups(data_path, group_by)
+    # Early Stopping braucht im Trainings-Fold mindestens zwei Gruppen (Fit + Validierung)
+    min_groups = 3 if 'lightgbm' in estimators else 2
+    if n_groups < min_groups:
+        raise ValueError(f"{group_by} hat nur {n_groups} Gruppen, mindestens {min_groups} nötig")
+    if n_groups < n_splits:
+        if verbose:
+            print(f"  ℹ️  {group_by} hat nur {n_groups} Gruppen: {n_groups} Folds statt {n_splits} "
+                  f"(Leave-One-Group-Out)")
+        n_splits = n_groups
+
+    encodings = {estimator: DEFAULT_ENCODING[estimator] for estimator in estimators}
+    for estimator, encoding in encodings.items():
+        if encoding not in SUPPORTED_ENCODINGS[estimator]:
+            raise ValueError(f"Encoding {encoding} passt nicht zu {estimator}")
+    paths = fold_matrices(data_path, group_by, n_splits, sorted(set(encodings.values())), random_state,
+                          verbose=verbose)
+
+    tasks = []
+    for estimator in estimators:
+        for params in candidates(estimator, (space or {}).get(estimator)):
+            for fold, path in enumerate(paths[encodings[estimator]]):
+                tasks.append((estimator, params, fold, path))
+    if verbose:
+        print(f"  🔍 {len(tasks) // n_splits} Kandidaten × {n_splits} Folds in {workers or os.cpu_count()} Prozess(en)")
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_evaluate_candidate, path, estimator, encodings[estimator], params, random_state)
+                   for estimator, params, fold, path in tasks]
+        scores = [future.result() for future in futures]
+
+    rows = [dict(estimator=estimator, params=json.dumps(params, sort_keys=True), fold=fold, **score)
+            for (estimator, params, fold, _), score in zip(tasks, scores)]
+    per_fold = pd.DataFrame(rows)
+    summary = per_fold.groupby(['estimator', 'params'], sort=False).agg(
+        r2_mean=('r2', 'mean'), r2_std=('r2', 'std'),
+        mae_mean=('mae', 'mean'), rmse_mean=('rmse', 'mean'),
+        best_iteration=('best_iteration', 'median'), fit_seconds=('fit_seconds', 'sum'),
+    ).reset_index()
+    summary.insert(1, 'encoding', summary['estimator'].map(encodings))
+    summary.insert(0, 'run_at', time.strftime('%Y-%m-%dT%H:%M:%S'))
+    summary['group_by'] = group_by
+    summary['n_splits'] = n_splits
+    summary = summary.sort_values('r2_mean', ascending=False, ignore_index=True)
+
+    write_leaderboard(summary, leaderboard_path)
+    if verbose:
+        print(f"  ⏱️  {time.perf_counter() - start:.1f}s")
+        for row in summary.head(5).itertuples():
+            print(f"  {row.r2_mean:.4f} ± {row.r2_std:.4f} · MAE {row.mae_mean:7.2f} € · {row.estimator} {row.params}")
+    return summary
+
+
+def write_leaderboard(summary, path=LEADERBOARD_PATH):
+    """Hänge ``summary`` an die Leaderboard-CSV an (sortiert nach R²)."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if os.path.exists(path):
+        summary = pd.concat([pd.read_csv(path), summary], ignore_index=True)
+    summary = summary.sort_values('r2_mean', ascending=False, ignore_index=True)
+    tmp_path = path + '.tmp'
+    summary.to_csv(tmp_path, index=False, float_format='%.6g')
+    os.replace(tmp_path, path)
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m berlin_housing.tuning',
+                                     description='Gruppierte Kreuzvalidierung über einen Suchraum.')
+    parser.add_argument('--data', default=TRAINING_PATH, help='Trainings-CSV (Standard: %(default)s)')
+    parser.add_argument('--estimators', nargs='+', default=['random_forest', 'lightgbm'], choices=ESTIMATORS)
+    parser.add_argument('--group-by', default='ortsteil', choices=GROUP_COLUMNS)
+    parser.add_argument('--folds', type=int, default=5, help='Anzahl Folds (Standard: %(default)s)')
+    parser.add_argument('--workers', type=int, default=None, help='Prozesse (Standard: alle Kerne)')
+    parser.add_argument('--leaderboard', default=LEADERBOARD_PATH, help='Leaderboard-CSV (Standard: %(default)s)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.exists(args.data):
+        print(f"❌ Datei nicht gefunden: {args.data}")
+        return 1
+    print(f"🎛️  Modellsuche ({args.folds} Folds, gruppiert nach {args.group_by})")
+    try:
+        search(args.data, args.estimators, args.group_by, args.folds, args.workers,
+               leaderboard_path=args.leaderboard)
+    except ValueError as exc:
+        print(f"❌ {exc}")
+        return 1
+    print(f"✅ Leaderboard: {args.leaderboard}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,207 +6,149 @@ that maps PLZ to Ortsteil (sub-district) with coordinates instead of just Bezirk
 This provides much more granular and accurate geolocation for the Berlin Housing Market Analysis.
 """
 
-import pandas as pd
+import argparse
 import csv
-from collections import defaultdict, Counter
-
-# Ortsteil coordinates for Berlin (manually curated for high accuracy)
-# These are the centroids of the respective Ortsteile
-ORTSTEIL_COORDS = {
-    # Mitte
-    'Mitte': [52.5200, 13.4050],
-    'Tiergarten': [52.5147, 13.3507],
-    'Wedding': [52.5500, 13.3650],
-    'Gesundbrunnen': [52.5511, 13.3885],
-    'Moabit': [52.5280, 13.3430],
-    
-    # Friedrichshain-Kreuzberg
-    'Friedrichshain': [52.5159, 13.4533],
-    'Kreuzberg': [52.4987, 13.4030],
-    
-    # Pankow
-    'Prenzlauer Berg': [52.5409, 13.4134],
-    'Weißensee': [52.5547, 13.4774],
-    'Pankow': [52.5692, 13.4018],
-    'Buch': [52.6289, 13.4999],
-    'Französisch Buchholz': [52.6140, 13.4200],
-    'Karow': [52.6082, 13.4816],
-    'Wilhelmsruh': [52.5897, 13.4186],
-    'Rosenthal': [52.5944, 13.3778],
-    'Blankenfelde': [52.6033, 13.3889],
-    'Heinersdorf': [52.5755, 13.4456],
-    'Malchow': [52.5733, 13.4667],
-    'Wartenberg': [52.5667, 13.5167],
-    'Blankenburg': [52.5964, 13.4564],
-    'Niederschönhausen': [52.5756, 13.4000],
-    
-    # Charlottenburg-Wilmersdorf
-    'Charlottenburg': [52.5170, 13.3043],
-    'Wilmersdorf': [52.4867, 13.3189],
-    'Schmargendorf': [52.4667, 13.2833],
-    'Grunewald': [52.4833, 13.2667],
-    'Westend': [52.5167, 13.2833],
-    'Halensee': [52.4958, 13.3056],
-    
-    # Spandau
-    'Spandau': [52.5333, 13.2000],
-    'Hakenfelde': [52.5500, 13.1833],
-    'Gatow': [52.4833, 13.1833],
-    'Kladow': [52.4500, 13.1500],
-    'Staaken': [52.5333, 13.1333],
-    'Falkenhagener Feld': [52.5500, 13.1667],
-    'Wilhelmstadt': [52.5167, 13.1833],
-    
-    # Steglitz-Zehlendorf
-    'Steglitz': [52.4500, 13.3167],
-    'Zehlendorf': [52.4333, 13.2500],
-    'Wannsee': [52.4167, 13.1833],
-    'Nikolassee': [52.4167, 13.2167],
-    'Dahlem': [52.4667, 13.2833],
-    'Lichterfelde': [52.4333, 13.3000],
-    'Lankwitz': [52.4333, 13.3500],
-    'Mariendorf': [52.4333, 13.3833],
-    'Marienfelde': [52.4000, 13.3667],
-    'Lichtenrade': [52.3833, 13.4000],
-    
-    # Tempelhof-Schöneberg
-    'Tempelhof': [52.4500, 13.3833],
-    'Schöneberg': [52.4833, 13.3500],
-    'Friedenau': [52.4667, 13.3333],
-    
-    # Neukölln
-    'Neukölln': [52.4500, 13.4333],
-    'Britz': [52.4167, 13.4167],
-    'Buckow': [52.4167, 13.4333],
-    'Rudow': [52.4000, 13.4667],
-    'Gropiusstadt': [52.4000, 13.4333],
-    
-    # Treptow-Köpenick
-    'Treptow': [52.4833, 13.4667],
-    'Köpenick': [52.4333, 13.5667],
-    'Oberschöneweide': [52.4500, 13.5167],
-    'Niederschöneweide': [52.4333, 13.5000],
-    'Johannisthal': [52.4333, 13.5333],
-    'Adlershof': [52.4167, 13.5333],
-    'Altglienicke': [52.3833, 13.5333],
-    'Bohnsdorf': [52.3833, 13.5667],
-    'Grünau': [52.4000, 13.5833],
-    'Schmöckwitz': [52.3667, 13.6500],
-    'Friedrichshagen': [52.4333, 13.6167],
-    'Rahnsdorf': [52.4167, 13.6833],
-    'Hessenwinkel': [52.4167, 13.6167],
-    'Müggelheim': [52.3833, 13.6833],
-    'Wendenschloß': [52.4167, 13.6000],
-    'Plänterwald': [52.4833, 13.4833],
-    'Baumschulenweg': [52.4667, 13.5000],
-    'Karlshorst': [52.4833, 13.5333],
-    'Köllnische Heide': [52.4167, 13.5000],
-    
-    # Marzahn-Hellersdorf
-    'Marzahn': [52.5333, 13.5500],
-    'Hellersdorf': [52.5167, 13.5833],
-    'Biesdorf': [52.5000, 13.5500],
-    'Kaulsdorf': [52.5167, 13.5833],
-    'Mahlsdorf': [52.5000, 13.6167],
-    
-    # Lichtenberg
-    'Lichtenberg': [52.5167, 13.5000],
-    'Friedrichsfelde': [52.5000, 13.5167],
-    'Rummelsburg': [52.5000, 13.4667],
-    'Fennpfuhl': [52.5333, 13.4833],
-    'Hohenschönhausen': [52.5500, 13.5000],
-    'Falkenberg': [52.5833, 13.5333],
-    
-    # Reinickendorf
-    'Reinickendorf': [52.5833, 13.3333],
-    'Tegel': [52.5833, 13.2833],
-    'Heiligensee': [52.6167, 13.2500],
-    'Frohnau': [52.6333, 13.3000],
-    'Hermsdorf': [52.6167, 13.3167],
-    'Waidmannslust': [52.6000, 13.3167],
-    'Lübars': [52.6167, 13.3667],
-    'Wittenau': [52.5833, 13.3333],
-    'Märkisches Viertel': [52.6000, 13.3833],
-    'Borsigwalde': [52.5833, 13.3000],
-    'Konradshöhe': [52.5833, 13.2500],
-    'Tegelort': [52.6000, 13.2667],
-}
+
+import pandas as pd
+
+from berlin_housing.ortsteil_index import load_ortsteil_index
+
+WOHNLAGEN_PATH = 'data/raw/wohnlagen_enriched.csv'
+
+# Ortsteil centroids are derived from the LOR polygons (data/raw/lor_ortsteile.geojson)
+_ORTSTEIL_INDEX = None
+
+def get_ortsteil_index():
+    """Load the polygon-derived Ortsteil index (cached on disk, built once per process)."""
+    global _ORTSTEIL_INDEX
+    if _ORTSTEIL_INDEX is None:
+        _ORTSTEIL_INDEX = load_ortsteil_index()
+    return _ORTSTEIL_INDEX
 
 def get_ortsteil_coordinates(ortsteil):
-    """Get coordinates for an Ortsteil. Returns None if not found."""
-    # Try exact match first
-    if ortsteil in ORTSTEIL_COORDS:
-        return ORTSTEIL_COORDS[ortsteil]
-    
-    # Try case-insensitive match
-    for key, coords in ORTSTEIL_COORDS.items():
-        if key.lower() == ortsteil.lower():
-            return coords
-    
-    # Try partial match
-    for key, coords in ORTSTEIL_COORDS.items():
-        if ortsteil.lower() in key.lower() or key.lower() in ortsteil.lower():
-            return coords
-    
-    return None
+    """Get centroid coordinates [lat, lon] for an Ortsteil. Returns None if not found."""
+    return get_ortsteil_index().coordinates(ortsteil)
+
+
+def _iter_wohnlagen_chunks(path, chunksize=None):
+    """Yield chunks of wohnlagen rows with a valid 5-digit PLZ and Ortsteil, indexed by their global row position."""
+    usecols = ['plz', 'ortsteil_neu', 'bezirk_neu']
+    if chunksize is None:
+        chunks = [pd.read_csv(path, dtype={'plz': str}, usecols=usecols)]
+    else:
+        chunks = pd.read_csv(path, dtype={'plz': str}, usecols=usecols, chunksize=chunksize)
+
+    offset = 0
+    for chunk in chunks:
+        # Global row position keeps "first occurrence" semantics stable across chunks
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+
+        chunk = chunk.dropna(subset=['plz', 'ortsteil_neu'])
+        chunk = chunk[chunk['plz'].str.len() == 5]  # Only 5-digit PLZ
+        yield chunk
+
+
+def aggregate_plz_ortsteil(path=WOHNLAGEN_PATH, chunksize=None):
+    """
+    Aggregate the address register to one row per PLZ in a single pass.
+
+    Returns a DataFrame sorted by PLZ with the columns PLZ, Ortsteil (modal
+    Ortsteil, ties resolved by first occurrence), Bezirk (Bezirk of the first
+    address with that PLZ), Entries, Ortsteile_Count and Ortsteil_Counts
+    (per-PLZ dict in order of first occurrence).
 
-def create_enhanced_plz_mapping():
+    With ``chunksize`` set, the file is read in chunks and only the partial
+    (PLZ, Ortsteil) counts are kept in memory, so arbitrarily large address
+    files can be processed.
+    """
+    pair_parts = []
+    bezirk_parts = []
+    total_rows = 0
+
+    for chunk in _iter_wohnlagen_chunks(path, chunksize):
+        total_rows += len(chunk)
+        positions = chunk.index.to_series()
+
+        pairs = positions.groupby([chunk['plz'], chunk['ortsteil_neu']], sort=False).agg(['size', 'min'])
+        pair_parts.append(pairs)
+
+        # First row per PLZ (may carry a missing Bezirk, exactly like iloc[0])
+        firsts = chunk.drop_duplicates(subset='plz', keep='first')
+        bezirk_parts.append(firsts[['plz', 'bezirk_neu']].assign(pos=firsts.index))
+
+    if not pair_parts:
+        empty = pd.DataFrame(columns=['PLZ', 'Ortsteil', 'Bezirk', 'Entries', 'Ortsteile_Count', 'Ortsteil_Counts'])
+        return empty, 0
+
+    # Merge partial aggregates of all chunks
+    pairs = pd.concat(pair_parts)
+    pairs.index.names = ['plz', 'ortsteil']
+    pairs = pairs.groupby(level=['plz', 'ortsteil'], sort=False).agg({'size': 'sum', 'min': 'min'})
+    pairs = pairs.reset_index().rename(columns={'size': 'count', 'min': 'first_pos'})
+
+    # Order of first occurrence inside each PLZ (what Counter would have seen)
+    pairs = pairs.sort_values(['plz', 'first_pos'], kind='stable')
+
+    per_plz = pairs.groupby('plz', sort=True)
+    stats = pd.DataFrame({
+        'Entries': per_plz['count'].sum(),
+        'Ortsteile_Count': per_plz['count'].size(),
+    })
+
+    # Modal Ortsteil: highest count, ties broken by first occurrence
+    modal = pairs.sort_values(['plz', 'count', 'first_pos'], ascending=[True, False, True], kind='stable')
+    modal = modal.drop_duplicates(subset='plz', keep='first').set_index('plz')['ortsteil']
+
+    bezirk = pd.concat(bezirk_parts).sort_values('pos', kind='stable')
+    bezirk = bezirk.drop_duplicates(subset='plz', keep='first').set_index('plz')['bezirk_neu']
+
+    counts = {
+        plz: dict(zip(group['ortsteil'], group['count'].tolist()))
+        for plz, group in pairs[pairs['plz'].isin(stats.index[stats['Ortsteile_Count'] > 1])].groupby('plz', sort=True)
+    }
+
+    result = stats.assign(Ortsteil=modal, Bezirk=bezirk)
+    result['Ortsteil_Counts'] = pd.Series(counts, dtype=object)
+    result = result.rename_axis('PLZ').reset_index()
+    result = result[['PLZ', 'Ortsteil', 'Bezirk', 'Entries', 'Ortsteile_Count', 'Ortsteil_Counts']]
+
+    return result, total_rows
+
+
+def create_enhanced_plz_mapping(path=WOHNLAGEN_PATH, chunksize=None):
     """
     Create enhanced PLZ mapping from wohnlagen_enriched.csv.
     For PLZ that map to multiple Ortsteile, we take the most frequent one.
     """
     
-    print("Reading wohnlagen_enriched.csv...")
+    print("Reading wohnlagen_enriched.csv..." if chunksize is None
+          else f"Reading wohnlagen_enriched.csv in chunks of {chunksize:,} rows...")
     
-    # Read the wohnlagen data
     # Expected columns: id,schluessel,bezname,plz,strasse,hnr,wol,stadtteil,plr_name,bezirk_neu,ortsteil_neu
-    df = pd.read_csv('data/raw/wohnlagen_enriched.csv', dtype={'plz': str})
-    
-    print(f"Total rows: {len(df)}")
-    print(f"Columns: {df.columns.tolist()}")
+    plz_stats, valid_rows = aggregate_plz_ortsteil(path, chunksize)
     
-    # Filter out rows with missing PLZ or Ortsteil
-    df_clean = df.dropna(subset=['plz', 'ortsteil_neu'])
-    df_clean = df_clean[df_clean['plz'].str.len() == 5]  # Only 5-digit PLZ
-    
-    print(f"Rows with valid PLZ and Ortsteil: {len(df_clean)}")
-    
-    # Count PLZ-Ortsteil combinations
-    plz_ortsteil_counts = defaultdict(Counter)
-    
-    for _, row in df_clean.iterrows():
-        plz = row['plz']
-        ortsteil = row['ortsteil_neu']
-        bezirk = row['bezirk_neu']
-        
-        # Count this combination
-        plz_ortsteil_counts[plz][ortsteil] += 1
+    print(f"Rows with valid PLZ and Ortsteil: {valid_rows}")
     
     # Create the enhanced mapping
     enhanced_mapping = []
     missing_coords = []
     
-    for plz, ortsteil_counter in plz_ortsteil_counts.items():
-        # Get the most frequent Ortsteil for this PLZ
-        most_common_ortsteil = ortsteil_counter.most_common(1)[0][0]
-        total_entries = sum(ortsteil_counter.values())
-        
-        # Get the corresponding Bezirk
-        bezirk_row = df_clean[df_clean['plz'] == plz].iloc[0]
-        bezirk = bezirk_row['bezirk_neu']
+    for entry in plz_stats.to_dict('records'):
+        most_common_ortsteil = entry['Ortsteil']
         
         # Get coordinates for the Ortsteil
         coords = get_ortsteil_coordinates(most_common_ortsteil)
         lat, lon = coords if coords else [None, None]
         
         enhanced_mapping.append({
-            'PLZ': plz,
+            'PLZ': entry['PLZ'],
             'Ortsteil': most_common_ortsteil,
-            'Bezirk': bezirk,
+            'Bezirk': entry['Bezirk'],
             'Lat': lat,
             'Lon': lon,
-            'Entries': total_entries,
-            'Ortsteile_Count': len(ortsteil_counter)
+            'Entries': int(entry['Entries']),
+            'Ortsteile_Count': int(entry['Ortsteile_Count'])
         })
         
         # Track missing coordinates
@@ -214,13 +156,10 @@ def create_enhanced_plz_mapping():
             missing_coords.append(most_common_ortsteil)
         
         # Print info for PLZ with multiple Ortsteile
-        if len(ortsteil_counter) > 1:
-            print(f"PLZ {plz} has {len(ortsteil_counter)} Ortsteile: {dict(ortsteil_counter)}")
+        if entry['Ortsteile_Count'] > 1:
+            print(f"PLZ {entry['PLZ']} has {entry['Ortsteile_Count']} Ortsteile: {entry['Ortsteil_Counts']}")
             print(f"  → Using most frequent: {most_common_ortsteil}")
     
-    # Sort by PLZ
-    enhanced_mapping.sort(key=lambda x: x['PLZ'])
-    
     # Print summary of missing coordinates
     if missing_coords:
         print(f"\n⚠️  Missing coordinates for {len(set(missing_coords))} unique Ortsteile:")
@@ -245,13 +184,13 @@ def save_mappings(enhanced_mapping, simple_mapping):
     
     # Save detailed mapping with statistics
     with open('data/processed/berlin_plz_mapping_detailed.csv', 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=['PLZ', 'Ortsteil', 'Bezirk', 'Lat', 'Lon', 'Entries', 'Ortsteile_Count'])
+        writer = csv.DictWriter(f, fieldnames=['PLZ', 'Ortsteil', 'Bezirk', 'Lat', 'Lon', 'Entries', 'Ortsteile_Count'], lineterminator='\n')
         writer.writeheader()
         writer.writerows(enhanced_mapping)
     
     # Save simple mapping for use in analysis
     with open('data/processed/berlin_plz_mapping_enhanced.csv', 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=['PLZ', 'Ortsteil', 'Bezirk', 'Lat', 'Lon'])
+        writer = csv.DictWriter(f, fieldnames=['PLZ', 'Ortsteil', 'Bezirk', 'Lat', 'Lon'], lineterminator='\n')
         writer.writeheader()
         writer.writerows(simple_mapping)
     
@@ -289,10 +228,16 @@ def compare_with_old_mapping():
             print(f"PLZ {plz}: {old_bezirk} → {new_ortsteil} ({new_bezirk}) {coord_str}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the enhanced PLZ → Ortsteil mapping with coordinates.")
+    parser.add_argument('--input', default=WOHNLAGEN_PATH, help="Address register CSV (default: %(default)s)")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="Read the address register in chunks of N rows (bounded memory)")
+    args = parser.parse_args()
+    
     print("Creating enhanced PLZ mapping with coordinates...")
     print("=" * 60)
     
-    enhanced_mapping, simple_mapping = create_enhanced_plz_mapping()
+    enhanced_mapping, simple_mapping = create_enhanced_plz_mapping(args.input, args.chunksize)
     
     print(f"\nCreated enhanced mapping with {len(enhanced_mapping)} PLZ entries")
     print(f"Total unique Ortsteile: {len(set(entry['Ortsteil'] for entry in enhanced_mapping))}")
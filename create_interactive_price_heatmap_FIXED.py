@@ -7,51 +7,61 @@ Interactive Price Heatmap Berlin Generator - FIXED VERSION
 Generiert eine interaktive Folium-Karte mit Preis-Heatmap für Berlin.
 Basierend auf dem funktionierenden Debug-Test.
 
-Feature        # Erstelle Marker-Cluster für dieses Jahr
-        marker_cluster = MarkerCluster(
-            name=f'📍 Angebote {year} ({len(year_data_sample)} Stück)',
-            overlay=True,
-            control=True,
-            show=False  # Standardmäßig ausgeblendet, damit Choropleth sichtbar ist
-        )reis-Farbkodierung (4 Kategorien basierend auf Quantilen)
+Features:
+- Preis-Farbkodierung (4 Kategorien basierend auf Quantilen)
 - Jahresfilter mit separaten Layern
 - Choropleth-Layer mit Berlin Ortsteilen
 - Detaillierte Tooltips
 - Interaktive Layer-Kontrolle
+
+Schwere Module (pandas, numpy, folium, shapely) werden erst in den Funktionen
+importiert, die sie brauchen; ``--help`` und der Import des Skripts kommen
+ohne sie aus. Die Ortsteil-Geometrie wird als reines JSON gelesen, shapely
+ist nur für die Vereinfachung nötig.
 """
 
-import pandas as pd
-import folium
-from folium.plugins import MarkerCluster
-import numpy as np
-import random
+import argparse
+import importlib.util
+import json
 import os
 
-# Versuche geopandas zu importieren
-try:
-    import geopandas as gpd
-    GEOPANDAS_AVAILABLE = True
-except ImportError:
-    print("⚠️  GeoPandas nicht verfügbar. Choropleth-Features werden deaktiviert.")
-    GEOPANDAS_AVAILABLE = False
+from berlin_housing.map_fragments import FRAGMENT_DIR
 
-# Konfiguration
+# Konfiguration (Standardwerte, über die Kommandozeile änderbar - siehe --help)
 OUTPUT_FILE = 'interactive_price_heatmap_berlin_FIXED.html'
 DATA_PATH = 'data/processed/berlin_housing_combined_enriched_final.csv'
+DEDUP_PATH = 'data/processed/berlin_housing_combined_deduplicated.csv'   # mit cluster_id (Pipeline-Stufe deduplicated)
 GEOJSON_PATH = 'data/raw/lor_ortsteile.geojson'
 
-# Performance-Einstellungen (über Kommandozeile änderbar)
-import sys
-if len(sys.argv) > 1:
-    try:
-        SAMPLE_SIZE = int(sys.argv[1])
-        print(f"📊 Benutzerdefinierte Sample-Größe: {SAMPLE_SIZE}")
-    except ValueError:
-        SAMPLE_SIZE = None  # Alle Datenpunkte
-        print("📊 Verwende ALLE Datenpunkte (kein Sampling)")
-else:
-    SAMPLE_SIZE = None  # Standard: Alle Datenpunkte
-    print("📊 Standard: Verwende ALLE Datenpunkte")
+# Vereinfachungstoleranz der Ortsteil-Geometrie in Grad (0 = Originalgeometrie)
+GEOMETRY_TOLERANCE = 0.0001
+
+# Marker-Modus:
+#   'fast'    - ein kompaktes Daten-Array pro Jahr, Marker und Popups werden im Browser erzeugt
+#   'classic' - ein folium.CircleMarker mit eigenem HTML-Popup pro Angebot
+MARKER_MODE = 'fast'
+
+# Ausgabe-Modus:
+#   'single' - eine HTML-Datei mit allen Daten
+#   'split'  - HTML-Hülle plus eine JSON-Datei pro ausgeblendetem Layer (<name>_data/),
+#              die erst beim Einblenden geladen wird (benötigt einen lokalen Webserver)
+OUTPUT_MODE = 'single'
+
+# Sample-Größe pro Jahr für die Marker (None = alle Datenpunkte)
+SAMPLE_SIZE = None
+
+# Layer-Gruppen:
+#   'choropleth' - Gesamt-Choropleths (alle Jahre) und Ortsteil-Grenzen
+#   'yearly'     - Choropleths pro Jahr
+#   'markers'    - Angebote pro Jahr
+#   'density'    - Hexagon-Raster (Anzahl, Median-Miete, Median-€/m²) in mehreren Auflösungen
+LAYER_GROUPS = ('choropleth', 'yearly', 'markers', 'density')
+
+# Spalten, die für die Marker-Daten an die Worker-Prozesse übergeben werden
+MARKER_COLUMNS = ['lat', 'lon', 'price', 'size', 'price_per_sqm', 'district', 'plz', 'ortsteil', 'rooms']
+
+# Spalten, aus denen ein Jahres-Fragment (Würfel-Ausschnitt + Marker) entsteht; Grundlage des Fingerabdrucks
+FRAGMENT_COLUMNS = ['year', 'bezirk'] + MARKER_COLUMNS
 
 # Bezirk-Koordinaten für Simulation
 DISTRICT_COORDS = {
@@ -77,17 +87,30 @@ DISTRICT_COORDS = {
     'Steglitz': [52.455, 13.315],
 }
 
-def load_data():
-    """Lade und bereite Daten vor."""
+def load_data(years=None, dedup=False):
+    """Lade und bereite Daten vor (optional nur die Jahre ``years``, mit ``dedup`` ohne Dubletten)."""
+    import numpy as np
+
+    from berlin_housing.datasets import load_combined
+
     print("Lade Daten...")
     
-    if not os.path.exists(DATA_PATH):
-        print(f"❌ Datei nicht gefunden: {DATA_PATH}")
+    data_path = DEDUP_PATH if dedup else DATA_PATH
+    if not os.path.exists(data_path):
+        print(f"❌ Datei nicht gefunden: {data_path}")
         return None
     
-    df = pd.read_csv(DATA_PATH, dtype={'plz': 'string'})
+    # Parquet-Sidecar mit festem Schema; der Jahresfilter wird schon beim Lesen angewendet
+    filters = [('year', 'in', list(years))] if years else None
+    df = load_combined(filters=filters, csv_path=data_path)
     print(f"✅ Daten geladen: {len(df):,} Zeilen")
     
+    if dedup:
+        # Je Cluster nur die erste Anzeige; angehängte Batches haben keine cluster_id
+        duplicate = df['cluster_id'].notna() & df['cluster_id'].duplicated()
+        df = df[~duplicate]
+        print(f"✅ Dubletten entfernt: {int(duplicate.sum()):,} Zeilen")
+    
     # Berechne Preis pro m²
     df['price_per_sqm'] = df['price'] / df['size']
     df['price_per_sqm'] = df['price_per_sqm'].replace([np.inf, -np.inf], np.nan)
@@ -104,40 +127,92 @@ def load_data():
     
     return df
 
-def calculate_price_categories(df):
+PRICE_COLORS = ['green', 'lightgreen', 'orange', 'red']
+PRICE_CATEGORIES = ['Günstig', 'Günstig-Mittel', 'Mittel-Teuer', 'Teuer']
+
+def quantile_bin_codes(values, quantiles):
+    """
+    Ordne Werte vektorisiert den Quantil-Klassen 0-3 zu.
+
+    Klasse 0: ≤ q25, 1: ≤ q50, 2: ≤ q75, 3: darüber (fehlende Werte ebenfalls 3,
+    wie bei der bisherigen if-Kette).
+    """
+    import numpy as np
+
+    return np.searchsorted(quantiles, np.asarray(values, dtype='float64'), side='left')
+
+def calculate_price_categories(df, include_price_per_sqm=False):
     """Berechne Preiskategorien basierend auf Quantilen."""
+    import pandas as pd
+
     print("Berechne Preiskategorien...")
     
     price_quantiles = df['price'].quantile([0.25, 0.5, 0.75]).values
     print(f"  Preis-Quantile: 25%={price_quantiles[0]:.0f}€, 50%={price_quantiles[1]:.0f}€, 75%={price_quantiles[2]:.0f}€")
     
-    def get_price_color(price):
-        if price <= price_quantiles[0]:
-            return 'green'
-        elif price <= price_quantiles[1]:
-            return 'lightgreen'
-        elif price <= price_quantiles[2]:
-            return 'orange'
-        else:
-            return 'red'
-    
-    def get_price_category(price):
-        if price <= price_quantiles[0]:
-            return 'Günstig'
-        elif price <= price_quantiles[1]:
-            return 'Günstig-Mittel'
-        elif price <= price_quantiles[2]:
-            return 'Mittel-Teuer'
-        else:
-            return 'Teuer'
+    # Ein Durchlauf für Farbe und Kategorie (gemeinsame Klassen-Codes)
+    codes = quantile_bin_codes(df['price'], price_quantiles)
+    df['price_color'] = pd.Categorical.from_codes(codes, categories=PRICE_COLORS)
+    df['price_category'] = pd.Categorical.from_codes(codes, categories=PRICE_CATEGORIES)
     
-    df['price_color'] = df['price'].apply(get_price_color)
-    df['price_category'] = df['price'].apply(get_price_category)
+    if include_price_per_sqm and 'price_per_sqm' in df.columns:
+        sqm_quantiles = df['price_per_sqm'].quantile([0.25, 0.5, 0.75]).values
+        print(f"  €/m²-Quantile: 25%={sqm_quantiles[0]:.1f}€, 50%={sqm_quantiles[1]:.1f}€, 75%={sqm_quantiles[2]:.1f}€")
+        sqm_codes = quantile_bin_codes(df['price_per_sqm'], sqm_quantiles)
+        df['price_per_sqm_color'] = pd.Categorical.from_codes(sqm_codes, categories=PRICE_COLORS)
+        df['price_per_sqm_category'] = pd.Categorical.from_codes(sqm_codes, categories=PRICE_CATEGORIES)
     
     return df, price_quantiles
 
+def fill_missing_coordinates(df, seed=42, jitter=0.02):
+    """
+    Fülle fehlende lat/lon für den gesamten DataFrame auf einmal.
+
+    Basis ist der Bezirks-Schwerpunkt aus DISTRICT_COORDS (sonst Berlin-Mitte),
+    dazu eine Streuung von ±``jitter`` Grad aus einem NumPy-Generator mit Seed
+    (``seed``, Jahr), damit die Koordinaten eines Jahres nicht von den anderen
+    Jahren abhängen. Die Spalte ``coords_simulated`` markiert die aufgefüllten Zeilen.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if 'lat' not in df.columns:
+        df['lat'] = np.nan
+    if 'lon' not in df.columns:
+        df['lon'] = np.nan
+    
+    missing = (df['lat'].isna() | df['lon'].isna()).to_numpy()
+    df['coords_simulated'] = missing
+    n_missing = int(missing.sum())
+    if n_missing == 0:
+        return df
+    
+    # Bezirk → Index in ein Koordinaten-Array (letzte Zeile = Fallback)
+    district_names = list(DISTRICT_COORDS)
+    base = np.array(list(DISTRICT_COORDS.values()) + [[52.52, 13.405]])
+    district_idx = pd.Index(district_names).get_indexer(df.loc[missing, 'district'])
+    district_idx = np.where(district_idx < 0, len(district_names), district_idx)
+    
+    years = df.loc[missing, 'year'].to_numpy('int64') if 'year' in df.columns else np.zeros(n_missing, 'int64')
+    noise = np.empty((n_missing, 2))
+    for year in np.unique(years):
+        rows = years == year
+        rng = np.random.default_rng([seed, int(year)])
+        noise[rows] = rng.uniform(-jitter, jitter, size=(int(rows.sum()), 2))
+    coords = base[district_idx] + noise
+    
+    df.loc[missing, 'lat'] = coords[:, 0].astype(df['lat'].dtype)
+    df.loc[missing, 'lon'] = coords[:, 1].astype(df['lon'].dtype)
+    print(f"  Koordinaten simuliert für {n_missing:,} von {len(df):,} Angeboten")
+    
+    return df
+
 def get_coordinates(row):
     """Verwende echte Koordinaten oder fallback zu simulierten."""
+    import random
+
+    import pandas as pd
+
     if 'lat' in row and 'lon' in row and pd.notna(row['lat']) and pd.notna(row['lon']):
         return row['lat'], row['lon']
     
@@ -163,6 +238,8 @@ def get_marker_size(size):
 
 def create_tooltip(row):
     """Erstelle detaillierte Tooltip-Informationen."""
+    import pandas as pd
+
     tooltip_text = f"""
     <b>{row['price']:.0f}€</b> | {row['size']:.0f}m² | {row['price_per_sqm']:.1f}€/m²<br>
     <b>Kategorie:</b> {row['price_category']}<br>
@@ -182,46 +259,286 @@ def create_tooltip(row):
     
     return tooltip_text
 
-def create_choropleth_layers(m, df):
-    """Erstelle Choropleth-Layer."""
-    if not GEOPANDAS_AVAILABLE:
-        print("   Überspringe Choropleth - GeoPandas nicht verfügbar")
-        return m
+# JavaScript-Callback für CompactMarkerCluster: baut CircleMarker aus einer kompakten
+# Datenzeile, Tooltip und Popup werden erst beim Öffnen erzeugt. Die Preiskategorie
+# entsteht im Browser aus den Quantilen aller Jahre, damit die Zeilen eines Jahres
+# (und ihr Cache-Fragment) nicht von den anderen Jahren abhängen.
+# Zeile: [lat, lon, preis, größe, preis_m2, bezirk, plz, ortsteil, zimmer]
+FAST_MARKER_CALLBACK = """
+(function () {
+    var lookup = %(lookup)s;
+    var year = %(year)s;
+
+    function radius(size) {
+        return size <= 40 ? 5 : (size <= 80 ? 7 : 10);
+    }
+
+    function category(price) {
+        var k = 0;
+        while (k < lookup.quantiles.length && price > lookup.quantiles[k]) { k++; }
+        return k;
+    }
+
+    function popup(row) {
+        var html = '<b>' + row[2].toFixed(0) + '€</b> | ' + row[3].toFixed(0) + 'm² | '
+                 + row[4].toFixed(1) + '€/m²<br>'
+                 + '<b>Kategorie:</b> ' + lookup.categories[category(row[2])] + '<br>'
+                 + '<b>Bezirk:</b> ' + lookup.districts[row[5]] + '<br>';
+        if (row[6] !== null) { html += '<b>PLZ:</b> ' + row[6] + '<br>'; }
+        if (row[7] !== null) { html += '<b>Ortsteil:</b> ' + lookup.ortsteile[row[7]] + '<br>'; }
+        html += '<b>Jahr:</b> ' + year + '<br>';
+        if (row[8] !== null) { html += '<b>Zimmer:</b> ' + row[8] + '<br>'; }
+        return html;
+    }
+
+    return function (row) {
+        var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+            radius: radius(row[3]),
+            color: 'white',
+            weight: 1,
+            fillColor: lookup.colors[category(row[2])],
+            fillOpacity: 0.7
+        });
+        marker.bindTooltip(function () {
+            return row[2].toFixed(0) + '€ | ' + lookup.districts[row[5]];
+        });
+        marker.bindPopup(function () { return popup(row); });
+        return marker;
+    };
+})()
+"""
+
+def build_marker_payload(df):
+    """Erstelle kompakte Marker-Zeilen und Lookup-Tabellen (Bezirke, Ortsteile) für den Fast-Modus."""
+    import pandas as pd
+
+    # lat/lon sind nach fill_missing_coordinates() vollständig
+    coords = df[['lat', 'lon']].astype('float64')
+
+    districts = pd.Categorical(df['district'].astype(str))
+    ortsteile = pd.Categorical(df['ortsteil']) if 'ortsteil' in df.columns else None
+
+    def nullable(values):
+        return [None if pd.isna(v) else v for v in values]
+
+    columns = [
+        coords['lat'].round(5).tolist(),
+        coords['lon'].round(5).tolist(),
+        df['price'].astype('float64').round(2).tolist(),
+        df['size'].astype('float64').round(2).tolist(),
+        df['price_per_sqm'].astype('float64').round(2).fillna(0).tolist(),
+        districts.codes.tolist(),
+        nullable(df['plz']) if 'plz' in df.columns else [None] * len(df),
+        [None if c < 0 else c for c in ortsteile.codes.tolist()] if ortsteile is not None else [None] * len(df),
+        nullable(df['rooms'].astype('float64')) if 'rooms' in df.columns else [None] * len(df),
+    ]
+    rows = [list(row) for row in zip(*columns)]
+
+    lookup = {
+        'districts': list(districts.categories),
+        'ortsteile': list(ortsteile.categories) if ortsteile is not None else [],
+    }
+    return rows, lookup
+
+def sample_year_data(year_data, sample_size):
+    """Ziehe ein reproduzierbares Sample (falls sample_size gesetzt)."""
+    if sample_size is not None and len(year_data) > sample_size:
+        return year_data.sample(n=sample_size, random_state=42)
+    return year_data
+
+def build_marker_fragment(year, year_data, sample_size):
+    """
+    Baue das Marker-Fragment eines Jahres (läuft ggf. in einem Worker-Prozess).
+
+    Gibt nur picklebare Daten zurück (die Marker-Zeilen bereits als JSON);
+    die folium-Elemente entstehen im Hauptprozess.
+    """
+    from berlin_housing.map_layers import script_json
+
+    year_data_sample = sample_year_data(year_data, sample_size)
+    rows, lookup = build_marker_payload(year_data_sample)
+    return {
+        'year': year,
+        'total': len(year_data),
+        'sampled': len(year_data_sample),
+        'data': script_json(rows),
+        'lookup': lookup,
+    }
+
+def build_marker_fragments(df, sample_size, workers=1):
+    """Baue die Marker-Fragmente aller Jahre, bei workers > 1 in einem Prozess-Pool."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    columns = [c for c in MARKER_COLUMNS if c in df.columns]
+    jobs = [(year, year_data[columns]) for year, year_data in df.groupby('year', sort=True)]
+    
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = [pool.submit(build_marker_fragment, year, year_data, sample_size)
+                       for year, year_data in jobs]
+            return [future.result() for future in futures]
+    
+    return [build_marker_fragment(year, year_data, sample_size) for year, year_data in jobs]
+
+def build_year_fragment(year, year_data, key, sample_size, markers):
+    """
+    Baue das Fragment eines Jahres: Ausschnitt des Preiswürfels und (mit
+    ``markers``) das Marker-Fragment. Läuft ggf. in einem Worker-Prozess.
+    """
+    from berlin_housing.price_cube import build_price_cube
+
+    return {
+        'year': int(year),
+        'fingerprint': key,
+        'cube': build_price_cube(year_data),
+        'markers': build_marker_fragment(year, year_data, sample_size) if markers else None,
+    }
+
+def build_year_fragments(df, sample_size, markers=True, workers=1, fragment_dir=FRAGMENT_DIR):
+    """
+    Fragmente aller Jahre; nur Jahre mit geändertem Fingerabdruck werden neu gebaut.
+
+    Der Fingerabdruck umfasst die Zeilen des Jahres (``FRAGMENT_COLUMNS``),
+    Sample-Größe, Marker-Modus und den Code der Fragment-Funktionen.
+    ``fragment_dir=None`` schaltet den Cache ab.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from berlin_housing.map_fragments import code_version, fingerprint, load_fragment, save_fragment
+    from berlin_housing.price_cube import build_price_cube
+
+    columns = [c for c in FRAGMENT_COLUMNS if c in df.columns]
+    params = {
+        'sample_size': sample_size,
+        'markers': markers,
+        'code': code_version(build_year_fragment, build_marker_fragment, build_marker_payload,
+                             sample_year_data, build_price_cube),
+    }
+    
+    fragments, jobs = {}, []
+    for year, year_data in df.groupby('year', sort=True):
+        year_data = year_data[columns]
+        key = fingerprint(year_data, params)
+        cached = load_fragment(year, key, fragment_dir) if fragment_dir else None
+        if cached is not None:
+            fragments[int(year)] = cached
+        else:
+            jobs.append((year, year_data, key))
     
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = [pool.submit(build_year_fragment, year, year_data, key, sample_size, markers)
+                       for year, year_data, key in jobs]
+            built = [future.result() for future in futures]
+    else:
+        built = [build_year_fragment(year, year_data, key, sample_size, markers) for year, year_data, key in jobs]
+    
+    for fragment in built:
+        fragments[fragment['year']] = fragment
+        if fragment_dir:
+            save_fragment(fragment, fragment_dir)
+    
+    print(f"  Jahres-Fragmente: {len(fragments) - len(built)} aus dem Cache, {len(built)} neu gebaut"
+          + (f" ({', '.join(str(f['year']) for f in built)})" if built else ""))
+    return [fragments[year] for year in sorted(fragments)]
+
+def cube_from_fragments(fragments):
+    """Setze den Preiswürfel aus den Würfel-Ausschnitten der Jahres-Fragmente zusammen."""
+    import pandas as pd
+
+    return pd.concat([fragment['cube'] for fragment in fragments], ignore_index=True)
+
+def create_fast_marker_layer(fragment, name, show, price_quantiles):
+    """Erstelle einen Marker-Cluster mit einem einzigen Daten-Array für ein Jahr."""
+    from berlin_housing.map_layers import CompactMarkerCluster
+
+    lookup = dict(fragment['lookup'], colors=PRICE_COLORS, categories=PRICE_CATEGORIES,
+                  quantiles=[float(q) for q in price_quantiles])
+    callback = FAST_MARKER_CALLBACK % {
+        'lookup': json.dumps(lookup, ensure_ascii=False),
+        'year': json.dumps(int(fragment['year'])),
+    }
+    return CompactMarkerCluster(
+        None,
+        data_json=fragment['data'],
+        callback=callback,
+        data_key=f"markers_{fragment['year']}",
+        name=name,
+        overlay=True,
+        control=True,
+        show=show
+    )
+
+def add_classic_markers(marker_cluster, year_data_sample):
+    """Füge einen folium.CircleMarker pro Angebot hinzu (klassischer Modus)."""
+    import folium
+
+    for idx, row in year_data_sample.iterrows():
+        lat, lon = get_coordinates(row)
+        radius = get_marker_size(row['size'])
+        tooltip_text = create_tooltip(row)
+        
+        folium.CircleMarker(
+            location=[lat, lon],
+            radius=radius,
+            color='white',
+            weight=1,
+            fillColor=row['price_color'],
+            fillOpacity=0.7,
+            popup=tooltip_text,
+            tooltip=f"{row['price']:.0f}€ | {row['district']}"
+        ).add_to(marker_cluster)
+
+def add_shared_geometry(m):
+    """Lade die Ortsteil-Geometrie einmal und hänge sie an die Karte an."""
+    from berlin_housing.map_layers import SharedGeometry, load_ortsteil_geometry
+
     if not os.path.exists(GEOJSON_PATH):
         print(f"   Überspringe Choropleth - GeoJSON nicht gefunden: {GEOJSON_PATH}")
+        return None
+    
+    # Vereinfachung nur mit shapely, sonst Originalgeometrie (reines JSON)
+    tolerance = GEOMETRY_TOLERANCE if importlib.util.find_spec('shapely') else 0
+    if GEOMETRY_TOLERANCE and not tolerance:
+        print("   ⚠️  Shapely nicht verfügbar - Ortsteil-Geometrie wird nicht vereinfacht")
+    
+    geometry = SharedGeometry(load_ortsteil_geometry(GEOJSON_PATH, tolerance=tolerance))
+    geometry.add_to(m)
+    print(f"  Gemeinsame Ortsteil-Geometrie: {len(geometry.aliases)} Ortsteile (Toleranz {tolerance}°)")
+    return geometry
+
+def aggregate_ortsteil_stats(cube, aliases, year=None):
+    """Lese Preis-Kennzahlen pro Ortsteil aus dem Würfel, in der Reihenfolge der Geometrie."""
+    from berlin_housing.price_cube import ortsteil_slice
+
+    ortsteil_stats = ortsteil_slice(cube, year)[['price_mean', 'price_count', 'price_per_sqm_mean']].round(2)
+    return ortsteil_stats.reindex(aliases).fillna(0)
+
+def create_choropleth_layers(m, cube, geometry):
+    """Erstelle Choropleth-Layer."""
+    from berlin_housing.map_layers import SharedChoropleth, attach_properties
+
+    if geometry is None:
         return m
     
     try:
         print("  Erstelle Choropleth-Layer...")
         
-        # Lade GeoJSON
-        gdf = gpd.read_file(GEOJSON_PATH)
-        
-        # Aggregiere Ortsteil-Daten (alle Jahre zusammen)
-        if 'ortsteil' in df.columns:
-            ortsteil_stats = df.groupby('ortsteil').agg({
-                'price': ['mean', 'count'],
-                'price_per_sqm': ['mean']
-            }).round(2)
-            ortsteil_stats.columns = ['price_mean', 'price_count', 'price_per_sqm_mean']
-            ortsteil_stats = ortsteil_stats.reset_index()
+        # Ortsteil-Daten aus dem Würfel (alle Jahre zusammen)
+        if 'ortsteil' in cube.columns:
+            ortsteil_stats = aggregate_ortsteil_stats(cube, geometry.aliases)
             
-            # Merge mit GeoJSON
-            gdf_merged = gdf.merge(ortsteil_stats, left_on='spatial_alias', right_on='ortsteil', how='left')
-            gdf_merged['price_mean'] = gdf_merged['price_mean'].fillna(0)
-            gdf_merged['price_count'] = gdf_merged['price_count'].fillna(0)
-            gdf_merged['price_per_sqm_mean'] = gdf_merged['price_per_sqm_mean'].fillna(0)
+            print(f"    Choropleth-Daten: {(ortsteil_stats['price_mean'] > 0).sum()} von {len(ortsteil_stats)} Ortsteilen mit Daten")
             
-            print(f"    Choropleth-Daten: {(gdf_merged['price_mean'] > 0).sum()} von {len(gdf_merged)} Ortsteilen mit Daten")
+            # Kennzahlen aller Jahre direkt in den Feature-Eigenschaften (Tooltips der Ortsteil-Grenzen)
+            attach_properties(geometry.data, {column: ortsteil_stats[column].tolist() for column in ortsteil_stats})
             
             # Erstelle Choropleth für Durchschnittspreis
-            choropleth_price = folium.Choropleth(
-                geo_data=gdf_merged,
+            SharedChoropleth(
+                geometry,
+                values=ortsteil_stats['price_mean'].tolist(),
                 name='💰 Durchschnittspreis pro Ortsteil',
-                data=gdf_merged,
-                columns=['spatial_alias', 'price_mean'],
-                key_on='feature.properties.spatial_alias',
+                data_key='choropleth_price',
                 fill_color='YlOrRd',
                 fill_opacity=0.7,
                 line_opacity=0.2,
@@ -229,16 +546,14 @@ def create_choropleth_layers(m, df):
                 overlay=True,
                 control=True,
                 show=True  # Zeige als Standard
-            )
-            choropleth_price.add_to(m)
+            ).add_to(m)
             
             # Erstelle Choropleth für Anzahl Angebote
-            choropleth_count = folium.Choropleth(
-                geo_data=gdf_merged,
+            SharedChoropleth(
+                geometry,
+                values=ortsteil_stats['price_count'].tolist(),
                 name='📊 Anzahl Angebote pro Ortsteil',
-                data=gdf_merged,
-                columns=['spatial_alias', 'price_count'],
-                key_on='feature.properties.spatial_alias',
+                data_key='choropleth_count',
                 fill_color='BuPu',
                 fill_opacity=0.7,
                 line_opacity=0.2,
@@ -246,16 +561,14 @@ def create_choropleth_layers(m, df):
                 overlay=True,
                 control=True,
                 show=False
-            )
-            choropleth_count.add_to(m)
+            ).add_to(m)
             
             # Erstelle Choropleth für Preis pro m²
-            choropleth_sqm = folium.Choropleth(
-                geo_data=gdf_merged,
+            SharedChoropleth(
+                geometry,
+                values=ortsteil_stats['price_per_sqm_mean'].tolist(),
                 name='📈 Preis pro m² pro Ortsteil',
-                data=gdf_merged,
-                columns=['spatial_alias', 'price_per_sqm_mean'],
-                key_on='feature.properties.spatial_alias',
+                data_key='choropleth_sqm',
                 fill_color='Greens',
                 fill_opacity=0.7,
                 line_opacity=0.2,
@@ -263,29 +576,29 @@ def create_choropleth_layers(m, df):
                 overlay=True,
                 control=True,
                 show=False
-            )
-            choropleth_sqm.add_to(m)
+            ).add_to(m)
             
             # Füge Ortsteil-Grenzen hinzu
-            grenzen_layer = folium.GeoJson(
-                gdf_merged,
+            SharedChoropleth(
+                geometry,
                 name='🗺️ Ortsteil-Grenzen',
-                style_function=lambda x: {
+                data_key='boundaries',
+                style={
                     'fillColor': 'transparent',
                     'color': 'blue',
                     'weight': 2,
                     'fillOpacity': 0
                 },
-                tooltip=folium.GeoJsonTooltip(
-                    fields=['spatial_alias', 'BEZIRK', 'price_mean', 'price_count'],
-                    aliases=['Ortsteil:', 'Bezirk:', 'Ø Preis (€):', 'Anzahl Angebote:'],
-                    style=("background-color: white; color: #333333; font-family: arial; font-size: 12px; padding: 10px;")
-                ),
+                tooltip=[
+                    ('Ortsteil:', 'spatial_alias'),
+                    ('Bezirk:', 'BEZIRK'),
+                    ('Ø Preis (€):', 'price_mean'),
+                    ('Anzahl Angebote:', 'price_count'),
+                ],
                 overlay=True,
                 control=True,
                 show=False  # Ausgeblendet wenn Choropleth aktiv ist
-            )
-            grenzen_layer.add_to(m)
+            ).add_to(m)
             
             print("    ✅ Choropleth-Layer hinzugefügt")
         
@@ -294,44 +607,31 @@ def create_choropleth_layers(m, df):
     
     return m
 
-def create_yearly_choropleth_layers(m, df):
+def create_yearly_choropleth_layers(m, cube, geometry):
     """Erstelle jahresbasierte Choropleth-Layer für echte Dynamik."""
-    if not GEOPANDAS_AVAILABLE or not os.path.exists(GEOJSON_PATH):
+    from berlin_housing.map_layers import SharedChoropleth
+
+    if geometry is None:
         return m
     
     try:
         print("  Erstelle jahresbasierte Choropleth-Layer...")
         
-        # Lade GeoJSON
-        gdf = gpd.read_file(GEOJSON_PATH)
-        years = sorted(df['year'].unique())
+        years = sorted(cube['year'].unique())
         
         for year in years:
-            year_df = df[df['year'] == year]
-            
-            if 'ortsteil' in year_df.columns and len(year_df) > 0:
-                # Aggregiere für dieses Jahr
-                ortsteil_stats_year = year_df.groupby('ortsteil').agg({
-                    'price': ['mean', 'count'],
-                    'price_per_sqm': ['mean']
-                }).round(2)
-                ortsteil_stats_year.columns = ['price_mean', 'price_count', 'price_per_sqm_mean']
-                ortsteil_stats_year = ortsteil_stats_year.reset_index()
+            if 'ortsteil' in cube.columns:
+                # Ausschnitt des Würfels für dieses Jahr
+                ortsteil_stats_year = aggregate_ortsteil_stats(cube, geometry.aliases, year)
                 
-                # Merge mit GeoJSON
-                gdf_year = gdf.merge(ortsteil_stats_year, left_on='spatial_alias', right_on='ortsteil', how='left')
-                gdf_year['price_mean'] = gdf_year['price_mean'].fillna(0)
-                gdf_year['price_count'] = gdf_year['price_count'].fillna(0)
-                
-                print(f"    Jahr {year}: {(gdf_year['price_mean'] > 0).sum()} Ortsteile mit Daten")
+                print(f"    Jahr {year}: {(ortsteil_stats_year['price_mean'] > 0).sum()} Ortsteile mit Daten")
                 
                 # Erstelle Choropleth für dieses Jahr
-                choropleth_year = folium.Choropleth(
-                    geo_data=gdf_year,
+                SharedChoropleth(
+                    geometry,
+                    values=ortsteil_stats_year['price_mean'].tolist(),
                     name=f'📅 Preisentwicklung {year}',
-                    data=gdf_year,
-                    columns=['spatial_alias', 'price_mean'],
-                    key_on='feature.properties.spatial_alias',
+                    data_key=f'choropleth_price_{year}',
                     fill_color='YlOrRd',
                     fill_opacity=0.7,
                     line_opacity=0.2,
@@ -339,16 +639,14 @@ def create_yearly_choropleth_layers(m, df):
                     overlay=True,
                     control=True,
                     show=False  # Standardmäßig ausgeblendet
-                )
-                choropleth_year.add_to(m)
+                ).add_to(m)
                 
                 # Erstelle Anzahl-Choropleth für dieses Jahr
-                choropleth_count_year = folium.Choropleth(
-                    geo_data=gdf_year,
+                SharedChoropleth(
+                    geometry,
+                    values=ortsteil_stats_year['price_count'].tolist(),
                     name=f'📊 Angebote {year}',
-                    data=gdf_year,
-                    columns=['spatial_alias', 'price_count'],
-                    key_on='feature.properties.spatial_alias',
+                    data_key=f'choropleth_count_{year}',
                     fill_color='BuPu',
                     fill_opacity=0.7,
                     line_opacity=0.2,
@@ -356,8 +654,7 @@ def create_yearly_choropleth_layers(m, df):
                     overlay=True,
                     control=True,
                     show=False
-                )
-                choropleth_count_year.add_to(m)
+                ).add_to(m)
         
         print("    ✅ Jahresbasierte Choropleth-Layer hinzugefügt")
         
@@ -366,33 +663,40 @@ def create_yearly_choropleth_layers(m, df):
     
     return m
 
-def create_interactive_map(df, price_quantiles):
-    """Erstelle die interaktive Folium-Karte."""
-    print("Erstelle interaktive Karte...")
-    
-    # Erstelle Basis-Karte
-    m = folium.Map(location=[52.52, 13.405], zoom_start=11)
-    
-    # Füge Choropleth-Layer hinzu
-    m = create_choropleth_layers(m, df)
-    
-    # Füge jahresbasierte Choropleth-Layer hinzu
-    m = create_yearly_choropleth_layers(m, df)
-    
-    # Erstelle Layer für jedes Jahr
-    years = sorted(df['year'].unique())
+def create_marker_layers(m, df, years, price_quantiles, sample_size=None, workers=1, fragments=None):
+    """Erstelle die Marker-Layer für jedes Jahr (im Fast-Modus ggf. aus vorhandenen Marker-Fragmenten)."""
+    from folium.plugins import MarkerCluster
+
     print(f"  Erstelle Marker-Layer für Jahre: {years}")
     
-    for year in years:
-        year_data = df[df['year'] == year]
+    if MARKER_MODE == 'fast':
+        # Fragmente pro Jahr unabhängig (ggf. parallel) bauen, dann in Jahresreihenfolge einhängen
+        if fragments is None:
+            fragments = build_marker_fragments(df, sample_size, workers)
+        for fragment in fragments:
+            year = fragment['year']
+            print(f"    Jahr {year}: {fragment['total']} Angebote")
+            if fragment['sampled'] < fragment['total']:
+                print(f"      Sample erstellt: {fragment['sampled']} von {fragment['total']} Punkten")
+            else:
+                print(f"      Alle Punkte verwendet: {fragment['sampled']}")
+            
+            layer_name = f"📍 Angebote {year} ({fragment['total']} Stück)"
+            show = True if year == years[-1] else False
+            
+            # Ein Daten-Array pro Jahr, Marker werden im Browser erzeugt
+            create_fast_marker_layer(fragment, layer_name, show, price_quantiles).add_to(m)
+        return m
+    
+    # Ein groupby statt einer Maske pro Jahr
+    for year, year_data in df.groupby('year', sort=True):
         print(f"    Jahr {year}: {len(year_data)} Angebote")
         
-        # Erstelle Sample für Performance (falls SAMPLE_SIZE gesetzt)
-        if SAMPLE_SIZE is not None and len(year_data) > SAMPLE_SIZE:
-            year_data_sample = year_data.sample(n=SAMPLE_SIZE, random_state=42)
+        # Erstelle Sample für Performance (falls sample_size gesetzt)
+        year_data_sample = sample_year_data(year_data, sample_size)
+        if len(year_data_sample) < len(year_data):
             print(f"      Sample erstellt: {len(year_data_sample)} von {len(year_data)} Punkten")
         else:
-            year_data_sample = year_data
             print(f"      Alle Punkte verwendet: {len(year_data_sample)}")
         
         # Erstelle Marker-Cluster für dieses Jahr
@@ -402,32 +706,86 @@ def create_interactive_map(df, price_quantiles):
             control=True,
             show=True if year == years[-1] else False
         )
-        
-        # Füge Marker hinzu
-        for idx, row in year_data_sample.iterrows():
-            lat, lon = get_coordinates(row)
-            radius = get_marker_size(row['size'])
-            tooltip_text = create_tooltip(row)
-            
-            folium.CircleMarker(
-                location=[lat, lon],
-                radius=radius,
-                color='white',
-                weight=1,
-                fillColor=row['price_color'],
-                fillOpacity=0.7,
-                popup=tooltip_text,
-                tooltip=f"{row['price']:.0f}€ | {row['district']}"
-            ).add_to(marker_cluster)
-        
+        add_classic_markers(marker_cluster, year_data_sample)
         marker_cluster.add_to(m)
     
     return m
 
-def create_legend(price_quantiles, df):
+def create_density_layers(m, df, resolutions=None):
+    """
+    Erstelle einen Hexagon-Dichte-Layer pro Auflösung (alle gewählten Jahre zusammen).
+
+    Angebote mit simulierten Koordinaten (``coords_simulated``) bleiben außen vor,
+    ihre Position ist nur der gestreute Bezirks-Schwerpunkt. ``resolutions``:
+    Zellradius → Zoomstufen (Standard: ``density_grid.RESOLUTIONS``).
+    """
+    from berlin_housing.density_grid import RESOLUTIONS, density_grid
+    from berlin_housing.map_layers import HexDensityLayer
+    
+    resolutions = RESOLUTIONS if resolutions is None else resolutions
+
+    located = df[~df['coords_simulated']] if 'coords_simulated' in df.columns else df
+    print(f"  Erstelle Dichte-Layer aus {len(located):,} Angeboten mit Koordinaten...")
+    
+    for size, (min_zoom, max_zoom) in sorted(resolutions.items(), reverse=True):
+        cells = density_grid(located, size)
+        label = f'{size / 1000:g} km' if size >= 1000 else f'{size} m'
+        print(f"    Radius {label}: {len(cells):,} Zellen (Zoom {min_zoom}-{max_zoom})")
+        HexDensityLayer(
+            cells,
+            size,
+            min_zoom=min_zoom,
+            max_zoom=max_zoom,
+            name=f'⬡ Dichte {label} (Zoom {min_zoom}-{max_zoom})',
+            data_key=f'density_{size}',
+            overlay=True,
+            control=True,
+            show=False
+        ).add_to(m)
+    
+    return m
+
+def create_interactive_map(df, price_quantiles, cube, layers=LAYER_GROUPS, sample_size=None, workers=1,
+                           fragments=None):
+    """Erstelle die interaktive Folium-Karte (``fragments``: Jahres-Fragmente aus ``build_year_fragments``)."""
+    import folium
+
+    print("Erstelle interaktive Karte...")
+    
+    # Erstelle Basis-Karte
+    m = folium.Map(location=[52.52, 13.405], zoom_start=11)
+    
+    # Lade die Ortsteil-Geometrie einmal für alle Choropleth-Layer
+    geometry = None
+    if 'choropleth' in layers or 'yearly' in layers:
+        geometry = add_shared_geometry(m)
+    
+    # Füge Choropleth-Layer hinzu
+    if 'choropleth' in layers:
+        m = create_choropleth_layers(m, cube, geometry)
+    
+    # Füge jahresbasierte Choropleth-Layer hinzu
+    if 'yearly' in layers:
+        m = create_yearly_choropleth_layers(m, cube, geometry)
+    
+    # Hexagon-Dichte in mehreren Auflösungen (nur Zellen, keine einzelnen Angebote)
+    if 'density' in layers:
+        m = create_density_layers(m, df)
+    
+    # Erstelle Layer für jedes Jahr
+    if 'markers' in layers:
+        years = [int(year) for year in sorted(cube['year'].unique())]
+        marker_fragments = None
+        if fragments is not None and all(f['markers'] is not None for f in fragments):
+            marker_fragments = [f['markers'] for f in fragments]
+        m = create_marker_layers(m, df, years, price_quantiles, sample_size, workers, marker_fragments)
+    
+    return m
+
+def create_legend(price_quantiles, cube, sample_size=None):
     """Erstelle HTML-Legende."""
-    years = sorted(df['year'].unique())
-    total_offers = len(df)
+    years = sorted(cube['year'].unique())
+    total_offers = int(cube['price_count'].sum())
     
     legend_html = f'''
     <div style="position: fixed; 
@@ -462,8 +820,9 @@ def create_legend(price_quantiles, df):
         • <strong>Gesamt-Choropleth:</strong> Alle Jahre kombiniert<br>
         • <strong>Jahres-Choropleth:</strong> Dynamische Daten pro Jahr<br>
         • <strong>Marker:</strong> Einzelne Angebote (mit Sampling wenn &gt;1000)<br>
+        • <strong>Dichte:</strong> Hexagone mit Anzahl und Medianen, feiner beim Hineinzoomen<br>
         <div style="margin-top: 5px; font-size: 10px; color: #999;">
-            Sample-Größe: {SAMPLE_SIZE if SAMPLE_SIZE else 'Alle Datenpunkte'}
+            Sample-Größe: {sample_size if sample_size else 'Alle Datenpunkte'}
         </div>
     </div>
     </div>
@@ -471,27 +830,107 @@ def create_legend(price_quantiles, df):
     
     return legend_html
 
-def main():
+def parse_sample_size(value):
+    """Sample-Größe aus der Kommandozeile ('all' oder keine Zahl = alle Datenpunkte)."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_args(argv=None):
+    """Lese die Kommandozeilen-Argumente."""
+    parser = argparse.ArgumentParser(
+        description="Generiert eine interaktive Folium-Preisheatmap für Berlin."
+    )
+    parser.add_argument('legacy_sample', nargs='?', help=argparse.SUPPRESS)  # alter Aufruf: script.py 500
+    parser.add_argument('--years', type=int, nargs='+', default=None,
+                        help="Nur diese Jahre darstellen (Standard: alle)")
+    parser.add_argument('--sample', default=None,
+                        help="Marker-Sample pro Jahr, 'all' für alle Datenpunkte (Standard: all)")
+    parser.add_argument('--output', default=OUTPUT_FILE,
+                        help="Ausgabedatei (Standard: %(default)s)")
+    parser.add_argument('--dedup', action='store_true',
+                        help="Dubletten entfernen (benötigt die Pipeline-Stufe 'deduplicated')")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Prozesse für den Aufbau der Jahres-Layer (Standard: %(default)s)")
+    parser.add_argument('--layers', default=','.join(LAYER_GROUPS),
+                        help="Komma-getrennte Layer-Gruppen aus %(default)s")
+    parser.add_argument('--marker-mode', choices=['fast', 'classic'], default=MARKER_MODE,
+                        help="Marker-Modus (Standard: %(default)s)")
+    parser.add_argument('--output-mode', choices=['single', 'split'], default=OUTPUT_MODE,
+                        help="Ausgabe-Modus (Standard: %(default)s)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f"Alle Jahres-Layer neu bauen, ohne den Fragment-Cache ({FRAGMENT_DIR}/)")
+    args = parser.parse_args(argv)
+    
+    sample = args.sample if args.sample is not None else args.legacy_sample
+    args.sample = parse_sample_size(sample) if sample is not None else SAMPLE_SIZE
+    
+    args.layers = [layer.strip() for layer in args.layers.split(',') if layer.strip()]
+    unknown = set(args.layers) - set(LAYER_GROUPS)
+    if unknown:
+        parser.error(f"Unbekannte Layer-Gruppe(n): {', '.join(sorted(unknown))}")
+    
+    return args
+
+def main(argv=None):
     """Hauptfunktion."""
+    global MARKER_MODE
+    
+    args = parse_args(argv)
+    MARKER_MODE = args.marker_mode
+    
+    # Erst nach dem Parsen der Argumente (--help kommt ohne diese Module aus)
+    import random
+    
+    import folium
+    import numpy as np
+    
+    from berlin_housing.map_layers import save_split_map
+    from berlin_housing.price_cube import CUBE_PATH, save_price_cube
+    
     try:
         print("="*80)
         print("INTERACTIVE PRICE HEATMAP BERLIN GENERATOR - FIXED")
         print("="*80)
         
+        if args.sample is not None:
+            print(f"📊 Benutzerdefinierte Sample-Größe: {args.sample}")
+        else:
+            print("📊 Verwende ALLE Datenpunkte (kein Sampling)")
+        
         # Setze Random Seed
         random.seed(42)
         np.random.seed(42)
         
         # Lade Daten
-        df = load_data()
+        df = load_data(args.years, dedup=args.dedup)
         if df is None:
             return
         
+        if df.empty:
+            print(f"❌ Keine Daten für die gewählten Jahre: {args.years}")
+            return
+        
         # Berechne Preiskategorien
         df, price_quantiles = calculate_price_categories(df)
         
+        # Fülle fehlende Koordinaten (vektorisiert, reproduzierbar)
+        df = fill_missing_coordinates(df, seed=42)
+        
+        # Jahres-Fragmente (Würfel-Ausschnitt + Marker); unveränderte Jahre kommen aus dem Cache
+        markers = 'markers' in args.layers and MARKER_MODE == 'fast'
+        fragments = build_year_fragments(df, args.sample, markers, args.workers,
+                                         None if args.no_cache else FRAGMENT_DIR)
+        
+        # Aggregat-Würfel (Jahr × Ortsteil × Bezirk) für alle Layer und die Legende
+        cube = cube_from_fragments(fragments)
+        if not args.years:
+            save_price_cube(cube, CUBE_PATH)
+            print(f"  Aggregat-Würfel: {len(cube):,} Zellen → {CUBE_PATH}")
+        
         # Erstelle interaktive Karte
-        m = create_interactive_map(df, price_quantiles)
+        m = create_interactive_map(df, price_quantiles, cube, args.layers, args.sample, args.workers, fragments)
         
         # Füge Layer-Kontrolle hinzu
         folium.LayerControl(
@@ -501,14 +940,19 @@ def main():
         ).add_to(m)
         
         # Füge Legende hinzu
-        legend_html = create_legend(price_quantiles, df)
+        legend_html = create_legend(price_quantiles, cube, args.sample)
         m.get_root().html.add_child(folium.Element(legend_html))
         
         # Speichere Karte
-        m.save(OUTPUT_FILE)
+        if args.output_mode == 'split':
+            data_files = save_split_map(m, args.output)
+            print(f"📦 {len(data_files)} Layer-Dateien werden beim Einblenden nachgeladen")
+            print("   Hinweis: Karte über einen lokalen Webserver öffnen (python -m http.server)")
+        else:
+            m.save(args.output)
         
         print(f"\n🎉 ERFOLGREICH ABGESCHLOSSEN!")
-        print(f"📁 Datei: {OUTPUT_FILE}")
+        print(f"📁 Datei: {args.output}")
         print(f"🌐 Öffne die Datei in deinem Browser!")
         
         print(f"\n✨ FEATURES:")